@@ -18,26 +18,59 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
+import copy
+import glob
+import hashlib
+import io
 import logging
 import os
+import re
 import shutil
 import subprocess
-import sys
 import tempfile
 from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from importlib import util  # python 3.x
 from shutil import copytree
-from typing import Callable
+from typing import List, NamedTuple, Optional
 
+from lxml import etree
+
+from .._version import __version__
 from ..amc2moodle import convert
-from ..utils.flatex import Flatex
+from ..utils import supervisor, tools
+from ..utils.cache import DEFAULT_CACHE_SIZE, FileCache, default_cache_dir, hash_file
+from ..utils.flatex import Flatex, IncludeCycleError
+from ..utils.manifest import Manifest
+from ..utils.progress import Progress
+from ..utils.texsplit import merge_shards, shard_elements, split_elements
 
 # activate logger
 Logger = logging.getLogger(__name__)
 
+# LaTeXML daemon mode (`latexmlc` client talking to a `latexmls` server).
+# Base port of the servers, the actual port depends on the LaTeXML options
+# to avoid sharing a server preloaded with another configuration.
+LATEXML_DAEMON_PORT = 3354
+# Number of ports that can be used above `LATEXML_DAEMON_PORT`
+LATEXML_DAEMON_PORT_RANGE = 100
+# Idle time (in second) before the server shutdown
+LATEXML_DAEMON_EXPIRE = 600
+
+# Beginning of the questions in the flattened TeX file, outside comments
+QUESTION_RE = re.compile(r'^[^%\n]*\\begin\{question(?:mult|multx)?\}', re.MULTILINE)
+
+
+class ConversionError(Exception):
+    """Raised when the conversion of a file fails."""
+
 
-def checkTools(show=True):
-    """Check if the required Tools are available."""
+def checkTools(show=True, daemon=False, latexml=True):
+    """Check if the required Tools are available.
+
+    LaTeXML is not checked if `latexml` is False (conversion of an existing
+    LaTeXML output).
+    """
     # Wand Python module
     wand_loader = util.find_spec('wand')
     wandOk = wand_loader is not None
@@ -48,16 +81,49 @@ def checkTools(show=True):
     lxmlOk = lxml_loader is not None
     if not lxmlOk:
         Logger.critical("Please install lxml's Python module")
+    if not latexml:
+        return wandOk and lxmlOk
     # LaTeXML
-    latexMLwhich = subprocess.run(['which', 'latexml'],
-                                  stdout=subprocess.DEVNULL, check=False)
-    latexmlOk = latexMLwhich.returncode == 0
+    latexmlOk = tools.which('latexml') is not None
     if not latexmlOk:
         Logger.critical("Please install LaTeXML software (see https://dlmf.nist.gov/LaTeXML/)")
+    # LaTeXML client, only required in daemon mode
+    if daemon and latexmlOk:
+        latexmlOk = tools.which('latexmlc') is not None
+        if not latexmlOk:
+            Logger.critical("Please install LaTeXML client 'latexmlc' to use the daemon mode")
 
     return wandOk and lxmlOk and latexmlOk
 
 
+def latexmlVersion():
+    """Return the version string of the installed LaTeXML.
+
+    The version is probed once per installation, see `tools.version`.
+    """
+    # LaTeXML writes its version on stderr
+    return tools.version('latexml', ('--VERSION',)) or ''
+
+
+def latexmlOptions(include_styles=False):
+    """Return the LaTeXML options shared by all invocation modes."""
+    options = ['--noparse',
+               '--nocomments', ]
+    if include_styles:
+        options.append('--includestyles')
+    options.append('--path=%s' % os.path.dirname(__file__))
+    return options
+
+
+def readImage(basedir, name):
+    """Return the content of the image `name`, relative to `basedir`.
+
+    Default image resolver of `Converter.convertSource`.
+    """
+    with open(os.path.join(basedir, name), 'rb') as f:
+        return f.read()
+
+
 def getFilename(fileIn):
     """Get the filename without path."""
     return os.path.basename(fileIn)
@@ -71,20 +137,6 @@ def getPathFile(fileIn):
     return dirname
 
 
-def writePipeOnOutput(process, streamIn, output: Callable):
-    """Write the stream from a pipe through an output during process executed
-    by subprocess.Popen
-    """
-    while process.poll() is None:
-        msg = streamIn.readline().strip()
-        if msg != "":
-            output(msg)
-    # write the rest from the buffer
-    msg = streamIn.read().strip()
-    if msg != "":
-        output(msg)
-
-
 class amc2moodle:
     """Main class to invoke LaTeX to moodle XML conversion."""
 
@@ -93,15 +145,23 @@ class amc2moodle:
 
     def __init__(self, fileInput, fileOutput=None, keepFlag=False,
                  catname='amc', indentXML=False, usetempdir=True,
-                 magic_flag=True, cleanXML=False, deb=0, include_styles=False):
+                 magic_flag=True, cleanXML=False, deb=0, include_styles=False,
+                 daemon=False, daemon_port=None, cache_dir=None,
+                 cache_size=DEFAULT_CACHE_SIZE, incremental=False,
+                 fused_xslt=False, question_jobs=1, question_pool='thread',
+                 pipe=False, if_changed=False, latexml_jobs=1,
+                 latexml_timeout=None, latexml_memory=None, max_errors=None,
+                 from_latexml=None, save_latexml=None, check_tools=True, seed=None):
         """Initialize the object.
 
         Parameters
         ----------
         fileInput : string
-            Input LaTeX file containg amc questions.
+            Input LaTeX file containg amc questions. May be None if
+            `from_latexml` is provided.
         fileOutput : string, optional
-            Output XML moodle file. The default is `inputfile.xml`.
+            Output XML moodle file. The default is `inputfile.xml`, or
+            `latexmlfile_moodle.xml` when only `from_latexml` is provided.
         keepFlag : bool, optional
             If `True` keep temporary file. The default is False.
         catname : TYPE, optional
@@ -116,11 +176,80 @@ class amc2moodle:
             Allow LaTeXML to load raw *.sty file. The default is False.
         deb : int, optional
             Store all intermediate file for debugging.
+        daemon : bool, optional
+            Use a persistent LaTeXML server (`latexmlc`/`latexmls`) to amortize
+            LaTeXML startup over several conversions. The default is False.
+        daemon_port : int, optional
+            Port of the LaTeXML server. The default is None and the port is
+            deduced from the LaTeXML options.
+        cache_dir : string, optional
+            Directory of the cache used to reuse LaTeXML outputs when the
+            flattened TeX file, the bindings and the options are unchanged,
+            and the converted images. The default is None (no cache).
+        cache_size : int, optional
+            Maximal size of the cache in bytes. The default is DEFAULT_CACHE_SIZE.
+        incremental : bool, optional
+            Convert and cache each `\\element` block separately. Only the
+            modified blocks are converted again. If `cache_dir` is not provided,
+            the default cache directory is used. The default is False.
+        fused_xslt : bool, optional
+            Remove namespace and recast question types in a single XSLT pass
+            to save time and memory. The default is False.
+        question_jobs : int, optional
+            Number of questions converted in parallel. The default is 1.
+        question_pool : string, optional
+            Kind of pool used to convert the questions, 'thread' or 'process'.
+            The default is 'thread'.
+        pipe : bool, optional
+            Keep the flattened TeX file in memory and send it to LaTeXML
+            through its standard input, instead of writing `*_magic.tex` in
+            the input directory. Not available in daemon mode. The incremental
+            mode and `latexml_jobs` still write their chunks of the flattened
+            file in the input directory, to keep the relative paths of the
+            graphics valid. The default is False.
+        if_changed : bool, optional
+            Skip the conversion if the manifest of the previous run shows
+            that the input files, images, bundled assets and options are
+            unchanged. The default is False.
+        latexml_jobs : int, optional
+            Split the document in `latexml_jobs` shards along `\\element`
+            blocks and run one LaTeXML process per shard in parallel. The
+            default is 1 (a single LaTeXML process).
+        latexml_timeout : float, optional
+            LaTeXML is stopped after `latexml_timeout` seconds and the
+            conversion fails. The default is None (no timeout).
+        latexml_memory : int, optional
+            Maximal memory (address space) of LaTeXML in bytes, POSIX only.
+            The default is None (no limit).
+        max_errors : int, optional
+            LaTeXML is stopped, and the conversion fails, as soon as
+            `max_errors` errors are found in its output. The default is None.
+        from_latexml : string, optional
+            Skip the TeX stages and convert this LaTeXML XML output, saved
+            with `save_latexml` or `keepFlag`. The images are looked for in
+            the directory of `fileInput`, or of `from_latexml` if `fileInput`
+            is None. The LaTeXML options are ignored. The default is None.
+        save_latexml : string, optional
+            Copy the LaTeXML XML output in this file, to convert it again
+            later with `from_latexml`. Not available in incremental mode.
+            The default is None.
+        check_tools : bool, optional
+            Check that the required tools are installed. The default is True,
+            `Converter` checks them once for all its conversions.
+        seed : int, optional
+            Seed of the random datasets of the calculated questions, for
+            reproducible outputs in concurrent conversions. The default is
+            None (`random` module).
 
         Returns
         -------
         None.
 
+        Raises
+        ------
+        ConversionError
+            If a required tool is missing or if the conversion fails.
+
         """
         Logger.info('========================')
         Logger.info('========================')
@@ -133,10 +262,58 @@ class amc2moodle:
         self.indentXML = indentXML
         self.cleanXML = cleanXML
         self.include_styles = include_styles
+        self.daemon = daemon
+        self.daemon_port = daemon_port
+        self.incremental = incremental
+        self.fused_xslt = fused_xslt
+        self.question_jobs = question_jobs
+        self.question_pool = question_pool
+        self.latexml_jobs = latexml_jobs
+        self.latexml_timeout = latexml_timeout
+        self.latexml_memory = latexml_memory
+        self.max_errors = max_errors
+        self.from_latexml = from_latexml
+        self.save_latexml = save_latexml
+        self.seed = seed
+        # (file, hash) of the TeX files contributing to the output, and their
+        # stat taken when they are hashed
+        self.sources = []
+        self.sourceStats = {}
+        if pipe and daemon:
+            Logger.warning('The pipe mode is not available with the LaTeXML daemon, ignored.')
+            pipe = False
+        self.pipe = pipe
+        if incremental and save_latexml is not None:
+            Logger.warning('The LaTeXML output cannot be saved in incremental mode, ignored.')
+        # flattened TeX file, or its content in pipe mode
+        self.magictex = None
+        self.flatTex = None
+        # Flatex instance, to find the origin of the flattened lines
+        self.flatex = None
+        # number of questions found in the flattened file and LaTeXML progress
+        self.nquestions = 0
+        self.progress = None
+        # source files of the embedded images
+        self.images = []
+        self.upToDate = False
+        if incremental and cache_dir is None:
+            cache_dir = default_cache_dir()
+        if cache_dir is not None:
+            self.latexmlCache = FileCache(os.path.join(cache_dir, 'latexml'),
+                                          max_size=cache_size)
+            self.moodleCache = FileCache(os.path.join(cache_dir, 'moodle'),
+                                         max_size=cache_size)
+            self.imageCache = FileCache(os.path.join(cache_dir, 'images'),
+                                        max_size=cache_size)
+        else:
+            self.latexmlCache = None
+            self.moodleCache = None
+            self.imageCache = None
 
         # check required tools
-        if not checkTools(show=True):
-            sys.exit(1)
+        if check_tools and not checkTools(show=True, daemon=daemon,
+                                          latexml=from_latexml is None):
+            raise ConversionError('Required tools are missing.')
         # if fileInput is None:  # already chcecked (script + input func)
         #     print('ERROR : Input TeX file is missing.')
         #     sys.exit(1)
@@ -144,7 +321,7 @@ class amc2moodle:
             # encapsulate data
             self.keepFlag = keepFlag
             self.catname = catname
-            self.inputtex = fileInput
+            self.inputtex = fileInput if fileInput is not None else from_latexml
             self.deb = deb
             self.magic_flag = magic_flag
 
@@ -153,7 +330,14 @@ class amc2moodle:
             else:
                 # default is input.xml
                 tmp = os.path.splitext(self.inputtex)
-                self.output = tmp[0] + '.xml'
+                # do not overwrite the LaTeXML output
+                self.output = tmp[0] + ('.xml' if fileInput is not None else '_moodle.xml')
+
+            # nothing to do if nothing changed since the last run
+            if if_changed and self.isUpToDate():
+                Logger.info(f' > {self.output} is up to date, skip conversion.')
+                self.upToDate = True
+                return
 
             if usetempdir:
                 # temp
@@ -171,12 +355,58 @@ class amc2moodle:
         # run the building of the xml file for Moodle
         self.runBuilding()
 
+    def manifestFile(self):
+        """Return the name of the manifest file, next to the output."""
+        return os.path.splitext(self.output)[0] + '.manifest.json'
+
+    def manifestOptions(self):
+        """Return the options changing the output, stored in the manifest."""
+        return {'version': __version__,
+                'catname': self.catname,
+                'magic_flag': self.magic_flag,
+                'include_styles': self.include_styles,
+                'cleanXML': self.cleanXML,
+                'indentXML': self.indentXML,
+                'fused_xslt': self.fused_xslt,
+                'incremental': self.incremental,
+                'seed': self.seed}
+
+    def isUpToDate(self):
+        """Return True if the manifest of the previous run is still valid.
+
+        The LaTeXML version is not checked, calling LaTeXML would take longer
+        than the check itself.
+        """
+        manifest = Manifest.load(self.manifestFile())
+        return manifest is not None and manifest.is_up_to_date(self.manifestOptions())
+
+    def writeManifest(self):
+        """Write the manifest of the conversion next to the output.
+
+        It contains the hash of the TeX files merged by `Flatex`, of the
+        embedded images, of the bundled LaTeXML bindings and XSLT stylesheets
+        and of the output, and the options.
+        """
+        manifest = Manifest(self.manifestOptions())
+        for fileName, digest in self.sources:
+            manifest.add('sources', fileName, digest, self.sourceStats.get(fileName))
+        for fileName in self.images:
+            if os.path.isfile(fileName):
+                manifest.add('images', fileName)
+        assets = os.path.dirname(__file__)
+        for fileName in sorted(glob.glob(os.path.join(assets, '*.ltxml'))
+                               + glob.glob(os.path.join(assets, '*.xslt'))):
+            manifest.add('assets', fileName)
+        manifest.add('output', self.output)
+        manifest.save(self.manifestFile())
+        Logger.debug(f' > Manifest written in {self.manifestFile()}')
+
     def cleanUpTemp(self):
         """Clean-up temp directory created by tempfile.TemporaryDirectory()."""
         Logger.debug(' > Clean-up tempfile.')
         self.tempdir.cleanup()
         # remove magictex temp file
-        if not self.keepFlag:
+        if not self.keepFlag and self.magictex is not None:
             os.unlink(self.magictex)
 
     def showData(self):
@@ -192,6 +422,11 @@ class amc2moodle:
         Logger.debug(' > keep temp files: %s' % self.keepFlag)
         Logger.debug(' > categorie name: %s' % self.catname)
         Logger.debug(' > magic comments: %s' % disable[self.magic_flag])
+        Logger.debug(' > LaTeXML daemon: %s' % disable[self.daemon])
+        Logger.debug(' > LaTeXML cache: %s' % self.latexmlCache)
+        Logger.debug(' > incremental mode: %s' % disable[self.incremental])
+        Logger.debug(' > fused XSLT: %s' % disable[self.fused_xslt])
+        Logger.debug(' > question jobs: %d (%s pool)' % (self.question_jobs, self.question_pool))
 
     def endMessage(self):
         """Show end message explaining moodle import procedure."""
@@ -209,74 +444,403 @@ class amc2moodle:
             Logger.info(item)
 
     def removeMagicComment(self):
-        """Remove magic comments prefix to enable amc2moodle dedicated LaTeX commands."""
+        """Remove magic comments prefix to enable amc2moodle dedicated LaTeX commands.
+
+        Raises
+        ------
+        ConversionError
+            If a TeX file includes itself.
+        """
         pathin = getPathFile(self.inputtex)
         prefix = os.path.splitext(getFilename(self.inputtex))[0] + '_'
 
-        # Create magitex as persistent temp file in input.tex dir
-        with tempfile.NamedTemporaryFile(mode='w',
-                                         prefix=prefix,
-                                         suffix='_magic.tex',
-                                         dir=pathin,
-                                         delete=False) as m:
-            # Store tempfile name for alter use
-            self.magictex = m.name
+        if self.pipe:
+            # kept in memory, sent to LaTeXML standard input
+            output = io.StringIO()
+        else:
+            # Create magitex as persistent temp file in input.tex dir
+            with tempfile.NamedTemporaryFile(mode='w',
+                                             prefix=prefix,
+                                             suffix='_magic.tex',
+                                             dir=pathin,
+                                             delete=False) as m:
+                # Store tempfile name for alter use
+                self.magictex = m.name
+            output = self.magictex
 
         # Merge all included tex files in one and remove magic comments.
-        texpand = Flatex(self.inputtex, self.magictex,
+        texpand = Flatex(self.inputtex, output,
                          magic_flag=self.magic_flag,
                          noline=False)
-        texpand.expand()
+        try:
+            texpand.expand()
+        except IncludeCycleError as e:
+            if self.magictex is not None:
+                os.unlink(self.magictex)
+            raise ConversionError(str(e)) from e
+        if self.pipe:
+            self.flatTex = output.getvalue()
         texpand.report()
+        for fileName, digest in texpand.sources():
+            Logger.debug(f'   Source {fileName} ({digest[:12]})')
+        # keep the sources for the next stages
+        self.sources = texpand.sources()
+        self.sourceStats = texpand.stats
+        self.flatex = texpand
+        # count the questions ahead of LaTeXML to estimate its progress
+        self.nquestions = len(QUESTION_RE.findall(self.readFlatTex()))
+        Logger.info(f' > {self.nquestions} questions found')
+
+    def readFlatTex(self):
+        """Return the content of the flattened TeX file."""
+        if self.magictex is None:
+            return self.flatTex
+        with open(self.magictex) as f:
+            return f.read()
+
+    def latexmlOptions(self):
+        """Return the LaTeXML options shared by all invocation modes."""
+        return latexmlOptions(self.include_styles)
+
+    def latexmlCommand(self, texfile, xmlfile):
+        """Build the LaTeXML command line to convert `texfile` into `xmlfile`.
+
+        If `texfile` is None, LaTeXML reads the flattened TeX on its standard
+        input (pipe mode).
+
+        In daemon mode, `latexmlc` is used. It starts a `latexmls` server at the
+        first call and then sends the conversions to this server, avoiding to
+        reload Perl and all the bindings for each file. The server stops after
+        `LATEXML_DAEMON_EXPIRE` seconds without request.
+        """
+        options = self.latexmlOptions()
+        if texfile is None:
+            # read on the standard input, the graphics are looked for in the
+            # input directory
+            return ['latexml', *options,
+                    '--sourcedirectory=%s' % os.path.abspath(getPathFile(self.inputtex)),
+                    '--dest=%s' % os.path.abspath(xmlfile), '-']
+        if not self.daemon:
+            return ['latexml', *options,
+                    '--dest=%s' % xmlfile, texfile]
+        # The configuration is identified by a key, each configuration has its
+        # own server to keep preloaded bindings consistent
+        cache_key = hashlib.md5(' '.join(options).encode()).hexdigest()
+        if self.daemon_port is None:
+            port = LATEXML_DAEMON_PORT + int(cache_key, 16) % LATEXML_DAEMON_PORT_RANGE
+        else:
+            port = self.daemon_port
+        Logger.debug(f' > Use LaTeXML server on port {port}')
+        # the server does not share the current working directory
+        return ['latexmlc', *options,
+                '--format=xml',
+                '--whatsin=document',
+                '--whatsout=document',
+                '--expire=%d' % LATEXML_DAEMON_EXPIRE,
+                '--port=%d' % port,
+                '--cache_key=amc2moodle_%s' % cache_key,
+                '--sourcedirectory=%s' % os.path.abspath(getPathFile(texfile)),
+                '--dest=%s' % os.path.abspath(xmlfile),
+                os.path.abspath(texfile)]
+
+    def latexmlCacheKey(self, texfile):
+        """Compute the key of the LaTeXML output of `texfile` in the cache.
+
+        The key depends on the flattened TeX file (kept in memory if `texfile`
+        is None), on the bundled bindings (`*.ltxml`), on the LaTeXML version
+        and on the options. The source directory is also used since LaTeXML
+        looks for the graphics files.
+        """
+        bindings = sorted(glob.glob(os.path.join(os.path.dirname(__file__), '*.ltxml')))
+        if texfile is None:
+            digest = hashlib.sha256(self.flatTex.encode('utf-8')).hexdigest()
+        else:
+            digest = hash_file(texfile)
+        return FileCache.key(digest,
+                             *[hash_file(b) for b in bindings],
+                             latexmlVersion(),
+                             *self.latexmlOptions(),
+                             str(self.daemon),
+                             os.path.abspath(getPathFile(self.inputtex)))
+
+    def runLaTeXML(self, texfile=None, xmlfile=None):
+        """Run LaTeXML on the input TeX file.
+
+        Parameters
+        ----------
+        texfile : string, optional
+            The TeX file to convert. The default is the flattened input file,
+            sent on the standard input in pipe mode.
+        xmlfile : string, optional
+            The XML output file. The default is the temporary XML file.
 
-    def runLaTeXML(self):
-        """Run LaTeXML on the input TeX file."""
+        Returns
+        -------
+        bool
+            True if the conversion succeeds.
+        """
+        if texfile is None and not self.pipe:
+            texfile = self.magictex
+        if xmlfile is None:
+            xmlfile = self.tempxmlfile
+        # Reuse the stored output if available
+        if self.latexmlCache is not None:
+            key = self.latexmlCacheKey(texfile)
+            if self.latexmlCache.get(key, xmlfile) is not None:
+                Logger.info(' > LaTeXML output found in cache, skip conversion')
+                return True
         # run LaTeXML on magictex file
         Logger.info(' > Running LaTeXML conversion')
-        # LoggerXML = logging.getLogger('LaTexML')
-        # TODO: caution with 'universal_newlines=' (new syntax from Python 3.7: text=)
-        options = ['--noparse',
-                   '--nocomments', ]
-        if self.include_styles:
-            options.append('--includestyles')
-        with subprocess.Popen([
-                'latexml',
-                *options,
-                '--path=%s' % os.path.dirname(__file__),
-                '--dest=%s' % self.tempxmlfile,
-                self.magictex],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True) as latexmlProcess:
-            # while latexmlProcess.poll() is None:
-            #    Logger.debug(latexmlProcess.stdout.read())
-            # writePipeOnOutput(latexmlProcess,latexmlProcess.stderr,Logger.debug)
-
-            # write stdout and stderr in parallel to the right logging outputs
+        result = supervisor.run(
+            self.latexmlCommand(texfile, xmlfile),
+            input=self.flatTex if texfile is None else None,
+            # the local files are looked for in the input directory
+            cwd=getPathFile(self.inputtex) if texfile is None else None,
+            timeout=self.latexml_timeout,
+            memory_limit=self.latexml_memory,
+            max_errors=self.max_errors,
             # caution LaTeXML uses only STDERR... (version 0.8.5)
             # all outputs will be written in debug log
-            with ThreadPoolExecutor(2) as pool:
-                rstdout = pool.submit(writePipeOnOutput,
-                                      latexmlProcess,
-                                      latexmlProcess.stdout,
-                                      Logger.debug)
-                rstderr = pool.submit(writePipeOnOutput,
-                                      latexmlProcess,
-                                      latexmlProcess.stderr,
-                                      Logger.debug)
-                rstdout.result()
-                rstderr.result()
-        # latexmlProcess.wait()
-        return latexmlProcess.returncode == 0
+            output=Logger.debug,
+            on_error=lambda error: self.reportLaTeXMLError(error, texfile),
+            on_progress=None if self.progress is None else self.progress.step)
+        if result.timed_out:
+            Logger.error(f' > LaTeXML stopped after {self.latexml_timeout} s.')
+        if result.aborted:
+            Logger.error(f' > LaTeXML stopped after {self.max_errors} errors.')
+        if result.errors:
+            Logger.warning(f' > {len(result.errors)} LaTeXML errors.')
+        status = result.ok
+        # Store the output for the next runs
+        if status and self.latexmlCache is not None:
+            self.latexmlCache.put(key, xmlfile)
+        return status
+
+    def reportLaTeXMLError(self, error, texfile):
+        """Log a LaTeXML `error` as soon as it is found.
+
+        The location in the flattened file is replaced by the location in the
+        original TeX files.
+
+        Parameters
+        ----------
+        error : supervisor.Diagnostic
+            The error and its location.
+        texfile : string
+            The converted file, None in pipe mode.
+        """
+        location = ''
+        if error.line is not None:
+            origin = None
+            # in pipe mode, LaTeXML does not know the file name
+            if texfile is None or (texfile == self.magictex
+                                   and os.path.basename(error.file) == os.path.basename(texfile)):
+                origin = self.flatex.locate(error.line)
+            if origin is None:
+                origin = (error.file, error.line)
+            location = ' ({}, line {})'.format(*origin)
+        Logger.error(f' > LaTeXML {error.message}{location}')
+
+    def writeChunk(self, tex):
+        """Write `tex` in a temporary file of the input directory and return its name.
+
+        The file is created next to the input file, like the flattened file,
+        to keep relative paths of graphics valid.
+        """
+        prefix = os.path.splitext(getFilename(self.inputtex))[0] + '_'
+        with tempfile.NamedTemporaryFile(mode='w', prefix=prefix,
+                                         suffix='_chunk.tex',
+                                         dir=getPathFile(self.inputtex),
+                                         delete=False) as m:
+            m.write(tex)
+        return m.name
+
+    def runSharded(self):
+        """Run LaTeXML in parallel on shards of the flattened file and merge them.
+
+        The `\\element` blocks are grouped in `latexml_jobs` contiguous shards,
+        each one converted with the preamble of the document. The text before
+        the first block goes in the first shard and the text after the last
+        block in the last one. The XML documents are merged in the shards
+        order, thus the order of the categories and of the questions is kept.
+
+        Returns
+        -------
+        bool
+            True if the conversion of all shards succeeds.
+        """
+        document = split_elements(self.readFlatTex())
+        shards = shard_elements(document.elements, self.latexml_jobs)
+        if len(shards) <= 1:
+            return self.runLaTeXML()
+        bodies = [''.join(shard) for shard in shards]
+        bodies[0] = document.head + bodies[0]
+        bodies[-1] += document.tail
+        Logger.info(f' > LaTeXML conversion of {len(shards)} shards in parallel')
+        texfiles, xmlfiles = [], []
+        try:
+            for i, body in enumerate(bodies):
+                texfiles.append(self.writeChunk(document.chunk(body)))
+                xmlfiles.append(os.path.join(self.tempdir.name, f'shard{i}_latexml.xml'))
+            with ThreadPoolExecutor(len(shards)) as pool:
+                statuses = list(pool.map(self.runLaTeXML, texfiles, xmlfiles))
+        finally:
+            for texfile in texfiles:
+                os.unlink(texfile)
+        if not all(statuses):
+            return False
+
+        merge_shards(xmlfiles, self.tempxmlfile)
+        return True
+
+    def moodleCacheKey(self, tree, settings):
+        """Compute the key of the moodle questions obtained from a block.
+
+        The key depends on the LaTeXML output `tree` of the block, on the quiz
+        `settings`, on the embedded images, on the category name and on the
+        python conversion (version, XSLT stylesheets).
+        """
+        pathin = getPathFile(self.inputtex)
+        images = []
+        for candidates in tree.xpath('//*[local-name()="graphics"]/@candidates'):
+            img = os.path.join(pathin, candidates.split(',')[-1])
+            if os.path.isfile(img):
+                images.append(hash_file(img))
+        stylesheets = sorted(glob.glob(os.path.join(os.path.dirname(__file__), '*.xslt')))
+        return FileCache.key(etree.tostring(tree), settings,
+                             *images,
+                             *[hash_file(f) for f in stylesheets],
+                             hash_file(convert.__file__),
+                             __version__, str(self.catname))
+
+    def convertChunk(self, tree, settings, name):
+        """Convert the LaTeXML output `tree` of a block into moodle questions.
+
+        Parameters
+        ----------
+        tree : etree.ElementTree
+            The LaTeXML output of the block.
+        settings : list
+            The quiz level settings (options, default scoring) found in all blocks.
+        name : string
+            Basename of the intermediate files.
+
+        Returns
+        -------
+        bytes
+            A `quiz` element containing the questions of the block.
+        """
+        # Quiz level settings apply to all blocks, they are copied at the
+        # beginning of the document
+        root = tree.getroot()
+        for setting in reversed(settings):
+            root.insert(0, copy.deepcopy(setting))
+        wdir = self.tempdir.name
+        tree.write(os.path.join(wdir, name + '.xml'))
+        convert.to_moodle(filein=name + '.xml',
+                          pathin=getPathFile(self.inputtex),
+                          workingdir=wdir,
+                          fileout=name + '_moodle.xml',
+                          pathout=wdir,
+                          catname=self.catname,
+                          deb=self.deb,
+                          fused=self.fused_xslt,
+                          jobs=self.question_jobs,
+                          pool=self.question_pool,
+                          image_cache=self.imageCache,
+                          # each block has its own generator
+                          seed=None if self.seed is None else f'{self.seed}:{name}')
+        parser = etree.XMLParser(strip_cdata=False)
+        quiz = etree.parse(os.path.join(wdir, name + '_moodle.xml'), parser).getroot()
+        fragment = etree.Element('quiz')
+        fragment.extend(quiz.findall('question'))
+        return etree.tostring(fragment, encoding='utf-8')
+
+    def runIncremental(self):
+        """Convert each `\\element` block separately and stitch the questions.
+
+        The flattened file is split along `\\element` blocks. Each block is
+        converted with the preamble of the document. Both the LaTeXML output
+        and the moodle questions of each block are cached, thus the time of
+        a rebuild depends on the number of modified blocks.
+
+        Returns
+        -------
+        bool
+            True if the conversion succeeds.
+        """
+        tex = self.readFlatTex()
+        document = split_elements(tex)
+        # the blocks found in cache are not converted, their images are
+        # found in the TeX source
+        self.images = convert.includedGraphics(tex, getPathFile(self.inputtex))
+        pieces = [piece for piece in (document.head, *document.elements, document.tail)
+                  if piece.strip()]
+        Logger.info(f' > Incremental conversion of {len(pieces)} blocks')
+        # LaTeXML conversion of all blocks
+        trees = []
+        for i, piece in enumerate(pieces):
+            texfile = self.writeChunk(document.chunk(piece))
+            xmlfile = os.path.join(self.tempdir.name, f'chunk{i}_latexml.xml')
+            try:
+                status = self.runLaTeXML(texfile, xmlfile)
+            finally:
+                os.unlink(texfile)
+            if not status:
+                return False
+            trees.append(etree.parse(xmlfile))
+        if self.progress is not None and self.progress.done:
+            self.progress.finish()
+
+        # Python conversion of the modified blocks
+        settings = convert.quizSettings(trees)
+        settings_key = b''.join(etree.tostring(setting) for setting in settings)
+        quiz = etree.Element('quiz')
+        parser = etree.XMLParser(strip_cdata=False, remove_blank_text=True)
+        nconverted = 0
+        for i, tree in enumerate(trees):
+            key = self.moodleCacheKey(tree, settings_key)
+            fragment = self.moodleCache.get_bytes(key)
+            if fragment is None:
+                fragment = self.convertChunk(tree, settings, f'chunk{i}')
+                self.moodleCache.put_bytes(key, fragment)
+                nconverted += 1
+            quiz.extend(etree.fromstring(fragment, parser))
+        Logger.info(f' > {nconverted} blocks converted, {len(trees) - nconverted} found in cache')
+
+        # Stitch all questions
+        with open(self.output, 'wb') as f:
+            f.write(etree.tostring(quiz, pretty_print=True, encoding='utf-8'))
+        return True
+
+    def prefetchImages(self):
+        """Start the conversion of the images included in the flattened file.
+
+        The images found with `\\includegraphics` are converted in a
+        background thread pool, the conversion then reuses them.
+
+        Returns
+        -------
+        convert.ImageCache
+            The cache of the converted images, to shut down after the conversion.
+        """
+        imageCache = convert.ImageCache(self.imageCache)
+        imageCache.startPrefetch()
+        tex = self.readFlatTex()
+        # the quiz options are only parsed after LaTeXML
+        resolution = convert.quizImageResolution(tex)
+        for fileName in convert.includedGraphics(tex, getPathFile(self.inputtex)):
+            if not fileName.endswith('.png'):
+                Logger.debug(f' > Prefetch image {fileName}')
+                imageCache.prefetch(fileName, self.tempdir.name, resolution)
+        return imageCache
 
     def runXMLindent(self):
         """Run XML indentation with subprocess."""
         # check for xmlindent
-        xmlindentwhich = subprocess.run(['which', 'xmlindent'], check=False)
-        xmlindentOk = xmlindentwhich.returncode == 0
+        xmlindentOk = tools.which('xmlindent') is not None
         # check for xmllint (Macos)
-        xmllintwhich = subprocess.run(['which', 'xmllint'], check=False)
-        xmllintOk = xmllintwhich.returncode == 0
+        xmllintOk = tools.which('xmllint') is not None
 
         # linux
         if xmlindentOk:
@@ -314,50 +878,339 @@ class amc2moodle:
         Logger.info(f" > Cleaning: done, with {nreplacement} replacements.")
 
     def runBuilding(self):
-        """Build the xml file for Moodle quizz."""
+        """Build the xml file for Moodle quizz.
+
+        Raises
+        ------
+        ConversionError
+            If the LaTeXML processing fails.
+        """
         Logger.info('====== Build XML =======')
+        if self.from_latexml is not None:
+            self.runFromLaTeXML()
+            self.finishBuilding()
+            return
         # remove magic comment, return magictex
         if self.magic_flag:
             Logger.info(' > Search for magic comments...')
         self.removeMagicComment()
 
         Logger.info(' > Running LaTeXML pre-processing (may take a while)...')
-        # process magictex as tex input
-        statusLaTeXML = self.runLaTeXML()
-        if statusLaTeXML:
-            # run script
-            Logger.info(' > Running Python conversion...')
-            convert.to_moodle(
-                filein=getFilename(self.tempxmlfile),
-                pathin=getPathFile(self.inputtex),
-                workingdir=self.tempdir.name,
-                fileout=getFilename(self.output),
-                pathout=getPathFile(self.output),
-                catname=self.catname,
-                deb=self.deb)
-            # remove temporary file
-            if self.keepFlag:
-                # copy all temporary files
-                tempdirSave = tempfile.mkdtemp(prefix='tmp_amc2moodle_',
-                                               dir=getPathFile(self.output))
-                #
-                Logger.info(' > Save all temp files in: %s' % tempdirSave)
-                copytree(self.tempdir.name, tempdirSave, dirs_exist_ok=True)
-
-            # clean XML file (experimental)
-            if self.cleanXML:
-                self.runCleanXML()
-
-            # run XMLindent
-            if self.indentXML:
-                self.runXMLindent()
-
-            # clean up temp dir
+        # shared by all LaTeXML runs (shards, blocks)
+        self.progress = Progress(self.nquestions, 'questions')
+        if self.incremental:
+            status = self.runIncremental()
+        else:
+            # convert the images in background while LaTeXML is running
+            imageCache = self.prefetchImages()
+            try:
+                # process magictex as tex input
+                if self.latexml_jobs > 1:
+                    status = self.runSharded()
+                else:
+                    status = self.runLaTeXML()
+                if self.progress.done:
+                    self.progress.finish()
+                if status:
+                    if self.save_latexml is not None:
+                        shutil.copyfile(self.tempxmlfile, self.save_latexml)
+                        Logger.info(f' > LaTeXML output saved in {self.save_latexml}')
+                    self.runPython(imageCache)
+            finally:
+                imageCache.shutdown()
+        if status:
+            self.finishBuilding()
+        else:
+            Logger.error('ERROR during LaTeXML processing.')
             self.cleanUpTemp()
+            raise ConversionError(f'LaTeXML processing of {self.inputtex} failed.')
 
-            # show end message
-            self.endMessage()
+    def runPython(self, imageCache):
+        """Convert the LaTeXML output `self.tempxmlfile` to the moodle XML output.
 
-        else:
-            Logger.error('ERROR during LaTeXML processing.')
-            sys.exit(1)
+        Parameters
+        ----------
+        imageCache : convert.ImageCache
+            The cache of the converted images.
+        """
+        Logger.info(' > Running Python conversion...')
+        quiz = convert.to_moodle(
+            filein=self.tempxmlfile,
+            pathin=getPathFile(self.inputtex),
+            workingdir=self.tempdir.name,
+            fileout=getFilename(self.output),
+            pathout=getPathFile(self.output),
+            catname=self.catname,
+            deb=self.deb,
+            fused=self.fused_xslt,
+            jobs=self.question_jobs,
+            pool=self.question_pool,
+            image_cache=imageCache,
+            seed=self.seed)
+        self.images = list(dict.fromkeys(quiz.images))
+
+    def runFromLaTeXML(self):
+        """Convert the LaTeXML output `from_latexml`, without TeX stages.
+
+        Raises
+        ------
+        ConversionError
+            If the LaTeXML output is missing.
+        """
+        if not os.path.isfile(self.from_latexml):
+            self.cleanUpTemp()
+            raise ConversionError(f'LaTeXML output {self.from_latexml} not found.')
+        Logger.info(f' > Start from LaTeXML output {self.from_latexml}')
+        self.tempxmlfile = os.path.abspath(self.from_latexml)
+        # the LaTeXML output replaces the TeX sources in the manifest
+        self.sourceStats = {self.tempxmlfile: os.stat(self.tempxmlfile)}
+        self.sources = [(self.tempxmlfile, hash_file(self.tempxmlfile))]
+        imageCache = convert.ImageCache(self.imageCache)
+        try:
+            self.runPython(imageCache)
+        finally:
+            imageCache.shutdown()
+
+    def finishBuilding(self):
+        """Post-process the output, clean up and show the end message."""
+        # remove temporary file
+        if self.keepFlag:
+            # copy all temporary files
+            tempdirSave = tempfile.mkdtemp(prefix='tmp_amc2moodle_',
+                                           dir=getPathFile(self.output))
+            #
+            Logger.info(' > Save all temp files in: %s' % tempdirSave)
+            copytree(self.tempdir.name, tempdirSave, dirs_exist_ok=True)
+
+        # clean XML file (experimental)
+        if self.cleanXML:
+            self.runCleanXML()
+
+        # run XMLindent
+        if self.indentXML:
+            self.runXMLindent()
+
+        # hash of all the inputs, for the next runs
+        self.writeManifest()
+
+        # clean up temp dir
+        self.cleanUpTemp()
+
+        # show end message
+        self.endMessage()
+
+
+class ConversionResult(NamedTuple):
+    """Outcome of `Converter.convert`."""
+    # moodle XML output, None if written in the requested output file
+    xml: Optional[bytes]
+    # output file, None if only returned as bytes
+    output: Optional[str]
+    # TeX files (name, hash) and images used by the conversion
+    sources: List[tuple]
+    images: List[str]
+    # True if the conversion was skipped (`if_changed` option)
+    upToDate: bool
+
+
+class Converter:
+    """Reusable converter for many conversions in the same process.
+
+    The options are given once and the tools are checked once. The caches
+    (LaTeXML outputs, converted images) and the compiled XSLT stylesheets are
+    kept between the conversions. Errors are raised as `ConversionError`.
+    """
+
+    def __init__(self, **options):
+        """Initialize the converter.
+
+        Parameters
+        ----------
+        **options
+            Keyword arguments of `amc2moodle`, except `fileInput` and
+            `fileOutput`. If `cache_dir` is not provided, a private cache
+            directory is used during the life of the converter.
+
+        Raises
+        ------
+        ConversionError
+            If a required tool is missing.
+        """
+        if not checkTools(show=True, daemon=options.get('daemon', False),
+                          latexml=options.get('from_latexml') is None):
+            raise ConversionError('Required tools are missing.')
+        # private working directory, for the caches and the outputs
+        self.workdir = tempfile.TemporaryDirectory(prefix='amc2moodle_converter')
+        if options.get('cache_dir') is None:
+            options['cache_dir'] = os.path.join(self.workdir.name, 'cache')
+        self.options = options
+        self.count = 0
+
+    def __repr__(self):
+        """Change string representation."""
+        return f"Instance of {self.__class__.__name__} ({self.count} conversions)."
+
+    def __enter__(self):
+        """Use the converter as a context manager, closed at the end."""
+        return self
+
+    def __exit__(self, *exc):
+        """Close the converter."""
+        self.close()
+
+    def close(self):
+        """Remove the private working directory and caches."""
+        self.workdir.cleanup()
+
+    def convert(self, path=None, fileOutput=None, basedir=None, source=None):
+        """Convert the TeX file `path`, or the TeX `source`, to moodle XML.
+
+        Parameters
+        ----------
+        path : string or path-like, optional
+            The input TeX file.
+        fileOutput : string, optional
+            Output XML moodle file. The default is None, the XML is returned
+            in the result and no output file is left.
+        basedir : string, optional
+            Directory of the files included by `source` (images, `\\input`).
+            The default is None, the source cannot include relative files.
+        source : string or bytes, optional
+            The TeX source itself (UTF-8 bytes), instead of `path`.
+
+        Returns
+        -------
+        ConversionResult
+            The moodle XML (if `fileOutput` is None) and the used files.
+
+        Raises
+        ------
+        ConversionError
+            If the input file is not found or if the conversion fails.
+        """
+        if (path is None) == (source is None):
+            raise TypeError("Exactly one of 'path' and 'source' arguments is required.")
+        self.count += 1
+        texfile = None
+        if path is not None and not os.path.isfile(path):
+            raise ConversionError(f'Input file {path} not found.')
+        if source is not None:
+            if isinstance(source, bytes):
+                source = source.decode('utf-8')
+            # TeX source, written for LaTeXML
+            fd, texfile = tempfile.mkstemp(suffix='.tex', prefix='amc2moodle_source',
+                                           dir=basedir if basedir else self.workdir.name)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(source)
+            path = texfile
+        output = fileOutput
+        if output is None:
+            # unique name, conversions may run in several threads
+            fd, output = tempfile.mkstemp(suffix='.xml', prefix='output',
+                                          dir=self.workdir.name)
+            os.close(fd)
+        try:
+            converter = amc2moodle(fileInput=os.fspath(path), fileOutput=output,
+                                   check_tools=False, **self.options)
+        except BaseException:
+            if fileOutput is None:
+                os.unlink(output)
+            raise
+        finally:
+            if texfile is not None:
+                os.unlink(texfile)
+        xml = None
+        if fileOutput is None:
+            with open(output, 'rb') as f:
+                xml = f.read()
+            os.unlink(output)
+            os.unlink(converter.manifestFile())
+        return ConversionResult(xml, fileOutput, converter.sources, converter.images,
+                                converter.upToDate)
+
+    def convertSource(self, tex, resolver=None, basedir=None):
+        """Convert the TeX source `tex` in memory and return the moodle XML.
+
+        Only LaTeXML runs in another process, it reads the flattened source on
+        its standard input and writes its output on its standard output. The
+        images are read with `resolver`, converted and embedded in memory.
+
+        The `cleanXML` option is applied on the output, the options related
+        to the files (`indentXML`, `keepFlag`, daemon, caches...) are ignored.
+
+        Parameters
+        ----------
+        tex : string or bytes
+            The TeX source (UTF-8 bytes).
+        resolver : callable, optional
+            Called with the name of an image, as written in `\\includegraphics`
+            (with its extension), it returns the content of the image (bytes).
+            It must be picklable with the 'process' question pool. The default
+            reads the images in `basedir`.
+        basedir : string, optional
+            Directory of the files included by the source (`\\input`) and of
+            the images. The default is the current directory.
+
+        Returns
+        -------
+        bytes
+            The moodle XML.
+
+        Raises
+        ------
+        ConversionError
+            If the conversion fails.
+        """
+        options = self.options
+        if isinstance(tex, bytes):
+            tex = tex.decode('utf-8')
+        basedir = os.path.abspath(basedir if basedir else os.getcwd())
+        if resolver is None:
+            resolver = partial(readImage, basedir)
+        self.count += 1
+
+        # Merge the included files and remove magic comments
+        flatTex = io.StringIO()
+        texpand = Flatex(os.path.join(basedir, 'source.tex'), flatTex,
+                         magic_flag=options.get('magic_flag', True), noline=False,
+                         text=tex)
+        try:
+            texpand.expand()
+        except IncludeCycleError as e:
+            raise ConversionError(str(e)) from e
+        texpand.report()
+
+        # LaTeXML writes the XML on its standard output without --dest
+        Logger.info(' > Running LaTeXML conversion')
+        result = supervisor.run(
+            ['latexml', *latexmlOptions(options.get('include_styles', False)),
+             '--sourcedirectory=%s' % basedir, '-'],
+            input=flatTex.getvalue(),
+            cwd=basedir,
+            timeout=options.get('latexml_timeout'),
+            memory_limit=options.get('latexml_memory'),
+            max_errors=options.get('max_errors'),
+            output=Logger.debug,
+            on_error=lambda error: Logger.error(f' > LaTeXML {error.message}'),
+            capture=True)
+        if not result.ok:
+            raise ConversionError('LaTeXML processing of the source failed.')
+
+        # Python conversion, the images are given by the resolver
+        Logger.info(' > Running Python conversion...')
+        quiz = convert.AMCQuiz(io.BytesIO(result.stdout.encode('utf-8')), basedir, None,
+                               options.get('catname', 'amc'),
+                               fused=options.get('fused_xslt', False),
+                               jobs=options.get('question_jobs', 1),
+                               pool=options.get('question_pool', 'thread'),
+                               image_cache=convert.ImageCache(resolver=resolver),
+                               seed=options.get('seed'))
+        output = io.BytesIO()
+        quiz.toMoodle(output)
+        xml = output.getvalue()
+        if options.get('cleanXML', False):
+            # remove "%" added by LaTeXML at end of lines (EXPERIMENTAL)
+            nreplacement = xml.count(b'%\n')
+            xml = xml.replace(b'%\n', b'\n')
+            Logger.info(f" > Cleaning: done, with {nreplacement} replacements.")
+        return xml
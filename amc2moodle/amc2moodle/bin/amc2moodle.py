@@ -19,14 +19,126 @@
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 import argparse
+import glob
 import os
 import sys
+from collections import Counter
 
 import amc2moodle as amdlpkg
-from amc2moodle.amc2moodle import amc2moodle_class as a2m
+from amc2moodle.utils.cache import DEFAULT_CACHE_SIZE
 from amc2moodle.utils.customLogging import customLogger
 
 
+def add_conversion_arguments(parser):
+    """ Add the arguments controlling the conversion of a file to `parser`.
+    """
+    parser.add_argument("-k", "--keep",
+                        help='''Keep temporary file
+                        (useful for debuging, optional)''',
+                        required=False, action="store_true")
+    parser.add_argument("-c", "--catname",  # nargs=1,
+                        help='''Provide root category name (default 'amc').
+                        Note that \\element{label} are used as
+                        subcategory tag.''',
+                        required=False, default='amc')
+    parser.add_argument("-p", "--prettify",
+                        help="Prettify the XML file using indent tool",
+                        required=False, action="store_true")
+    parser.add_argument("-n", "--notemp",
+                        help='''No use of system temporary directory, use
+                                input directory instead.''',
+                        required=False, action="store_true")
+    parser.add_argument("-x","--exp",
+                        help='''Experimental features (clean XML...)''',
+                        required=False, action="store_true")
+    parser.add_argument("--disable-magic",
+                        help='''Disable magic comments (default : enable).''',
+                        required=False, default=False, dest='magic_flag',
+                        action="store_true")
+    parser.add_argument("--includestyles",
+                        help='''Allow LaTeXML to load raw *.sty file (default : False).''',
+                        required=False, default=False, dest='include_styles',
+                        action="store_true")
+    parser.add_argument("--daemon",
+                        help='''Keep LaTeXML running as a server between conversions
+                        to save its startup time (requires 'latexmlc', default : False).''',
+                        required=False, default=False, action="store_true")
+    parser.add_argument("--cache",
+                        help='''Cache directory used to reuse the LaTeXML outputs
+                        of unchanged files (default : no cache).''',
+                        required=False, default=None, dest='cache_dir')
+    parser.add_argument("--cache-size",
+                        help='''Maximal size of the cache in MB (default : %(default)s).''',
+                        required=False, default=DEFAULT_CACHE_SIZE // 1024**2, type=int)
+    parser.add_argument("--incremental",
+                        help='''Convert and cache each \\element block separately, only
+                        modified blocks are converted again (default : False).''',
+                        required=False, default=False, action="store_true")
+    parser.add_argument("--fused-xslt",
+                        help='''Use a single XSLT pass for namespace removal and question
+                        type recast, faster on large files (default : False).''',
+                        required=False, default=False, dest='fused_xslt',
+                        action="store_true")
+    parser.add_argument("--question-jobs",
+                        help='''Number of questions converted in parallel
+                        (default : %(default)s).''',
+                        required=False, default=1, type=int)
+    parser.add_argument("--question-pool",
+                        help='''Use threads or processes to convert the questions in parallel
+                        (default : %(default)s).''',
+                        required=False, default='thread', choices=('thread', 'process'))
+    parser.add_argument("--latexml-jobs",
+                        help='''Split the document along \\element blocks and run this number
+                        of LaTeXML processes in parallel (default : %(default)s).''',
+                        required=False, default=1, type=int)
+    parser.add_argument("--latexml-timeout",
+                        help='''Stop LaTeXML after this number of seconds (default : no timeout).''',
+                        required=False, default=None, type=float)
+    parser.add_argument("--latexml-memory",
+                        help='''Maximal memory used by LaTeXML in MB (default : no limit).''',
+                        required=False, default=None, type=int)
+    parser.add_argument("--max-errors",
+                        help='''Stop LaTeXML as soon as this number of errors is found
+                        (default : never stop).''',
+                        required=False, default=None, type=int)
+    parser.add_argument("--if-changed",
+                        help='''Skip the conversion if the input files and options are the same
+                        as in the manifest of the previous run (default : False).''',
+                        required=False, default=False, dest='if_changed',
+                        action="store_true")
+    parser.add_argument("--pipe",
+                        help='''Send the flattened TeX file to LaTeXML through a pipe instead
+                        of writing it in the input directory. The incremental and sharded
+                        runs still write their chunks there (default : False).''',
+                        required=False, default=False, action="store_true")
+
+
+def conversion_options(args):
+    """ Return the keyword arguments of `amc2moodle` from the parsed `args`.
+    """
+    return dict(keepFlag=args.keep,
+                catname=args.catname,
+                indentXML=args.prettify,
+                usetempdir=not args.notemp,
+                magic_flag=not args.magic_flag,
+                cleanXML=args.exp,
+                include_styles=args.include_styles,
+                daemon=args.daemon,
+                cache_dir=args.cache_dir,
+                cache_size=args.cache_size * 1024**2,
+                incremental=args.incremental,
+                fused_xslt=args.fused_xslt,
+                question_jobs=args.question_jobs,
+                question_pool=args.question_pool,
+                pipe=args.pipe,
+                if_changed=args.if_changed,
+                latexml_jobs=args.latexml_jobs,
+                latexml_timeout=args.latexml_timeout,
+                latexml_memory=(None if args.latexml_memory is None
+                                else args.latexml_memory * 1024**2),
+                max_errors=args.max_errors)
+
+
 def run():
     """ Read command line input and run amc2mooodle conversion.
     """
@@ -42,27 +154,22 @@ def run():
                                      environnements are now available.
                                      ''')
 
-    parser.add_argument("inputfile",
-                        help="Input TeX file (mandatory)")
+    parser.add_argument("inputfile", nargs='?',
+                        help="Input TeX file (mandatory, except with --from-latexml)")
     parser.add_argument("-o", "--output", nargs=1,
                         help="Output XML file (default inputfile.xml)",
                         required=False)
-    parser.add_argument("-k", "--keep",
-                        help='''Keep temporary file
-                        (useful for debuging, optional)''',
-                        required=False, action="store_true")
-    parser.add_argument("-c", "--catname",  # nargs=1,
-                        help='''Provide root category name (default 'amc').
-                        Note that \\element{label} are used as
-                        subcategory tag.''',
-                        required=False, default='amc')
-    parser.add_argument("-p", "--prettify",
-                        help="Prettify the XML file using indent tool",
-                        required=False, action="store_true")
-    parser.add_argument("-n", "--notemp",
-                        help='''No use of system temporary directory, use
-                                input directory instead.''',
-                        required=False, action="store_true")
+    add_conversion_arguments(parser)
+    parser.add_argument("--from-latexml",
+                        help='''Convert this LaTeXML output (saved with --save-latexml)
+                        instead of running LaTeXML. The images are looked for in the
+                        directory of the input TeX file if provided, else in the directory
+                        of the LaTeXML output.''',
+                        required=False, default=None, dest='from_latexml')
+    parser.add_argument("--save-latexml",
+                        help='''Save the LaTeXML output in this file, to run only the
+                        Python conversion later with --from-latexml.''',
+                        required=False, default=None, dest='save_latexml')
     parser.add_argument("-V", "--version",
                         help='''Show the current version of moodle2amc''',
                         action="version",
@@ -76,36 +183,22 @@ def run():
     parser.add_argument("-s", "--silent",
                         help='''Hide all messages in CLI (log file is still written) (override verbosity)''',
                         required=False, action="store_true")
-    parser.add_argument("-x","--exp",
-                        help='''Experimental features (clean XML...)''',
-                        required=False, action="store_true")
-    parser.add_argument("--disable-magic",
-                        help='''Disable magic comments (default : enable).''',
-                        required=False, default=False, dest='magic_flag',
-                        action="store_true")
-    parser.add_argument("--includestyles",
-                        help='''Allow LaTeXML to load raw *.sty file (default : False).''',
-                        required=False, default=False, dest='include_styles',
-                        action="store_true")
-
     # Get input args
     args = parser.parse_args()
+    if args.inputfile is None and args.from_latexml is None:
+        parser.error('the input file is required')
 
     if args.inputfile:
         fileIn = args.inputfile
     if args.output:
         fileOut = args.output[0]
 
-    keepFlag = args.keep
-    indentFlag = args.prettify
-    tempDir = not args.notemp
-    catname = args.catname
-    magic_flag = not(args.magic_flag)
     silentMode = args.silent
     verboseMode = args.verbose
-    cleanXML=args.exp
     logFileMode = args.no_log_file
-    include_styles = args.include_styles
+    options = conversion_options(args)
+    options.update(from_latexml=args.from_latexml,
+                   save_latexml=args.save_latexml)
 
     #load logger
     logObj = customLogger('amc2moodle')
@@ -113,14 +206,17 @@ def run():
                               silent=silentMode,
                               txtinfo=amdlpkg.__version__)
 
-    # check input file
+    # check input file, the LaTeXML output is enough
     fileInOk = False
     if fileIn is not None:
         fileInOk = os.path.exists(fileIn)
+    elif args.from_latexml is not None:
+        fileInOk = os.path.exists(args.from_latexml)
+    logName = fileIn if fileIn is not None else args.from_latexml
 
     # declare log file
     if fileInOk and logFileMode:
-        logFile = os.path.splitext(os.path.basename(fileIn))[0]+'_amc2moodle.log'
+        logFile = os.path.splitext(os.path.basename(logName))[0]+'_amc2moodle.log'
         # remove existing log file
         if os.path.exists(logFile):
             os.remove(logFile)
@@ -133,9 +229,9 @@ def run():
 
 
     if fileInOk:
-        Logger.debug('Input file: %s - status: %s' % (fileIn, "OK"))
+        Logger.debug('Input file: %s - status: %s' % (logName, "OK"))
     else:
-        Logger.critical('Input file: %s - status: %s' % (fileIn, "does not exist"))
+        Logger.critical('Input file: %s - status: %s' % (logName, "does not exist"))
     if fileOut:
         fileOutOk = not os.path.exists(fileOut)
         if fileOutOk:
@@ -146,11 +242,13 @@ def run():
     globalReturncode = 0
     # run conversion
     if fileInOk:
-        a2m.amc2moodle(fileInput=fileIn, fileOutput=fileOut,
-                       keepFlag=keepFlag, catname=catname,
-                       indentXML=indentFlag, usetempdir=tempDir,
-                       magic_flag=magic_flag, cleanXML=cleanXML,
-                       include_styles=include_styles)
+        # imported after the arguments parsing, '--help' and '--version' are fast
+        from amc2moodle.amc2moodle import amc2moodle_class as a2m
+        try:
+            a2m.amc2moodle(fileInput=fileIn, fileOutput=fileOut, **options)
+        except a2m.ConversionError as e:
+            Logger.critical(str(e))
+            globalReturncode = 1
     else:
         # exit with error status
         globalReturncode = 1
@@ -162,6 +260,164 @@ def run():
     sys.exit(globalReturncode)
 
 
+def batch_inputs(paths):
+    """ Return the list of TeX files given by `paths`.
+
+    Each path may be a file, a directory (all its `*.tex` files are used) or
+    a glob pattern. Duplicates are removed and the order is preserved.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, '*.tex'))))
+        elif os.path.exists(path):
+            files.append(path)
+        else:
+            # not expanded by the shell
+            files.extend(sorted(glob.glob(path)))
+    return list(dict.fromkeys(os.path.abspath(f) for f in files))
+
+
+def batch_outputs(files, outdir=None):
+    """ Return the output and log files of each input file {fileIn: (fileOut, logFile)}.
+
+    The outputs are written next to each input file, or in `outdir`. In
+    `outdir`, the inputs with the same name (`a/quiz.tex`, `b/quiz.tex`) are
+    named after their path relative to the common directory of the inputs
+    (`a_quiz.xml`, `b_quiz.xml`).
+
+    Raises
+    ------
+    ValueError
+        If several inputs still have the same output.
+    """
+    def stem(fileIn):
+        return os.path.splitext(os.path.basename(fileIn))[0]
+
+    names = {}
+    if outdir:
+        counts = Counter(stem(fileIn).lower() for fileIn in files)
+        common = os.path.commonpath([os.path.dirname(fileIn) for fileIn in files])
+        for fileIn in files:
+            if counts[stem(fileIn).lower()] > 1:
+                relpath = os.path.splitext(os.path.relpath(fileIn, common))[0]
+                names[fileIn] = relpath.replace(os.sep, '_')
+    outputs = {}
+    for fileIn in files:
+        basename = os.path.join(outdir if outdir else os.path.dirname(fileIn),
+                                names.get(fileIn, stem(fileIn)))
+        outputs[fileIn] = (basename + '.xml', basename + '_amc2moodle.log')
+    # case insensitive file systems are common
+    seen = {}
+    for fileIn, (fileOut, _) in outputs.items():
+        other = seen.setdefault(fileOut.lower(), fileIn)
+        if other != fileIn:
+            raise ValueError(f'{other} and {fileIn} would both be converted in {fileOut}.')
+    return outputs
+
+
+def convert_file(fileIn, fileOut, logFile, options):
+    """ Convert `fileIn` in a worker process and write its log in `logFile`.
+
+    Returns
+    -------
+    returncode : int
+        0 if the conversion succeeds, 1 otherwise.
+    """
+    # each worker has its own file logger and no console logger
+    logObj = customLogger('amc2moodle')
+    logObj.removeConsoleLogger()
+    if os.path.exists(logFile):
+        os.remove(logFile)
+    logObj.setupFileLogger(filename=logFile,
+                           verbositylevel=2,
+                           txtinfo=amdlpkg.__version__)
+    Logger = logObj.getLogger()
+    from amc2moodle.amc2moodle import amc2moodle_class as a2m
+    try:
+        a2m.amc2moodle(fileInput=fileIn, fileOutput=fileOut, **options)
+        returncode = 0
+    except a2m.ConversionError as e:
+        Logger.critical(str(e))
+        returncode = 1
+    except Exception:
+        Logger.exception(f'Unexpected error during the conversion of {fileIn}')
+        returncode = 1
+    finally:
+        logObj.removeFileLogger()
+    return returncode
+
+
+def run_batch():
+    """ Read command line input and run amc2mooodle conversion of many files.
+
+    The files are converted in parallel, each one with its own log file.
+    """
+    parser = argparse.ArgumentParser(description='''This program converts
+                                     several LaTeX files containing AMC questions
+                                     into XML files suitable for moodle import.
+                                     The files are converted in parallel.
+                                     ''')
+    parser.add_argument("inputs", nargs='+',
+                        help="Input TeX files, directories or glob patterns")
+    parser.add_argument("-d", "--outdir",
+                        help='''Output directory of the XML and log files
+                        (default : directory of each input file)''',
+                        required=False, default=None)
+    parser.add_argument("-j", "--jobs", type=int,
+                        help='''Number of parallel conversions
+                        (default : number of CPUs)''',
+                        required=False, default=os.cpu_count())
+    add_conversion_arguments(parser)
+    parser.add_argument("-V", "--version",
+                        help='''Show the current version of amc2moodle''',
+                        action="version",
+                        version=f"%(prog)s v{amdlpkg.__version__}")
+    args = parser.parse_args()
+    options = conversion_options(args)
+
+    # load logger
+    logObj = customLogger('amc2moodle')
+    logObj.setupConsoleLogger(verbositylevel=0,
+                              txtinfo=amdlpkg.__version__)
+    Logger = logObj.getLogger()
+
+    files = batch_inputs(args.inputs)
+    if not files:
+        Logger.critical('No input file found.')
+        sys.exit(1)
+    # checked before any conversion
+    try:
+        jobs = batch_outputs(files, args.outdir)
+    except ValueError as e:
+        Logger.critical(str(e))
+        sys.exit(1)
+    if args.outdir:
+        os.makedirs(args.outdir, exist_ok=True)
+
+    Logger.info(f'Convert {len(files)} files with {args.jobs} jobs')
+    returncodes = {}
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        futures = {executor.submit(convert_file, fileIn, *jobs[fileIn], options): fileIn
+                   for fileIn in files}
+        for future in as_completed(futures):
+            fileIn = futures[future]
+            returncodes[fileIn] = future.result()
+            status = 'OK' if returncodes[fileIn] == 0 else 'FAILED'
+            Logger.info(f' > {os.path.basename(fileIn)}: {status} (log: {jobs[fileIn][1]})')
+
+    failed = [fileIn for fileIn in files if returncodes[fileIn]]
+    if failed:
+        Logger.error(f'{len(failed)}/{len(files)} conversions failed:')
+        for fileIn in failed:
+            Logger.error(f'   {fileIn} (see {jobs[fileIn][1]})')
+    else:
+        Logger.info(f'All {len(files)} conversions succeed.')
+    # exit with error status
+    sys.exit(1 if failed else 0)
+
+
 # Run autonomous
 if __name__ == '__main__':
     # run with options
@@ -19,16 +19,24 @@
 
 """
 import base64
+import concurrent.futures
+import contextlib
+import contextvars
+import hashlib
 import logging
 import os
 import random
+import re
+import threading
 from abc import ABC, abstractmethod
-from xml.sax.saxutils import unescape
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 from lxml import etree
-from wand.image import Image as wandImage
 
-from ..utils.calculatedParser import *
+from ..utils import xslt
+from ..utils.cache import FileCache, hash_file
+from ..utils.customLogging import run_counters
 
 # Define default and global
 SUPPORTED_Q_TYPE = ('amc_questionmult', 'amc_question', 'amc_questionnumeric',
@@ -37,7 +45,7 @@ SUPPORTED_Q_TYPE = ('amc_questionmult', 'amc_question', 'amc_questionnumeric',
 
 DEFAULT_IMG_RESOLUTION = 100
 # Dictionnary containing all used options. May be overwritten in Quiz or in Questions.
-# When overwritten, it becomes a string. Need to be carfull when use them.
+# The values given in the tex file are parsed by `Options` with `OPTION_TYPES`.
 DEFAULT_OPTS = {  # Set defaut relative tolerance for float in numerical question to 1%
                 'default_numeric_tol': 1e-2,
                 # Shuffle all answsers
@@ -76,6 +84,40 @@ DEFAULT_OPTS = {  # Set defaut relative tolerance for float in numerical questio
                 'calculated_correctanswerlength': 2,
                 }
 
+# Short names of some options, kept for backward compatibility {alias: option name}
+OPTION_ALIASES = {'imgResolution': 'default_img_resolution',
+                  'decimalNumber': 'calculated_default_decimal_number',
+                  'nitems': 'calculated_default_item_number'}
+# Answer numbering formats supported by moodle
+NUMBERING_FORMATS = ('abc', 'ABCD', '123', 'iii', 'IIII', 'none')
+
+# Pools available to convert the questions in parallel {name: executor in concurrent.futures}
+POOLS = {'thread': 'ThreadPoolExecutor', 'process': 'ProcessPoolExecutor'}
+
+# Placeholder of the base64 payload of an image file, the payload is streamed
+# in the output by `writeMoodle`. The path is hex encoded.
+FILE_TOKEN = '@@AMC2MOODLE_FILE:{}@@'
+FILE_TOKEN_RE = re.compile(rb'@@AMC2MOODLE_FILE:([0-9a-f]+)@@')
+# Size of the chunks read in image files, multiple of 3 to encode them separately
+BASE64_CHUNK_SIZE = 3 * 256 * 1024
+# Total size of the base64 payloads kept by `writeMoodle` for the images
+# used several times, they are encoded once while this size is not reached
+BASE64_MEMO_SIZE = 64 * 1024**2
+# First bytes of png files, embedded as they are
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Graphics included in TeX files, and the extensions looked for when missing
+INCLUDEGRAPHICS_RE = re.compile(r'\\includegraphics\s*(?:\[[^\]]*\])?\s*\{([^}]+)\}')
+GRAPHICS_EXTENSIONS = ('png', 'pdf', 'eps', 'ps', 'jpg', 'jpeg', 'gif', 'svg')
+# Quiz level image resolution in TeX files
+QUIZ_RESOLUTION_RE = re.compile(r'\\SetQuizOption\s*'
+                                r'\{\s*(?:imgResolution|default_img_resolution)\s*\}'
+                                r'\s*\{\s*(\d+)\s*\}')
+
+# Quiz level settings, they apply to all questions whatever their position
+QUIZ_SETTINGS_XPATH = ("//*[@class='amc_quiz_options' or @class='amc_baremeDefautS'"
+                       " or @class='amc_baremeDefautM']")
+
 # activate logger
 Logger = logging.getLogger(__name__)
 
@@ -109,6 +151,188 @@ def scoring2dict(text):
     return scoring
 
 
+def quizSettings(trees):
+    """ Return the quiz level settings elements found in the LaTeXML `trees`.
+
+    Used when a quiz is converted by parts, the settings are returned in
+    document order.
+    """
+    settings = []
+    for tree in trees:
+        settings.extend(tree.xpath(QUIZ_SETTINGS_XPATH))
+    return settings
+
+
+# ======================================================================
+# Options
+# ======================================================================
+def parseBool(text):
+    """ Parse a boolean option, unlike `strtobool` other strings are invalid.
+    """
+    value = text.strip().lower()
+    if value in ("yes", "true", "t", "1"):
+        return True
+    if value in ("no", "false", "f", "0"):
+        return False
+    raise ValueError("expected true or false")
+
+
+class Number(float):
+    """ A float option written back in the output as in the tex file.
+
+    `str(Number('2'))` gives '2' and not '2.0', the output does not depend on
+    the parsing of the options.
+    """
+
+    def __new__(cls, text):
+        number = super().__new__(cls, text)
+        number.text = text.strip()
+        return number
+
+    def __getnewargs__(self):
+        return (self.text,)
+
+    def __str__(self):
+        return self.text
+
+
+def parseCalculatedParser(text):
+    """ Parse the name of a calculated question parser.
+    """
+    from ..utils.calculatedParser import PARSER_FACTORY
+    return parseChoice(*PARSER_FACTORY)(text)
+
+
+def parseChoice(*choices):
+    """ Return the parser of an option taking one of the `choices`.
+    """
+    def parse(text):
+        value = text.strip()
+        if value not in choices:
+            raise ValueError(f"expected one of {choices}")
+        return value
+    return parse
+
+
+# Parser of the option values found in the tex file {option name: parser}
+OPTION_TYPES = {'default_numeric_tol': Number,
+                'shuffle_all': parseBool,
+                'answer_numbering_format': parseChoice(*NUMBERING_FORMATS),
+                'amc_autocomplete': int,
+                'amc_aucune': str,
+                'amc_bs': scoring2dict,
+                'amc_bm': scoring2dict,
+                'moo_default_grade': Number,
+                'default_img_width': str.strip,
+                'default_img_resolution': int,
+                'calculated_default_parser': parseCalculatedParser,
+                'calculated_default_decimal_number': int,
+                'calculated_default_item_number': int,
+                'calculated_tolerancetype': int,
+                'calculated_tolerance': Number,
+                'calculated_correctanswerformat': int,
+                'calculated_correctanswerlength': int,
+                }
+
+
+class Options:
+    """ Typed and immutable options of a quiz or of a question.
+
+    The options are read as attributes, e.g. `options.shuffle_all`. The
+    values are parsed once, when they are found in the tex file, with
+    `OPTION_TYPES`. The options of a question are an overlay of the quiz
+    options, it only stores the overridden values (see `override`).
+    """
+    __slots__ = tuple(DEFAULT_OPTS) + ('_parent',)
+
+    def __init__(self, parent=None, **values):
+        """ Create the options from `DEFAULT_OPTS`, or from `parent` if provided,
+        overridden by the parsed `values`.
+        """
+        object.__setattr__(self, '_parent', parent)
+        if parent is None:
+            values = {**DEFAULT_OPTS, **values}
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __getattr__(self, name):
+        """ Look for the options not overridden in the parent options.
+        """
+        parent = object.__getattribute__(self, '_parent')
+        if parent is None or name not in DEFAULT_OPTS:
+            raise AttributeError(f"Unknown option '{name}'.")
+        return getattr(parent, name)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Options are immutable, use `override`.")
+
+    def __getstate__(self):
+        """ Return the state for pickle (process pool) and copy.
+        """
+        return self._parent, self.overridden()
+
+    def __setstate__(self, state):
+        parent, values = state
+        self.__init__(parent, **values)
+
+    def __repr__(self):
+        """ Change string representation.
+        """
+        return f"Instance of {self.__class__.__name__} with {self.asdict()}."
+
+    def overridden(self):
+        """ Return the values stored in this overlay {option name: value}.
+        """
+        values = {}
+        for name in DEFAULT_OPTS:
+            try:
+                values[name] = object.__getattribute__(self, name)
+            except AttributeError:
+                pass
+        return values
+
+    def asdict(self):
+        """ Return all the option values {option name: value}.
+        """
+        return {name: getattr(self, name) for name in DEFAULT_OPTS}
+
+    @staticmethod
+    def parse(name, text):
+        """ Parse the `text` value of the option `name` found in the tex file.
+
+        Returns
+        -------
+        tuple
+            The option name, aliases are resolved, and the typed value. None if
+            the option is unknown or if its value is invalid, the problem is
+            reported.
+        """
+        name = OPTION_ALIASES.get(name, name)
+        if name not in OPTION_TYPES:
+            Logger.warning(f"Unknown option '{name}', ignored.")
+            return None
+        try:
+            return name, OPTION_TYPES[name]('' if text is None else text)
+        except ValueError as e:
+            Logger.error(f"Invalid value '{text}' for option '{name}' ({e}), ignored.")
+            return None
+
+    def override(self, pairs):
+        """ Return the options overridden by the (name, text) `pairs` found in
+        the tex file.
+
+        The options are returned unchanged if there is no valid pair.
+        """
+        values = {}
+        for name, text in pairs:
+            parsed = self.parse(name, text)
+            if parsed is not None:
+                values[parsed[0]] = parsed[1]
+        if not values:
+            return self
+        return Options(self, **values)
+
+
 class ImageCustom:
     """ Create an Image class to create a common interface for Image libs.
 
@@ -137,6 +361,7 @@ class ImageCustom:
     def convertImage(self, fileIn, fileOut, resolution):
         """ Image conversion with wand.
         """
+        from wand.image import Image as wandImage  # slow to import
         im = wandImage(filename=fileIn, resolution=resolution)
         # remove timestamp from png (keep checksum unchanged for test)
         im.artifacts['png:exclude-chunks'] = 'date,time'
@@ -144,12 +369,212 @@ class ImageCustom:
         # for (k, v) in im.artifacts.items():
         #     print(k, v)
         Logger.debug(f"   Conversion from {os.path.splitext(fileIn)[1]} to {os.path.splitext(fileOut)[1]} (imgResolution={resolution}).")
-        im.save(filename=fileOut)
+        # write then rename, the same image may be converted concurrently
+        # by several questions
+        root, ext = os.path.splitext(fileOut)
+        fileTemp = f'{root}.{os.getpid()}-{threading.get_ident()}{ext}'
+        im.save(filename=fileTemp)
         im.close()
+        os.replace(fileTemp, fileOut)
+
+    @staticmethod
+    def convertBlob(data, resolution):
+        """ Image conversion of the content `data` to png with wand, in memory.
+        """
+        from wand.image import Image as wandImage  # slow to import
+        with wandImage(blob=data, resolution=resolution) as im:
+            im.artifacts['png:exclude-chunks'] = 'date,time'
+            im.strip()
+            Logger.debug(f"   Conversion from {im.format} to png (imgResolution={resolution}).")
+            return im.make_blob('png')
+
+
+class ImageCache:
+    """ Keep track of the converted images.
+
+    The path of each converted image is kept in memory during the run and, if
+    a `FileCache` is provided, the converted images are stored on disk for the
+    next runs. The key depends on the content of the source image, on the
+    resolution and on the output format, thus an image used by several
+    questions is converted only once.
+
+    The images can also be converted in advance in a background thread pool
+    (see `startPrefetch`), for instance while LaTeXML is running.
+
+    The `stats` dictionary counts the embedded images, the ones that have been
+    reused during the run and the duplicates removed from a file area.
 
+    If a `resolver` is provided, the images are not read from the disk: the
+    resolver returns the content of an image from its name, relative to the
+    input directory, and the images are converted and embedded in memory
+    (see `payload`).
+    """
+
+    def __init__(self, filecache=None, resolver=None):
+        """ Create an empty in-memory cache, backed by `filecache` if provided.
+        """
+        self.filecache = filecache
+        self.resolver = resolver
+        self.paths = {}
+        # base64 payloads of the images given by the resolver
+        self.payloads = {}
+        # keys converted in advance and not used yet
+        self.prefetched = set()
+        self.stats = dict.fromkeys(('embedded', 'reused', 'removed', 'removed_bytes'), 0)
+        self._lock = threading.Lock()
+        self._locks = {}
+        self._executor = None
+
+    def __getstate__(self):
+        """ Locks and executor cannot be pickled (used by process pool).
+        """
+        with self._lock:
+            state = self.__dict__.copy()
+            state['paths'] = self.paths.copy()
+            state['prefetched'] = self.prefetched.copy()
+            state['payloads'] = self.payloads.copy()
+        del state['_lock'], state['_locks']
+        state['_executor'] = None
+        return state
+
+    def __setstate__(self, state):
+        """ Create new locks after unpickling.
+        """
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    @staticmethod
+    def key(filename, resolution, fmt='png'):
+        """ Return the key of the image `filename` converted to `fmt`.
+        """
+        return FileCache.key(hash_file(filename), str(resolution), fmt)
+
+    def source(self, key, path, convert=None, prefetch=False):
+        """ Return the path of the converted image `key`.
+
+        If the image is not known yet, it is copied from the disk cache in
+        `path` or created in `path` by calling `convert()`. `convert` is None
+        if the image in `path` can be used as it is. If `prefetch` is True,
+        the image is not counted as embedded.
+        """
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        # concurrent requests of the same image wait for the first one
+        with lock:
+            source = self.paths.get(key)
+            if source is None:
+                source = path
+                if convert is not None and (self.filecache is None
+                                            or self.filecache.get(key, dest=path) is None):
+                    convert()
+                    if self.filecache is not None:
+                        self.filecache.put(key, path)
+                with self._lock:
+                    self.paths[key] = source
+                    if prefetch:
+                        self.prefetched.add(key)
+            elif not prefetch:
+                with self._lock:
+                    first = key in self.prefetched
+                    self.prefetched.discard(key)
+                if not first:
+                    self.count(reused=1)
+        if not prefetch:
+            self.count(embedded=1)
+        return source
+
+    def convert(self, filename, directory, resolution, prefetch=False):
+        """ Return the path of the image `filename` converted in png.
+
+        The converted image is named after its key and stored in `directory`.
+        """
+        key = self.key(filename, resolution)
+        path = os.path.join(directory, key + '.png')
+        return self.source(key, path, lambda: ImageCustom(filename, path, resolution),
+                           prefetch)
+
+    def payload(self, name, resolution):
+        """ Return the base64 payload of the image `name`, given by the resolver.
+
+        The image is converted in png, except if it is already a png file.
+        """
+        data = self.resolver(name)
+        if data.startswith(PNG_SIGNATURE):
+            resolution = None
+        key = FileCache.key(hashlib.sha256(data).hexdigest(), str(resolution), 'png')
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            payload = self.payloads.get(key)
+            if payload is None:
+                if resolution is not None:
+                    data = ImageCustom.convertBlob(data, resolution)
+                payload = base64.b64encode(data).decode('ascii')
+                with self._lock:
+                    self.payloads[key] = payload
+            else:
+                self.count(reused=1)
+        self.count(embedded=1)
+        return payload
+
+    def startPrefetch(self, jobs=None):
+        """ Start the thread pool used to convert images in advance.
 
-def encodeImg(Ii, pathin, pathout, resolution=DEFAULT_OPTS['default_img_resolution']):
-    """ Convert image to png and encode it in base64 text.
+        Parameters
+        ----------
+        jobs : int, optional
+            Number of threads. The default is None (see ThreadPoolExecutor).
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=jobs)
+
+    def prefetch(self, filename, directory, resolution=DEFAULT_IMG_RESOLUTION):
+        """ Convert the image `filename` in background if the prefetch is started.
+
+        The errors are ignored, they will be raised again when the image is
+        really converted.
+        """
+        if self._executor is None:
+            return
+
+        def run():
+            try:
+                self.convert(filename, directory, resolution, prefetch=True)
+            except Exception as e:
+                Logger.debug(f'   Prefetch of {filename} failed: {e}')
+        self._executor.submit(run)
+
+    def shutdown(self):
+        """ Wait for the images converted in advance and stop the thread pool.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def count(self, **increments):
+        """ Increment the `stats` counters.
+        """
+        with self._lock:
+            for name, value in increments.items():
+                self.stats[name] += value
+
+    def report(self):
+        """ Log a summary of the `stats`.
+        """
+        stats = self.stats
+        if stats['embedded'] == 0:
+            return
+        Logger.info(f" >  {stats['embedded']} embedded images, {stats['reused']} reused "
+                    "(not converted again), "
+                    f"{stats['removed']} duplicates removed "
+                    f"({stats['removed_bytes'] / 1024:.0f} kB saved in the output).")
+
+
+def encodeImg(Ii, pathin, pathout, resolution=DEFAULT_OPTS['default_img_resolution'],
+              cache=None):
+    """ Convert image to png and replace its content by the placeholder of its
+    base64 payload.
 
     Parameters
     ----------
@@ -160,6 +585,8 @@ def encodeImg(Ii, pathin, pathout, resolution=DEFAULT_OPTS['default_img_resoluti
         the input and output path
     resolution : Int
         The resolution used in image convertion.
+    cache : ImageCache, optional
+        Cache of the converted images. The default is None (no cache).
     """
 
     ext = Ii.attrib['ext']
@@ -173,15 +600,15 @@ def encodeImg(Ii, pathin, pathout, resolution=DEFAULT_OPTS['default_img_resoluti
         img_name_out = img_name + ".png"
         # im.write(pathF + img_name)
         img_path = os.path.join(pathout, img_name_out)
-        im = ImageCustom(os.path.join(pathF, img_name_in),
-                         img_path, resolution)
+        img_src = os.path.join(pathF, img_name_in)
     else:
         img_name_out = Ii.attrib['name'] + '.' + ext
         img_path = os.path.join(pathF, img_name_out)
+        # png are embedded as they are
+        img_src, resolution = img_path, None
 
     # print(Ii.attrib['ext'])
     # print(pathF)
-    img_file = open(img_path, "rb")
     Ii.attrib.update({'name': img_name_out, 'path': '/',
                       'encoding': "base64",
                       'pathF': ''})   # remove path question
@@ -193,21 +620,133 @@ def encodeImg(Ii, pathin, pathout, resolution=DEFAULT_OPTS['default_img_resoluti
         attrib.clear()
         attrib.update(attributes)
     # Embbed image
-    Ii.text = base64.b64encode(img_file.read())
-    img_file.close()
+    if cache is not None and cache.resolver is not None:
+        # in memory, the payload is in the tree
+        Ii.text = cache.payload(os.path.relpath(img_src, pathin), resolution)
+        return
+    if cache is None:
+        if img_src != img_path:
+            ImageCustom(img_src, img_path, resolution)
+        source = img_path
+    elif img_src == img_path:
+        source = cache.source(ImageCache.key(img_src, resolution), img_path)
+    else:
+        source = cache.convert(img_src, pathout, resolution)
+    # the base64 payload is only written in the output by `writeMoodle`
+    Ii.text = fileToken(source)
+
+
+def includedGraphics(tex, pathin):
+    """ Return the image files included with `\\includegraphics` in `tex`.
+
+    The relative paths are resolved from `pathin`. If the extension is
+    missing, all the existing files with an extension of `GRAPHICS_EXTENSIONS`
+    are returned, like the LaTeXML `candidates`.
+
+    Parameters
+    ----------
+    tex : string
+        The TeX source, usually flattened.
+    pathin : string
+        The directory of the TeX file.
+
+    Returns
+    -------
+    list
+        The existing image files, without duplicates.
+    """
+    files = {}
+    for match in INCLUDEGRAPHICS_RE.finditer(tex):
+        name = os.path.normpath(os.path.join(pathin, match.group(1).strip()))
+        if os.path.splitext(name)[1]:
+            candidates = [name]
+        else:
+            candidates = [name + '.' + ext for ext in GRAPHICS_EXTENSIONS]
+        files.update(dict.fromkeys(c for c in candidates if os.path.isfile(c)))
+    return list(files)
+
+
+def quizImageResolution(tex):
+    """ Return the quiz level image resolution set in the TeX source `tex`.
+
+    Used to convert the images before the quiz options are parsed, the last
+    `\\SetQuizOption{imgResolution}{...}` wins. The default is
+    `DEFAULT_IMG_RESOLUTION`.
+    """
+    resolution = DEFAULT_IMG_RESOLUTION
+    for match in QUIZ_RESOLUTION_RE.finditer(tex):
+        # skip commented out options
+        if '%' not in tex[tex.rfind('\n', 0, match.start()) + 1:match.start()]:
+            resolution = int(match.group(1))
+    return resolution
+
+
+def fileToken(path):
+    """ Return the placeholder of the base64 payload of the file `path`.
+    """
+    return FILE_TOKEN.format(os.fsencode(os.path.abspath(path)).hex())
+
+
+def fileTokenPath(token):
+    """ Return the path of the file from its placeholder `token` (str or bytes).
+    """
+    if isinstance(token, str):
+        token = token.encode()
+    return os.fsdecode(bytes.fromhex(FILE_TOKEN_RE.fullmatch(token).group(1).decode()))
+
+
+def base64Size(path):
+    """ Return the size of the base64 payload of the file `path`.
+    """
+    return 4 * -(-os.path.getsize(path) // 3)
+
+
+def payloadSize(text):
+    """ Return the size of the base64 payload `text`, or of its placeholder.
+    """
+    if FILE_TOKEN_RE.fullmatch(text.encode()):
+        return base64Size(fileTokenPath(text))
+    return len(text)
+
+
+def writeBase64(path, f, memo=None):
+    """ Write the base64 payload of the file `path` in the binary file `f`.
+
+    The file is read by chunks. If `memo` is provided ({path: payload}), the
+    payload is also kept in it, as long as the total size of the payloads
+    remains below `BASE64_MEMO_SIZE`, and it is written again from `memo`
+    without reading and encoding the file again.
+    """
+    if memo is not None and path in memo:
+        f.write(memo[path])
+        return
+    keep = (memo is not None
+            and base64Size(path) + sum(map(len, memo.values())) <= BASE64_MEMO_SIZE)
+    chunks = []
+    with open(path, 'rb') as img_file:
+        for chunk in iter(lambda: img_file.read(BASE64_CHUNK_SIZE), b''):
+            data = base64.b64encode(chunk)
+            f.write(data)
+            if keep:
+                chunks.append(data)
+    if keep:
+        memo[path] = b''.join(chunks)
 
 
 class AMCQuestion(ABC):
     """ Abstract class for all questions.
     """
 
-    def __init__(self, Qi, context):
+    def __init__(self, Qi, context, seed=None):
         """ Init class from an etree Element amc_question*.
+
+        `seed` initializes the random generator of the question.
         """
         self.Qi = Qi
         self.name = Qi.find('name/text').text
         self.context = context
-        self.options = context.options.copy()
+        self.options = context.options
+        self.random = random.Random(seed)
 
     def __repr__(self):
         """ Change string representation.
@@ -219,6 +758,7 @@ class AMCQuestion(ABC):
         """ Change string representation to print the tree.
         """
         rep = self.__repr__()
+        from xml.sax.saxutils import unescape  # slow to import
         s = unescape(etree.tostring(self.Qi, pretty_print=True,
                                     encoding='utf8').decode('utf8'))
         return '\n'.join((rep, s))
@@ -228,39 +768,43 @@ class AMCQuestion(ABC):
         """
         # inclusion des images dans les questions & réponses
         Ilist = self.Qi.xpath(".//file")
+        # name of the files of each file area (question text, answers)
+        areas = {}
         for Ii in Ilist:
             Ii = encodeImg(Ii, self.context.pathin, self.context.wdir,
-                           int(self._setWithOptionsOrDefault('imgResolution',
-                                                             'default_img_resolution')))
+                           self.options.default_img_resolution,
+                           self.context.image_cache)
+        # In moodle XML, the files are referenced by their name in their file area,
+        # thus duplicates in the same area are useless. Files cannot be shared
+        # between areas or questions, they are kept there.
+        for Ii in Ilist:
+            parent = Ii.getparent()
+            names = areas.setdefault(parent, {})
+            if names.get(Ii.attrib['name']) == Ii.text:
+                parent.remove(Ii)
+                self.context.image_cache.count(removed=1,
+                                               removed_bytes=payloadSize(Ii.text))
+            else:
+                names.setdefault(Ii.attrib['name'], Ii.text)
 
     @abstractmethod
     def _scoring(self):
         pass
 
     def _options(self):
-        """ Look for amc_options elements and store them in options.
+        """ Look for amc_options elements and override the quiz options.
         """
         Qi = self.Qi
         optlist = Qi.xpath(".//options")
 
+        pairs = []
         for opt in optlist:
             # the option name is in 'name' attribute
-            self.options[opt.attrib['name']] = opt.text
+            pairs.append((opt.attrib['name'], opt.text))
             opt.getparent().remove(opt)
             Logger.debug("   Modified options '{}' to '{}'".format(opt.attrib['name'],
-                         self.options[opt.attrib['name']]))
-
-    def _setWithOptionsOrDefault(self, opt_name, default_value):
-        """ Set an option to its value if provided, else use default value.
-
-        Some internal option name `default_value` are too long and for backward compatibility
-        the api option name `opt_name` are not always the same.
-        This function allow to create the local mapping.
-        """
-        if opt_name in self.options.keys():
-            return self.options[opt_name]
-        else:
-            return self.options[default_value]
+                                                                   opt.text))
+        self.options = self.options.override(pairs)
 
     def convert(self):
         """ Run all questions convertion steps.
@@ -282,7 +826,7 @@ class AMCQuestionSimple(AMCQuestion):
         super()._options()
         Qi = self.Qi
         # check local shuffle policy
-        Qiwantshuffle = strtobool(self.options['shuffle_all'])
+        Qiwantshuffle = self.options.shuffle_all
         optlist = Qi.xpath("./note[@class='amc_choices_options']")
         if optlist and 'o' in optlist[0].text.strip().split(","):
             Qiwantshuffle = False
@@ -290,7 +834,7 @@ class AMCQuestionSimple(AMCQuestion):
         etree.SubElement(Qi, "shuffleanswers").text = str(Qiwantshuffle).lower()
 
         # store local answernumbering policy
-        etree.SubElement(Qi, "answernumbering").text = self.options['answer_numbering_format']
+        etree.SubElement(Qi, "answernumbering").text = self.options.answer_numbering_format
 
     def _scoring(self):
         """ Compute the scoring.
@@ -298,7 +842,7 @@ class AMCQuestionSimple(AMCQuestion):
         Qi = self.Qi
         # specific part scoring part
         # add  <defaultgrade>1.0000000</defaultgrade>
-        etree.SubElement(Qi, "defaultgrade").text = str(self.options['moo_default_grade'])
+        etree.SubElement(Qi, "defaultgrade").text = str(self.options.moo_default_grade)
         # add <single>true</single>
         etree.SubElement(Qi, "single").text = 'true'
         # est qu'il y a une bareme local cherche dans les child
@@ -338,7 +882,7 @@ class AMCQuestionMult(AMCQuestionSimple):
         Qi = self.Qi
         # specific part scoring part
         # add  <defaultgrade>1.0000000</defaultgrade>
-        etree.SubElement(Qi, "defaultgrade").text = str(self.options['moo_default_grade'])
+        etree.SubElement(Qi, "defaultgrade").text = str(self.options.moo_default_grade)
         # add <single>false</single>
         etree.SubElement(Qi, "single").text = 'false'
         # est qu'il y a une bareme local cherche dans les child
@@ -369,20 +913,20 @@ class AMCQuestionMult(AMCQuestionSimple):
         # =====================================================================
         # Ajouter les réponses "aucune réponse"
         # Si déjà une bonne réponse on en ajoute une mauvaise
-        if ((int(self.options['amc_autocomplete']) == 1) & (NRb > 0)):
+        if ((self.options.amc_autocomplete == 1) & (NRb > 0)):
             aucune = etree.SubElement(Qi, 'note',
                                       attrib={'class': 'amc_mauvaise'})
             aucunec = etree.SubElement(aucune, 'note')
-            aucunec.text = self.options['amc_aucune']
+            aucunec.text = self.options.amc_aucune
             NRm += 1
             Rlistm.append(aucune)
 
         # Si pas de bonne on en ajoute une bonne
-        if ((int(self.options['amc_autocomplete']) == 1) & (NRb == 0)):
+        if ((self.options.amc_autocomplete == 1) & (NRb == 0)):
             aucune = etree.SubElement(Qi, 'note',
                                       attrib={'class': 'amc_bonne'})
             aucunec = etree.SubElement(aucune, 'note')
-            aucunec.text = self.options['amc_aucune']
+            aucunec.text = self.options.amc_aucune
             NRb += 1
             Rlistb.append(aucune)
 
@@ -445,7 +989,7 @@ class AMCQuestionNumeric(AMCQuestion):
 
         # if no tolerance specified and float answer, add default tol
         if not(target.is_integer()) and tol == 0:
-            tol = float(self.options['default_numeric_tol']) * target
+            tol = self.options.default_numeric_tol * target
 
         # good answers [x-tol; x+tol] -> scoreexact/scoreexact
         self._addanswer(Qi, 100, target, tol)
@@ -485,7 +1029,7 @@ class AMCQuestionOpen(AMCQuestion):
         """
         Qi = self.Qi
         # add  <defaultgrade>1.0000000</defaultgrade>
-        etree.SubElement(Qi, "defaultgrade").text = str(self.options['moo_default_grade'])
+        etree.SubElement(Qi, "defaultgrade").text = str(self.options.moo_default_grade)
 
 
 class AMCQuestionDescription(AMCQuestion):
@@ -519,7 +1063,9 @@ class _Calculated:
         """
         Qi = self.Qi
         # parse fp expressions
-        parser = CreateCalculatedParser(self.options['calculated_default_parser'])
+        # pyparsing is slow to import, it is only loaded for calculated questions
+        from ..utils.calculatedParser import CreateCalculatedParser
+        parser = CreateCalculatedParser(self.options.calculated_default_parser)
         for orig_text in Qi.xpath(".//questiontext/note|.//note[@class='amc_bonne']/note|.//note[@class='amc_mauvaise']/note"):
             rawtext = (etree.tostring(orig_text, encoding='utf8')
                             .decode('utf-8')
@@ -562,16 +1108,16 @@ class _Calculated:
         # add them to each answer good or wrong
         for ans in Qi.xpath(".//note[@class='amc_bonne']|.//note[@class='amc_mauvaise']"):
             tolerance = etree.Element('tolerance')
-            tolerance.text = str(self.options['calculated_tolerance'])
+            tolerance.text = str(self.options.calculated_tolerance)
 
             tolerancetype = etree.Element('tolerancetype')
-            tolerancetype.text = str(self.options['calculated_tolerancetype'])
+            tolerancetype.text = str(self.options.calculated_tolerancetype)
 
             correctanswerformat = etree.Element('correctanswerformat')
-            correctanswerformat.text = str(self.options['calculated_correctanswerformat'])
+            correctanswerformat.text = str(self.options.calculated_correctanswerformat)
 
             correctanswerlength = etree.Element('correctanswerlength')
-            correctanswerlength.text = str(self.options['calculated_correctanswerlength'])
+            correctanswerlength.text = str(self.options.calculated_correctanswerlength)
 
             fields = [tolerance, tolerancetype, correctanswerformat,
                       correctanswerlength]
@@ -604,12 +1150,10 @@ class _Calculated:
             minimum = self._SubElement_text(data, 'minimum', '0')
             maximum = self._SubElement_text(data, 'maximum', '1')
             # Decimal number
-            decimal_number = int(self._setWithOptionsOrDefault('decimalNumber',
-                                                               'calculated_default_decimal_number'))
+            decimal_number = self.options.calculated_default_decimal_number
             decimals = self._SubElement_text(data, 'decimals', str(decimal_number))
             # nitems in the dataset
-            nitems = int(self._setWithOptionsOrDefault('nitems',
-                                                       'calculated_default_item_number'))
+            nitems = self.options.calculated_default_item_number
             itemcount = etree.SubElement(data, 'itemcount')
             itemcount.text = str(nitems)
             number_of_items = etree.SubElement(data, 'number_of_items')
@@ -623,7 +1167,7 @@ class _Calculated:
                 # moodle indexes start at 1
                 number.text = str(i+1)
                 value = etree.SubElement(dataset_item, 'value')
-                rand = random.uniform(0, 1)
+                rand = self.random.uniform(0, 1)
                 # limit the number of digits
                 rand = round(rand, decimal_number)
                 value.text = str(rand)
@@ -688,7 +1232,7 @@ Q_FACTORY = {'amc_questionmult': AMCQuestionMult,
              'amc_questionmultcalcmult': AMCQuestionMultCalcMult}
 
 
-def CreateQuestion(qtype, Qi, context):
+def CreateQuestion(qtype, Qi, context, seed=None):
     """ Factory function for creating the Questions* objects.
 
     Parameters
@@ -699,6 +1243,8 @@ def CreateQuestion(qtype, Qi, context):
         The XML tree of the considered question.
     context : Context
         The environnement variable.
+    seed : int, optional
+        The seed of the random generator of the question. The default is None.
 
     Returns
     -------
@@ -707,11 +1253,100 @@ def CreateQuestion(qtype, Qi, context):
     """
 
     try:
-        return Q_FACTORY[qtype](Qi, context)
+        return Q_FACTORY[qtype](Qi, context, seed)
     except NameError:
         raise KeyError(f" 'qtype' argument should be in {Q_FACTORY.keys()}")
 
 
+def convertSerializedQuestion(qtype, data, context, seed):
+    """ Convert the serialized question `data` and return it serialized.
+
+    Used to convert the questions in a thread or a process pool, each question
+    is parsed in its own document.
+
+    Returns
+    -------
+    data : bytes
+        The converted question.
+    counter : dict
+        The number of logged warnings and errors during the conversion.
+    stats : dict
+        The increments of the image cache `stats` during the conversion.
+    """
+    before = dict(Logger.counter)
+    before_stats = dict(context.image_cache.stats)
+    Qi = etree.fromstring(data, etree.XMLParser(strip_cdata=False))
+    CreateQuestion(qtype, Qi, context, seed).convert()
+    counter = {key: Logger.counter[key] - before[key] for key in before}
+    stats = {key: context.image_cache.stats[key] - before_stats[key] for key in before_stats}
+    return etree.tostring(Qi), counter, stats
+
+
+def writeMoodle(tree, fileout, debug=False):
+    """ Write the moodle XML `tree` in `fileout`, one top level element at a time.
+
+    The output is the same as `etree.tostring(tree, pretty_print=True)` but
+    each question is serialized and written as soon as possible and then
+    removed from the tree, thus the peak memory does not depend on the
+    size of the whole serialized quiz. The image placeholders (see
+    `fileToken`) are replaced by the base64 payload of the images, streamed
+    from the image files. The payloads are kept during the write, up to
+    `BASE64_MEMO_SIZE`, thus an image used by several questions is only
+    encoded once.
+
+    Parameters
+    ----------
+    tree : etree.ElementTree
+        The moodle XML tree. It is emptied.
+    fileout : string or binary file object
+        The output file name, or an opened file (`io.BytesIO`...).
+    debug : bool, optional
+        If True, log each written element. The default is False.
+    """
+    root = tree.getroot()
+    # libxml2 only indents the children of elements without text children
+    indent = root.text is None and all(child.tail is None for child in root)
+    if hasattr(fileout, 'write'):
+        output = contextlib.nullcontext(fileout)
+    else:
+        output = open(fileout, 'wb')
+    # base64 payloads already written {path: payload}
+    payloads = {}
+    with output as f:
+        # processing instructions before the root element
+        for pi in reversed(list(root.itersiblings(preceding=True))):
+            f.write(etree.tostring(pi) + b'\n')
+        with etree.xmlfile(f, encoding='utf-8') as xf:
+            with xf.element(root.tag, root.attrib, nsmap=root.nsmap):
+                if root.text:
+                    xf.write(root.text)
+                for child in list(root):
+                    if indent:
+                        # alone in a copy of the root, the child is pretty
+                        # printed by libxml2 at the same level as in the tree
+                        wrapper = etree.Element(root.tag, nsmap=root.nsmap)
+                        wrapper.append(child)
+                        data = etree.tostring(wrapper, encoding="utf-8", pretty_print=True)
+                        # keep '\n  <child>...</child>', without the root tags
+                        data = data[data.index(b'>') + 1:data.rindex(b'\n</')]
+                    else:
+                        data = etree.tostring(child, encoding="utf-8")
+                        root.remove(child)
+                    if debug:
+                        Logger.debug(data)
+                    # write directly in the file, after the pending output
+                    xf.flush()
+                    pos = 0
+                    for match in FILE_TOKEN_RE.finditer(data):
+                        f.write(data[pos:match.start()])
+                        writeBase64(fileTokenPath(match.group(0)), f, payloads)
+                        pos = match.end()
+                    f.write(data[pos:])
+                if indent:
+                    xf.write('\n')
+        f.write(b'\n')
+
+
 class Context:
     """ Contains the context of the quizz, like path, default options.
 
@@ -762,6 +1397,21 @@ class AMCQuiz:
     deb : int, optional
         Set to 1 to store all intermediate files for debugging.
         The default is 0.
+    fused : bool, optional
+        Remove namespace and recast question types in a single XSLT pass.
+        The output is identical. The default is False.
+    jobs : int, optional
+        Number of questions converted in parallel. The default is 1.
+    pool : string, optional
+        Kind of pool used when `jobs > 1`, 'thread' or 'process'.
+        The default is 'thread'.
+    image_cache : FileCache or ImageCache, optional
+        On-disk cache of the converted images, or the cache of the images
+        already converted in advance. The default is None, the images are
+        only converted once during the run.
+    seed : int or string, optional
+        Seed of the random generator of the quiz (calculated questions
+        datasets). The default is None, the `random` module is used.
     """
 
     # path to xslt stylesheet
@@ -777,21 +1427,37 @@ class AMCQuiz:
     # 4. remane element and finish the job
     filexslt = os.path.join(os.path.dirname(__file__),
                             "transform.xslt")
+    # 1. and 2. in a single pass, also remove text outside questions
+    filexslt_ns_qtype = os.path.join(os.path.dirname(__file__),
+                                     "transform_ns_qtype.xslt")
 
-    def __init__(self, xml, pathin, wdir, catname, deb=0):
+    def __init__(self, xml, pathin, wdir, catname, deb=0, fused=False,
+                 jobs=1, pool='thread', image_cache=None, seed=None):
         """ Init class from an etree Element.
         """
         self.xml = xml
         self.pathin = pathin
         self.wdir = wdir
         self.deb = deb
+        self.fused = fused
+        self.jobs = jobs
+        if pool not in POOLS:
+            raise ValueError(f"'pool' argument should be in {tuple(POOLS)}.")
+        self.pool = pool
+        if isinstance(image_cache, ImageCache):
+            self.image_cache = image_cache
+        else:
+            self.image_cache = ImageCache(image_cache)
+        # source files of the images
+        self.images = []
 
-        # Set default options
-        self.options = DEFAULT_OPTS
+        # Set default options, modified by the quiz options
+        self.options = Options()
+        self.random = random if seed is None else random.Random(seed)
 
         # default scroring
-        self.amc_bs = self.options['amc_bs']
-        self.amc_bm = self.options['amc_bm']
+        self.amc_bs = dict(self.options.amc_bs)
+        self.amc_bm = dict(self.options.amc_bm)
 
         # store total number of question
         self.Qtot = 0
@@ -814,29 +1480,40 @@ class AMCQuiz:
         """ Change string representation to print the tree.
         """
         rep = self.__repr__()
+        from xml.sax.saxutils import unescape  # slow to import
         s = unescape(etree.tostring(self.tree, pretty_print=True,
                                     encoding='utf8').decode('utf8'))
         return '\n'.join((rep, s))
 
     def toMoodle(self, fileout):
         """ Run AMC to moodle XML conversion and save it in fileout.
+
+        The logged events are counted for this conversion only.
+        """
+        with run_counters():
+            self._toMoodle(fileout)
+
+    def _toMoodle(self, fileout):
+        """ Run the conversion steps, see `toMoodle`.
         """
 
         # Run preprocessing
         self._preProcessing()
+        # Parse Quiz level options, used by all the next steps
+        self._options()
         # Process graphics
         self._graphics()
 
         # Reshape, text formating, math, image, tableau
-        transform_pre = etree.XSLT(etree.parse(self.filexslt_pre))
+        transform_pre = xslt.transformer(self.filexslt_pre)
         # apply XSLT transformation
         self.tree = transform_pre(self.tree)
         if (self.deb == 1):
             # ecriture
             self.tree.write(self._tempfile(), pretty_print=True, encoding="utf-8")
 
-        # Parse Quiz level options
-        self._options()
+        # Group elements by class for all the next steps
+        self._indexClasses()
 
         # Parse quiz level scorings
         self._scoring()
@@ -852,7 +1529,7 @@ class AMCQuiz:
             self.tree.write(self._tempfile(), pretty_print=True, encoding="utf-8")
 
         # Reformatage à partir de xslt
-        transform = etree.XSLT(etree.parse(self.filexslt))
+        transform = xslt.transformer(self.filexslt)
         # apply XSLT transformation
         self.tree = transform(self.tree)
 
@@ -863,33 +1540,33 @@ class AMCQuiz:
             # Remove the now useless `cdata` element
             cdata.getparent().remove(cdata)
 
-        # Save output
-        s = etree.tostring(self.tree, pretty_print=True, encoding="utf-8").decode('utf-8')
-        if (self.deb == 1):
-            Logger.debug(etree.tostring(self.tree, pretty_print=True, encoding="utf-8"))
-        with open(fileout, 'w') as f:
-            f.write(s)
+        # Save output, the tree is consumed
+        writeMoodle(self.tree, fileout, debug=(self.deb == 1))
 
         # Conversion summary
         Logger.debug(" ")
-        Logger.debug(" > global 'shuffleanswers' is {}.".format(strtobool(self.options['shuffle_all'])))
-        Logger.debug(" > global 'answerNumberingFormat' is '{}'.".format(self.options['answer_numbering_format']))
+        Logger.debug(" > global 'shuffleanswers' is {}.".format(self.options.shuffle_all))
+        Logger.debug(" > global 'answerNumberingFormat' is '{}'.".format(self.options.answer_numbering_format))
         Logger.debug(f" > {self.Qtot} questions converted.")
 
+        # Summary of embedded images
+        self.image_cache.report()
+
         # Summary of logged events in convert.py only
         log_msg = " >  Found {} Warnings and {} Errors during conversion (see above)."
         Logger.info(log_msg.format(Logger.counter['warning'],
                                Logger.counter['error'] + Logger.counter['critical']))
 
-    def _element_pre_process(self, tree):
+    def _element_pre_process(self, tree, remove=True):
         """ Test if `element` blocks contain text outside 'Question'
         environnement and remove them.
 
         Need to be removed before html conversion because of parsing issues
-        with CDATA.
+        with CDATA. If `remove` is False, they are only reported (the fused
+        stylesheet removes them).
         """
         # These elements should be <para> nodes at roots level.
-        all_para = tree.findall('./para')
+        all_para = tree.xpath("/*/*[local-name()='para']")
         if len(all_para) > 0:
             Logger.warning(f" > {len(all_para)} '\\element' blocks contain text outside "
                            + "'Question environnement'. "
@@ -901,7 +1578,8 @@ class AMCQuiz:
         for para in all_para:
             Logger.debug(" * Remove \\element{}{} content outside '\\question' env.: \n"
                          + etree.tostring(para, pretty_print=True).decode('utf-8'))
-            para.getparent().remove(para)
+            if remove:
+                para.getparent().remove(para)
 
         return tree
 
@@ -915,9 +1593,20 @@ class AMCQuiz:
         # tree = etree.parse(self.xml, parser)
         tree = etree.parse(self.xml)
 
+        if self.fused:
+            # Report text outside `\Question*`, removed by the stylesheet
+            self._element_pre_process(tree, remove=False)
+            # remove namespace and rename generic AMC question in one pass
+            transform_ns_qtype = xslt.transformer(self.filexslt_ns_qtype)
+            tree = transform_ns_qtype(tree)
+            if (self.deb == 1):
+                tree.write(self._tempfile(), pretty_print=True, encoding="utf-8")
+            self.tree = tree
+            return
+
         # remove namespace
         # TODO a terme faire autrement
-        transform_ns = etree.XSLT(etree.parse(self.filexslt_ns))
+        transform_ns = xslt.transformer(self.filexslt_ns)
         # applique transformation
         tree = transform_ns(tree)
         # store ouput for debug
@@ -927,7 +1616,7 @@ class AMCQuiz:
         # Test and clean if `element` contains other data than `\Question*`
         tree = self._element_pre_process(tree)
         # rename generic AMC question into more specific type
-        transform_qtype = etree.XSLT(etree.parse(self.filexslt_qtype))
+        transform_qtype = xslt.transformer(self.filexslt_qtype)
         # apply transform
         tree = transform_qtype(tree)
         # store ouput for debug
@@ -937,23 +1626,44 @@ class AMCQuiz:
         # store the tree
         self.tree = tree
 
+    def _indexClasses(self):
+        """ Group all the elements of the tree by `class` in a single walk.
+
+        The groups are stored in `self.index` and keep the document order.
+        The next steps only modify the content of these elements, thus the
+        index remains valid until the final XSLT transformation.
+        """
+        index = defaultdict(list)
+        for elem in self.tree.iter(tag=etree.Element):
+            cls = elem.get('class')
+            if cls is not None:
+                index[cls].append(elem)
+        self.index = index
+
     def _options(self):
         """ Find and parse quiz level options.
         """
         opts = self.tree.xpath("//*[@class='amc_quiz_options']")
+        pairs = []
         for opt in opts:
             # The option name is in 'name' attribute
-            self.options[opt.attrib['role']] = opt.text
+            pairs.append((opt.attrib['role'], opt.text))
             opt.getparent().remove(opt)
             Logger.debug("   Modified Quizz options '{}' to '{}'".format(opt.attrib['role'],
-                         self.options[opt.attrib['role']]))
+                                                                        opt.text))
+        # all the quiz options are parsed and checked once
+        self.options = Options(**self.options.override(pairs).overridden())
+        # default scorings given as options may be partial, they complete
+        # the default ones and `_scoring` may change them
+        self.amc_bs = {**DEFAULT_OPTS['amc_bs'], **self.options.amc_bs}
+        self.amc_bm = {**DEFAULT_OPTS['amc_bm'], **self.options.amc_bm}
 
     def _scoring(self):
         """ Find and convert default scoring.
         """
         # look for amc_baremeDefautS and amc_baremeDefautM attribut
         # on cherche s'il existe un barème par défaut pour question simple
-        bars = self.tree.xpath("//*[@class='amc_baremeDefautS']")
+        bars = self.index['amc_baremeDefautS']
         # bar[0].text contient la chaine de caractère
         if len(bars) > 0:
             # on découpe bar[0].text et on affecte les nouvelles valeurs par défaut
@@ -964,7 +1674,7 @@ class AMCQuiz:
             self.amc_bs.update(amc_bs)
 
         # on cherche s'il existe un barème par défaut pour question multiple
-        barm = self.tree.xpath("//*[@class='amc_baremeDefautM']")
+        barm = self.index['amc_baremeDefautM']
         # bar[0].text contient la chaine de caractère
         if len(barm) > 0:
             # on découpe bar[0].text et on affecte les nouvelles valeurs par défaut
@@ -989,8 +1699,12 @@ class AMCQuiz:
             try:
                 img_name = Ii.attrib['candidates'].split(',')[-1]   # get the last candidates
             except KeyError as e:
-                Logger.warning('No Image file candidates. Probably due to a wrong path : {}'.format(Ii.attrib['graphic']))
-                raise e
+                if self.image_cache.resolver is not None:
+                    # the files are not seen by LaTeXML, the resolver knows them
+                    img_name = Ii.attrib['graphic']
+                else:
+                    Logger.warning('No Image file candidates. Probably due to a wrong path : {}'.format(Ii.attrib['graphic']))
+                    raise e
             ext = img_name.split('.')[-1]
             # not all attrib are mandatory... check if they exist before using them
             # try for class
@@ -1009,7 +1723,7 @@ class AMCQuiz:
                         img_dim = key
             else:
                 img_options = ''
-                img_size = self.options['default_img_width']
+                img_size = self.options.default_img_width
                 img_dim = 'width'
 
             img_path = os.path.dirname(os.path.normpath(os.path.join(self.pathin, img_name)))
@@ -1019,12 +1733,17 @@ class AMCQuiz:
             Ii.attrib.update({'ext': ext, 'dim': img_dim, 'size': img_size,
                               'pathF': img_path, 'align': align[img_align],
                               'name': name})
+            self.images.append(os.path.join(img_path, name + '.' + ext))
+            # start the conversion while the questions are processed
+            if ext != 'png':
+                self.image_cache.prefetch(self.images[-1], self.wdir,
+                                          self.options.default_img_resolution)
 
     def _categories(self):
         """ Find and convert categories.
         """
         # <text>$course$/filein/amc_element_tag</text>
-        Clist = self.tree.xpath("//*[@class='amc_categorie']")
+        Clist = self.index['amc_categorie']
         for Ci in Clist:
             if self.catflag == 1:
                 Ci.text = "$course$/"+self.catname.split('.')[0] + "/" + Ci.text
@@ -1033,36 +1752,69 @@ class AMCQuiz:
 
     def _convertQuestions(self):
         """ Find and convert questions
+
+        The questions are converted by type, in document order. Each question
+        has its own random generator, seeded in this order from `random`,
+        thus the output does not depend on `jobs`.
         """
         context = self._exportContext()
-        self.Qtot = 0
-        for qtype in SUPPORTED_Q_TYPE:
-            Qlist = self.tree.xpath("//*[@class='%s']" % qtype)
-            for Qi in Qlist:
-                thisq = CreateQuestion(qtype, Qi, context)
+        questions = [(qtype, Qi) for qtype in SUPPORTED_Q_TYPE for Qi in self.index[qtype]]
+        seeds = [self.random.getrandbits(64) for _ in questions]
+        self.Qtot = len(questions)
+        if self.jobs <= 1:
+            for (qtype, Qi), seed in zip(questions, seeds):
+                thisq = CreateQuestion(qtype, Qi, context, seed)
                 thisq.convert()
-            self.Qtot += len(Qlist)
+            return
+
+        # Each question is serialized and converted in its own document
+        Logger.debug(f"   Convert questions with {self.jobs} {self.pool}s.")
+        parser = etree.XMLParser(strip_cdata=False)
+        # the process pool is slow to import, it is only loaded when used
+        Executor = getattr(concurrent.futures, POOLS[self.pool])
+        with Executor(max_workers=self.jobs) as executor:
+            futures = []
+            for (qtype, Qi), seed in zip(questions, seeds):
+                task = (convertSerializedQuestion, qtype,
+                        etree.tostring(Qi, with_tail=False), context, seed)
+                if self.pool == 'thread':
+                    # the threads count their logged events in the run counters
+                    task = (contextvars.copy_context().run, *task)
+                futures.append(executor.submit(*task))
+            # merge back in document order
+            for (_, Qi), future in zip(questions, futures):
+                data, counter, stats = future.result()
+                if self.pool == 'process':
+                    # logged events and images in other processes are not counted
+                    for key, count in counter.items():
+                        Logger.counter[key] += count
+                    self.image_cache.count(**stats)
+                newQi = etree.fromstring(data, parser)
+                newQi.tail = Qi.tail
+                Qi.getparent().replace(Qi, newQi)
 
     def _exportContext(self):
         """ Export environnement variable as a Context object.
         """
         context = Context(pathin=self.pathin, wdir=self.wdir,
                           amc_bm=self.amc_bm, amc_bs=self.amc_bs,
-                          deb=self.deb, options=self.options)
+                          deb=self.deb, options=self.options,
+                          image_cache=self.image_cache)
         return context
 
     def _tempfile(self):
         """ Generate temp file path for each conversion steps.
         """
         # create name
-        name = self.tempBaseName.join(str(self.tempfile_id))
+        name = f'{self.tempBaseName}{self.tempfile_id}.xml'
         # increment it for next use
         self.tempfile_id += 1
         return os.path.join(self.wdir, name)
 
 
 def to_moodle(filein, pathin, fileout='out.xml', pathout='.',
-              workingdir=None, catname=None, deb=0):
+              workingdir=None, catname=None, deb=0, fused=False, jobs=1,
+              pool='thread', image_cache=None, seed=None):
     """ Build Moodle XML file from xml file obtain with LaTeXML.
 
     Call xslt stylesheet and complete the required xml element,
@@ -1089,10 +1841,24 @@ def to_moodle(filein, pathin, fileout='out.xml', pathout='.',
         Set moodle category. The default is None.
     deb : int, optional
         Set to 1 to store all intermediate files for debugging. The default is 0.
+    fused : bool, optional
+        Use a single XSLT pass to remove namespace and recast question types.
+        The default is False.
+    jobs : int, optional
+        Number of questions converted in parallel. The default is 1.
+    pool : string, optional
+        Kind of pool used when `jobs > 1`, 'thread' or 'process'.
+        The default is 'thread'.
+    image_cache : FileCache or ImageCache, optional
+        On-disk cache of the converted images, or the cache of the images
+        already converted in advance. The default is None.
+    seed : int or string, optional
+        Seed of the random generator of the quiz. The default is None.
 
     Returns
     -------
-    None.
+    AMCQuiz
+        The converted quiz.
 
     """
 
@@ -1105,6 +1871,8 @@ def to_moodle(filein, pathin, fileout='out.xml', pathout='.',
     # load input latexml xml file
     with open(os.path.join(wdir, filein)) as xml:
         # instanciate the Quiz object
-        quiz = AMCQuiz(xml, pathin, wdir, catname, deb)
+        quiz = AMCQuiz(xml, pathin, wdir, catname, deb, fused, jobs, pool,
+                       image_cache, seed)
         # run the conversion and save the output
         quiz.toMoodle(os.path.join(pathout, fileout))
+    return quiz
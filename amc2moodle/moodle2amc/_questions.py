@@ -31,18 +31,15 @@ import os
 import sys
 
 # decode filemame unsed in moodle
-import urllib
+import urllib.parse
 from abc import ABC, abstractmethod
 from xml.sax.saxutils import unescape
 
-import markdown
 from lxml import etree
-from wand.image import Image
 
+from amc2moodle.utils import xslt
 from amc2moodle.utils.text import clean_q_name
 
-from ..utils.calculatedParser import *
-
 # list of supported moodle question type for
 SUPPORTED_QUESTION_TYPE = {'multichoice', 'essay', 'description',
                            'numerical', 'calculatedmulti'}
@@ -50,7 +47,7 @@ SUPPORTED_QUESTION_TYPE = {'multichoice', 'essay', 'description',
 # possible to use several grading strategy
 GRADING_STRATEGY = 'std'  # good/wrong no specific grading
 
-# define path for images files
+# define path for images files, relative to the output latex file
 FIGURES_PATH = "./Figures"
 # File type supported by latex (pdflatex), possible to add eps with eps2pdf
 # but eps is unusal in web app.
@@ -84,8 +81,9 @@ class Question(ABC):
     """
     _xslt_html2tex = os.path.join(os.path.dirname(__file__),
                                   'html2tex.xslt')
-    _transform = etree.XSLT(etree.parse(_xslt_html2tex))
     figpath = FIGURES_PATH
+    # directory of the output latex file, the images are written in its figpath
+    workdir = '.'
 
     # possible numerics, open
     def __init__(self, q):
@@ -133,6 +131,8 @@ class Question(ABC):
         if text_format in ('html', 'plain_text', 'moodle_auto_format'):
             text = self.html2tex(cdata_content)
         elif text_format == 'markdown':
+            # slow to import, only loaded for markdown questions
+            import markdown
             # First convert markdown into html and
             cdata_content = (cdata_content.replace('<text><![CDATA[', '')
                                           .replace(']]></text>', ''))
@@ -174,7 +174,7 @@ class Question(ABC):
         self._img_check(tree_content)
 
         # transform with XSLT into XSLT (tree) for all other element
-        xslt_content = self._transform(tree_content)
+        xslt_content = xslt.transformer(self._xslt_html2tex)(tree_content)
         # convert to XML (more suitable for search)
         tree_text = etree.XML(etree.tostring(xslt_content,
                               encoding='utf8').decode('utf-8'))
@@ -197,7 +197,7 @@ class Question(ABC):
             width = svg.attrib['width']
             filename_svg = os.path.join(self.figpath,
                                         self.name + str(self.svg_id) + '.svg')
-            with open(filename_svg, 'w') as f:
+            with open(os.path.join(self.workdir, filename_svg), 'w') as f:
                 f.write(etree.tostring(svg, encoding='utf8', pretty_print=True)
                         .decode('utf-8'))
             img_svg = etree.Element('img', attrib={'src': filename_svg,
@@ -219,9 +219,11 @@ class Question(ABC):
             basename, ext = os.path.splitext(filename)
             # need to be converted
             if ext not in LATEX_EXT:
-                im = Image(filename=os.path.join(self.figpath, filename))
+                # slow to import, only loaded for images to convert
+                from wand.image import Image
+                im = Image(filename=os.path.join(self.workdir, self.figpath, filename))
                 fileout = os.path.join(self.figpath, basename + LATEX_IMG_OUT)
-                im.save(filename=fileout)
+                im.save(filename=os.path.join(self.workdir, fileout))
                 im.close()
                 src = fileout
             else:
@@ -237,10 +239,11 @@ class Question(ABC):
             filename = file.attrib['name']
             data = base64.decodebytes(file.text.encode())
             # create directory if needed
-            if not os.path.exists(self.figpath):
-                os.makedirs(self.figpath)
+            figdir = os.path.join(self.workdir, self.figpath)
+            if not os.path.exists(figdir):
+                os.makedirs(figdir)
             # save file
-            with open(os.path.join(self.figpath, filename), 'bw') as f:
+            with open(os.path.join(figdir, filename), 'bw') as f:
                 f.write(data)
                 self.fileCreated.append(filename)
 
@@ -601,6 +604,7 @@ class QuestionCalculatedMulti(Question):
         rawtext = questiontext.text
         # call math expression parser
         # Create the parser /!\ need to be before latex rendring because of {}
+        from ..utils.calculatedParser import CreateCalculatedParser
         parser = CreateCalculatedParser(CALCULATED_DEFAULT_PARSER)
         # parse question
         parsed_text = parser.render(rawtext)
@@ -640,6 +644,7 @@ class QuestionCalculatedMulti(Question):
             # call math expression parser
             cdata_content = etree.tostring(ans.find('text'), encoding='utf8').decode('utf-8')
             # Create the parser
+            from ..utils.calculatedParser import CreateCalculatedParser
             parser = CreateCalculatedParser(CALCULATED_DEFAULT_PARSER)
             # parse answer
             text = parser.render(cdata_content)
@@ -661,7 +666,7 @@ Q_FACTORY = {'multichoice': QuestionMultichoice,
              'numerical': QuestionNumerical,
              'calculatedmulti': QuestionCalculatedMulti}
 
-def CreateQuestion(qtype, question):
+def CreateQuestion(qtype, question, workdir='.'):
     """ Factory function for creating the Questions* objects.
 
 
@@ -671,6 +676,9 @@ def CreateQuestion(qtype, question):
         the moodle name of the question type.
     question : etree.Element
         The XML tree of the considered question.
+    workdir : string, optional
+        Directory of the output latex file, the images are written in its
+        `FIGURES_PATH` sub-directory. The default is the current directory.
 
     Returns
     -------
@@ -679,6 +687,8 @@ def CreateQuestion(qtype, question):
     """
 
     try:
-        return Q_FACTORY[qtype](question)   # *args,**kwargs)
+        q = Q_FACTORY[qtype](question)   # *args,**kwargs)
     except:
         raise KeyError(f" 'qtype' argument should be in {Q_FACTORY.keys()}" )
+    q.workdir = workdir
+    return q
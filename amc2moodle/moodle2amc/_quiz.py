@@ -27,6 +27,7 @@ from xml.sax.saxutils import unescape
 
 from lxml import etree
 
+from amc2moodle.utils import xslt
 from amc2moodle.utils.text import clean_q_name
 
 from ._questions import *
@@ -88,7 +89,8 @@ class Quiz:
         Parameters
         ----------
         texfile : string, optional
-            Ouput latex path/filename. The default is LATEX_FILEOUT.
+            Ouput latex path/filename. The default is LATEX_FILEOUT. The
+            images are written in the `Figures` directory next to it.
         debug : bool, optional
             Display additional outputs. The default is False.
 
@@ -98,7 +100,7 @@ class Quiz:
 
         """
         # convert : convert(to str) converttofile
-        amc, cat_dict = self._reshape()
+        amc, cat_dict = self._reshape(os.path.dirname(os.path.abspath(texfile)))
         if debug:
             Logger.debug(etree.tostring(amc, pretty_print=True,
                                  encoding='utf8').decode('utf-8'))
@@ -201,13 +203,14 @@ class Quiz:
         return footer
 
 
-    def _reshape(self):
+    def _reshape(self, workdir='.'):
         """ Reshape  moodle XML file into a stucture close to AMC Latex format.
 
         Parameters
         ----------
-        root : etre.Element.tree
-            An XML file parse by lxml.etre.
+        workdir : string, optional
+            Directory of the output latex file, where the images are written.
+            The default is the current directory.
 
         Returns
         -------
@@ -260,7 +263,7 @@ class Quiz:
                             cat_dict.update({catname: 0})
                         # there is one more question in the catname categogy
                         cat_dict[catname] += 1
-                        amc_q = CreateQuestion(qtype, question).transform(catname)
+                        amc_q = CreateQuestion(qtype, question, workdir).transform(catname)
                         amc.append(amc_q)
                 else:
                     Logger.error(f"> Question '{qname}' of type '{qtype}' is not supported. Skipping.")
@@ -287,26 +290,29 @@ class Quiz:
         tex : XSLT results object
             Contain an intermediate state of the conversion process.
         """
-        # create XSLT transformation fonction
-        xslt_texrenderer = XSLT_TEXRENDERER
-        texrenderer = etree.XSLT(etree.parse(xslt_texrenderer))
+        # get the compiled XSLT transformation fonction
+        texrenderer = xslt.transformer(XSLT_TEXRENDERER)
         tex = texrenderer(amc)
 
         return tex
 
     @staticmethod
-    def compileLatex(latexFile):
+    def compileLatex(latexFile, cwd=None):
         """ Compile output with pdflatex.
 
         Parameters
         ----------
         latexFile : string
             full name of a latex file.
+        cwd : string, optional
+            Directory of the pdflatex outputs, the current working directory
+            is not changed. The default is None (current working directory).
         """
         command = f"pdflatex -interaction=nonstopmode -halt-on-error -file-line-error {latexFile}"
         #TODO: caution with 'universal_newlines=' (new syntax from Python 3.7: text=)
         Logger.debug(f'Run command {command}')
         with subprocess.Popen(command.split(),
+            cwd=cwd,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             universal_newlines=True) as latexProcess:
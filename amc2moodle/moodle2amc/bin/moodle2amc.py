@@ -131,7 +131,9 @@ def run():
         # test latex compilation
         if args.check:
             Logger.info('============ Check output ==============')
-            status = quiz.compileLatex(fileOut)
+            # the images are next to the output file
+            status = quiz.compileLatex(fileOut,
+                                       cwd=os.path.dirname(os.path.abspath(fileOut)))
             if status.returncode != 0:
                 Logger.error('> pdflatex encounters Errors...')
                 globalReturncode = status.returncode
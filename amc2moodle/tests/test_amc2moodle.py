@@ -18,13 +18,25 @@
     You should have received a copy of the GNU General Public License
     along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
+import base64
+import concurrent.futures
+import copy
+import filecmp
+import io
 import os
+import pathlib
+import pickle
+import random
+import shutil
+import tempfile
 import unittest
 
 from lxml import etree
 
 import amc2moodle as amdlpkg
 from amc2moodle.amc2moodle import amc2moodle_class as a2m
+from amc2moodle.amc2moodle import convert
+from amc2moodle.amc2moodle.bin import amc2moodle as a2m_cli
 from amc2moodle.utils.customLogging import customLogger
 from amc2moodle.utils.misc import check_hash
 
@@ -460,6 +472,558 @@ class TestSuiteStyles(unittest.TestCase):
         self.assertFalse(is_error)
 
 
+class TestSuiteIncremental(unittest.TestCase):
+    """Check if the `incremental` mode yields the same questions."""
+
+    @staticmethod
+    def question_list(fileOut):
+        """Return the list of (type, name or category) of the questions."""
+        tree = etree.parse(fileOut)
+        questions = []
+        for q in tree.iterfind('question'):
+            if q.attrib['type'] == 'category':
+                questions.append(('category', q.find('category/text').text))
+            else:
+                questions.append((q.attrib['type'], q.find('name/text').text))
+        return questions
+
+    def test_incremental(self):
+        """Tests the incremental mode with a cold then a warm cache."""
+        # define i/o file
+        fileIn = os.path.abspath(os.path.join(_PAYLOAD_TEST_DIR,
+                                              "QCM_wo-tikz.tex"))
+        fileOut = os.path.abspath(os.path.join(_OUTPUT_TEST_DIR,'test_incremental.xml'))
+        fileRef = os.path.abspath(os.path.join(_PAYLOAD_TEST_DIR,
+                                               "QCM_wo-tikz.xml"))
+        ref = self.question_list(fileRef)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            # the 2nd run only uses the cache
+            for _ in range(2):
+                a2m.amc2moodle(fileInput=fileIn,
+                               fileOutput=fileOut,
+                               keepFlag=False,
+                               catname='test_notikz',
+                               deb=0,
+                               cache_dir=cache_dir,
+                               incremental=True)
+                self.assertEqual(self.question_list(fileOut), ref)
+
+
+
+class TestSuiteSharded(unittest.TestCase):
+    """Check if the parallel LaTeXML shards yield the same questions."""
+
+    def test_sharded(self):
+        """Tests that the order of categories and questions is kept."""
+        fileIn = os.path.abspath(os.path.join(_PAYLOAD_TEST_DIR, "QCM_wo-tikz.tex"))
+        fileOut = os.path.abspath(os.path.join(_OUTPUT_TEST_DIR, 'test_sharded.xml'))
+        fileRef = os.path.abspath(os.path.join(_PAYLOAD_TEST_DIR, "QCM_wo-tikz.xml"))
+        a2m.amc2moodle(fileInput=fileIn,
+                       fileOutput=fileOut,
+                       keepFlag=False,
+                       catname='test_notikz',
+                       deb=0,
+                       latexml_jobs=3)
+        self.assertEqual(TestSuiteIncremental.question_list(fileOut),
+                         TestSuiteIncremental.question_list(fileRef))
+
+
+class TestSuiteFused(unittest.TestCase):
+    """Check if the `fused_xslt` pipeline yields the same files."""
+
+    def test_fused(self):
+        """Tests that the output is byte-identical with and without fused XSLT."""
+        for name in ("QCM_wo-tikz", "numerical", "cleaning", "element"):
+            fileIn = os.path.abspath(os.path.join(_PAYLOAD_TEST_DIR, name + ".tex"))
+            fileOuts = []
+            for fused in (False, True):
+                fileOut = os.path.join(_OUTPUT_TEST_DIR, f'test_fused_{name}_{fused}.xml')
+                # calculated questions datasets are random
+                random.seed(0)
+                a2m.amc2moodle(fileInput=fileIn,
+                               fileOutput=fileOut,
+                               keepFlag=False,
+                               catname='test_fused',
+                               deb=0,
+                               fused_xslt=fused)
+                fileOuts.append(fileOut)
+            self.assertTrue(filecmp.cmp(*fileOuts, shallow=False),
+                            f'{name}: fused output differs.')
+
+
+class TestSuitePipe(unittest.TestCase):
+    """Check if sending the flattened file to LaTeXML through a pipe yields the same file."""
+
+    def test_pipe(self):
+        """Tests that the output is the same and that no file is left next to the input."""
+        fileIn = os.path.abspath(os.path.join(_PAYLOAD_TEST_DIR, "QCM_wo-tikz.tex"))
+        fileOuts = []
+        for pipe in (False, True):
+            fileOut = os.path.join(_OUTPUT_TEST_DIR, f'test_pipe_{pipe}.xml')
+            # calculated questions datasets are random
+            random.seed(0)
+            a2m.amc2moodle(fileInput=fileIn,
+                           fileOutput=fileOut,
+                           keepFlag=False,
+                           catname='test_pipe',
+                           deb=0,
+                           pipe=pipe)
+            fileOuts.append(fileOut)
+        self.assertTrue(filecmp.cmp(*fileOuts, shallow=False))
+        self.assertFalse([f for f in os.listdir(_PAYLOAD_TEST_DIR) if f.endswith('_magic.tex')])
+
+
+class TestSuiteFromLaTeXML(unittest.TestCase):
+    """Check the conversion of a saved LaTeXML output."""
+
+    def test_from_latexml(self):
+        """Tests that starting from the LaTeXML output yields the same file."""
+        fileIn = os.path.abspath(os.path.join(_PAYLOAD_TEST_DIR, "QCM_wo-tikz.tex"))
+        latexml = os.path.join(_OUTPUT_TEST_DIR, 'test_from_latexml_latexml.xml')
+        fileOuts = []
+        for step in ('save', 'load'):
+            fileOut = os.path.join(_OUTPUT_TEST_DIR, f'test_from_latexml_{step}.xml')
+            # calculated questions datasets are random
+            random.seed(0)
+            if step == 'save':
+                a2m.amc2moodle(fileInput=fileIn, fileOutput=fileOut,
+                               catname='test_from_latexml', save_latexml=latexml)
+            else:
+                a2m.amc2moodle(fileInput=fileIn, fileOutput=fileOut,
+                               catname='test_from_latexml', from_latexml=latexml)
+            fileOuts.append(fileOut)
+        self.assertTrue(filecmp.cmp(*fileOuts, shallow=False))
+        with self.assertRaises(a2m.ConversionError):
+            a2m.amc2moodle(fileInput=fileIn, fileOutput=fileOuts[1],
+                           from_latexml=latexml + '.missing')
+
+
+class TestSuiteConverter(unittest.TestCase):
+    """Check the reusable converter."""
+
+    def test_converter(self):
+        """Tests that the converter yields the same file for a path and a text source."""
+        fileIn = os.path.abspath(os.path.join(_PAYLOAD_TEST_DIR, "QCM_wo-tikz.tex"))
+        fileOut = os.path.join(_OUTPUT_TEST_DIR, 'test_converter.xml')
+        random.seed(0)
+        a2m.amc2moodle(fileInput=fileIn, fileOutput=fileOut, catname='test_converter')
+        with open(fileOut, 'rb') as f:
+            expected = f.read()
+        with open(fileIn) as f:
+            tex = f.read()
+        with a2m.Converter(catname='test_converter') as converter:
+            for path in (fileIn, pathlib.Path(fileIn)):
+                random.seed(0)
+                self.assertEqual(converter.convert(path).xml, expected)
+            for source in (tex, tex.encode('utf-8')):
+                random.seed(0)
+                result = converter.convert(source=source, basedir=_PAYLOAD_TEST_DIR)
+                self.assertEqual(result.xml, expected)
+            # errors are raised, names are never taken as TeX source
+            for name in ('missing.tex', 'missing.ltx', 'Missing.TEX', 'missing'):
+                with self.assertRaisesRegex(a2m.ConversionError, 'not found'):
+                    converter.convert(os.path.join(_PAYLOAD_TEST_DIR, name))
+            with self.assertRaises(TypeError):
+                converter.convert(fileIn, source=tex)
+        self.assertFalse([f for f in os.listdir(_PAYLOAD_TEST_DIR)
+                          if f.startswith('amc2moodle_source')])
+
+    def test_source(self):
+        """Tests that the in-memory conversion yields the same file, images from a resolver."""
+        fileIn = os.path.abspath(os.path.join(_PAYLOAD_TEST_DIR, "element.tex"))
+        with open(fileIn) as f:
+            tex = f.read()
+        names = []
+
+        def resolver(name):
+            names.append(name)
+            with open(os.path.join(_PAYLOAD_TEST_DIR, name), 'rb') as f:
+                return f.read()
+
+        with a2m.Converter(catname='test_converter') as converter:
+            random.seed(0)
+            expected = converter.convert(fileIn).xml
+            random.seed(0)
+            xml = converter.convertSource(tex, resolver, basedir=_PAYLOAD_TEST_DIR)
+        self.assertEqual(xml, expected)
+        self.assertEqual(set(names), {'4.png'})
+
+
+class TestSuiteIfChanged(unittest.TestCase):
+    """Check the manifest and the up-to-date check."""
+
+    def test_if_changed(self):
+        """Tests that an unchanged conversion is skipped."""
+        fileIn = os.path.abspath(os.path.join(_PAYLOAD_TEST_DIR, "QCM_wo-tikz.tex"))
+        fileOut = os.path.join(_OUTPUT_TEST_DIR, 'test_if_changed.xml')
+        options = dict(fileInput=fileIn, fileOutput=fileOut, keepFlag=False,
+                       catname='test_if_changed', deb=0, if_changed=True)
+        a2m.amc2moodle(**options)
+        manifest = os.path.join(_OUTPUT_TEST_DIR, 'test_if_changed.manifest.json')
+        self.assertTrue(os.path.exists(manifest))
+        self.assertTrue(a2m.amc2moodle(**options).upToDate)
+        # other options
+        options['catname'] = 'test_if_changed_2'
+        self.assertFalse(a2m.amc2moodle(**options).upToDate)
+        # modified output
+        with open(fileOut, 'a') as f:
+            f.write(' ')
+        self.assertFalse(a2m.amc2moodle(**options).upToDate)
+
+
+class TestSuiteParallel(unittest.TestCase):
+    """Check if the parallel conversion of questions yields the same file."""
+
+    def test_question_jobs(self):
+        """Tests that the output does not depend on the pool and on the jobs."""
+        fileIn = os.path.abspath(os.path.join(_PAYLOAD_TEST_DIR, "QCM_wo-tikz.tex"))
+        fileOuts = []
+        for jobs, pool in ((1, 'thread'), (4, 'thread'), (4, 'process')):
+            fileOut = os.path.join(_OUTPUT_TEST_DIR, f'test_parallel_{jobs}_{pool}.xml')
+            # calculated questions datasets are random
+            random.seed(0)
+            a2m.amc2moodle(fileInput=fileIn,
+                           fileOutput=fileOut,
+                           keepFlag=False,
+                           catname='test_parallel',
+                           deb=0,
+                           question_jobs=jobs,
+                           question_pool=pool)
+            fileOuts.append(fileOut)
+        for fileOut in fileOuts[1:]:
+            self.assertTrue(filecmp.cmp(fileOuts[0], fileOut, shallow=False),
+                            f'{fileOut} differs from the sequential conversion.')
+
+
+class TestSuiteConcurrent(unittest.TestCase):
+    """Check that concurrent conversions do not share any state."""
+
+    def convert(self, name, fileOut):
+        """Convert the payload file `name` in `fileOut` with a fixed seed."""
+        fileIn = os.path.abspath(os.path.join(_PAYLOAD_TEST_DIR, name))
+        a2m.amc2moodle(fileInput=fileIn,
+                       fileOutput=fileOut,
+                       keepFlag=False,
+                       catname='test_concurrent',
+                       deb=0,
+                       seed=0)
+        return fileOut
+
+    def test_concurrent(self):
+        """Tests that each concurrent conversion yields its serial output."""
+        names = ('QCM_wo-tikz.tex', 'numerical.tex', 'element.tex')
+        defaults = copy.deepcopy(convert.DEFAULT_OPTS)
+        serial = {name: self.convert(name, os.path.join(_OUTPUT_TEST_DIR,
+                                                        f'test_concurrent_{name[:-4]}.xml'))
+                  for name in names}
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            futures = {executor.submit(self.convert, name,
+                                       os.path.join(_OUTPUT_TEST_DIR,
+                                                    f'test_concurrent_{name[:-4]}_{i}.xml')): name
+                       for i in range(4) for name in names}
+            for future in concurrent.futures.as_completed(futures):
+                fileOut = future.result()
+                self.assertTrue(filecmp.cmp(serial[futures[future]], fileOut, shallow=False),
+                                f'{fileOut} differs from the serial conversion.')
+        # the default options are never modified by a conversion
+        self.assertEqual(convert.DEFAULT_OPTS, defaults)
+
+
+class TestSuiteOptions(unittest.TestCase):
+    """Check the typed options of the quiz and of the questions."""
+
+    def test_override(self):
+        """Tests the parsing, the aliases and the overlay of the options."""
+        quiz = convert.Options()
+        self.assertEqual(quiz.asdict(), convert.DEFAULT_OPTS)
+        question = quiz.override([('shuffle_all', 'False'), ('nitems', '3'),
+                                  ('moo_default_grade', '2')])
+        self.assertIs(question.shuffle_all, False)
+        self.assertEqual(question.calculated_default_item_number, 3)
+        self.assertEqual(question.moo_default_grade, 2.)
+        # other options are read in the quiz options
+        self.assertEqual(question.overridden().keys(),
+                         {'shuffle_all', 'calculated_default_item_number',
+                          'moo_default_grade'})
+        self.assertEqual(question.amc_aucune, quiz.amc_aucune)
+        # without override, the options are shared
+        self.assertIs(quiz.override([]), quiz)
+        with self.assertRaises(AttributeError):
+            question.shuffle_all = True
+        # the overlay survives pickle (process pool)
+        self.assertEqual(pickle.loads(pickle.dumps(question)).asdict(), question.asdict())
+
+    def test_invalid(self):
+        """Tests that invalid values and unknown options are reported and ignored."""
+        quiz = convert.Options()
+        with self.assertLogs('amc2moodle.amc2moodle.convert') as logs:
+            options = quiz.override([('imgResolution', 'high'),
+                                     ('answer_numbering_format', 'xyz'),
+                                     ('shuffle_all', 'maybe'),
+                                     ('unknown_option', '1')])
+        self.assertIs(options, quiz)
+        self.assertEqual(len(logs.records), 4)
+
+    def test_number_output(self):
+        """Tests that numeric options are written as in the tex file (no '2.0' for '2')."""
+        xml = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<document xmlns="http://dlmf.nist.gov/LaTeXML">'
+               '<note class="amc_categorie">c1</note>'
+               '<note class="amc_question" role="q1"><para><p>Text'
+               '<note class="amc_quiz_options" role="moo_default_grade">2</note></p>'
+               '<note class="amc_bonne">A</note><note class="amc_mauvaise">B</note>'
+               '</para></note></document>')
+        with tempfile.TemporaryDirectory() as wdir:
+            with open(os.path.join(wdir, 'quiz.xml'), 'w') as f:
+                f.write(xml)
+            convert.to_moodle(os.path.join(wdir, 'quiz.xml'), wdir, fileout='out.xml',
+                              pathout=wdir, catname='test_number', seed=0)
+            tree = etree.parse(os.path.join(wdir, 'out.xml'))
+        self.assertEqual(tree.findtext('.//question[@type="multichoice"]/defaultgrade'), '2')
+        self.assertEqual(str(pickle.loads(pickle.dumps(convert.Number('1e-2')))), '1e-2')
+
+    def test_partial_scoring(self):
+        """Tests that a partial scoring option completes the default scoring."""
+        with tempfile.TemporaryDirectory() as wdir:
+            quiz = convert.AMCQuiz(None, _PAYLOAD_TEST_DIR, wdir, 'cat')
+            quiz.tree = etree.fromstring(
+                '<document><note class="amc_quiz_options" role="amc_bs">b=2</note>'
+                '<note class="amc_quiz_options" role="amc_bm">m=-1</note></document>')
+            quiz._options()
+        self.assertEqual(quiz.amc_bs, {**convert.DEFAULT_OPTS['amc_bs'], 'b': '2'})
+        self.assertEqual(quiz.amc_bm, {**convert.DEFAULT_OPTS['amc_bm'], 'm': '-1'})
+        # the defaults are not modified
+        self.assertEqual(convert.DEFAULT_OPTS['amc_bs']['b'], 1)
+
+
+class TestSuiteImageCache(unittest.TestCase):
+    """Check the cache of the converted images."""
+
+    def test_source(self):
+        """Tests that an image is converted once, then read from the disk."""
+        calls = []
+        src = os.path.join(_PAYLOAD_TEST_DIR, '4.png')
+
+        def convert_in(path):
+            def convert():
+                calls.append(1)
+                shutil.copyfile(src, path)
+            return convert
+        key = convert.ImageCache.key(src, 100)
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                tempfile.TemporaryDirectory() as wdir:
+            path = os.path.join(wdir, 'a.png')
+            cache = convert.ImageCache(convert.FileCache(cache_dir))
+            self.assertEqual(cache.source(key, path, convert_in(path)), path)
+            # same content, other name
+            other = os.path.join(wdir, 'b.png')
+            self.assertEqual(cache.source(key, other, convert_in(other)), path)
+            self.assertEqual(cache.stats['embedded'], 2)
+            self.assertEqual(cache.stats['reused'], 1)
+            # new run, on-disk cache only
+            os.remove(path)
+            cache = convert.ImageCache(convert.FileCache(cache_dir))
+            self.assertEqual(cache.source(key, path, convert_in(path)), path)
+            self.assertTrue(filecmp.cmp(src, path, shallow=False))
+        self.assertEqual(len(calls), 1)
+        # the resolution is part of the key
+        self.assertNotEqual(convert.ImageCache.key(src, 200), key)
+
+    def test_prefetch(self):
+        """Tests that the images converted in advance are reused."""
+        src = os.path.join(_PAYLOAD_TEST_DIR, 'Figures', 'tinymonk.pdf')
+        with open(os.path.join(_PAYLOAD_TEST_DIR, 'common-bank.tex')) as f:
+            files = convert.includedGraphics(f.read(), _PAYLOAD_TEST_DIR)
+        self.assertIn(os.path.normpath(src), files)
+        self.assertEqual(len(files), len(set(files)))
+        with tempfile.TemporaryDirectory() as wdir:
+            cache = convert.ImageCache()
+            cache.startPrefetch()
+            cache.prefetch(src, wdir, 100)
+            cache.shutdown()
+            self.assertEqual(len(cache.paths), 1)
+            path = cache.convert(src, wdir, 100)
+            self.assertEqual(list(cache.paths.values()), [path])
+            # the first use is not a reuse
+            self.assertEqual(cache.stats['embedded'], 1)
+            self.assertEqual(cache.stats['reused'], 0)
+
+    def test_quiz_resolution(self):
+        """Tests that the images are converted in advance at the quiz resolution."""
+        self.assertEqual(convert.quizImageResolution('\\begin{document}'),
+                         convert.DEFAULT_IMG_RESOLUTION)
+        tex = ('\\SetQuizOption{imgResolution}{72}\n'
+               '% \\SetQuizOption{imgResolution}{50}\n')
+        self.assertEqual(convert.quizImageResolution(tex), 72)
+        # the quiz options are read in the tree, without the index of the classes
+        with tempfile.TemporaryDirectory() as wdir:
+            quiz = convert.AMCQuiz(None, _PAYLOAD_TEST_DIR, wdir, 'cat')
+            quiz.tree = etree.fromstring(
+                '<document><note class="amc_quiz_options" role="imgResolution">72</note>'
+                '</document>')
+            quiz._options()
+        self.assertEqual(quiz.options.default_img_resolution, 72)
+
+    def test_conversion(self):
+        """Tests that the output is unchanged when images come from the cache."""
+        fileIn = os.path.abspath(os.path.join(_PAYLOAD_TEST_DIR, "QCM_wo-tikz.tex"))
+        fileOuts = []
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for run in range(2):
+                fileOut = os.path.join(_OUTPUT_TEST_DIR, f'test_image_cache_{run}.xml')
+                random.seed(0)
+                a2m.amc2moodle(fileInput=fileIn,
+                               fileOutput=fileOut,
+                               keepFlag=False,
+                               catname='test_image_cache',
+                               deb=0,
+                               cache_dir=cache_dir)
+                fileOuts.append(fileOut)
+            self.assertTrue(os.listdir(os.path.join(cache_dir, 'images')))
+        self.assertTrue(filecmp.cmp(*fileOuts, shallow=False))
+
+    def test_no_duplicate(self):
+        """Tests that a file is embedded once in each file area."""
+        fileIn = os.path.abspath(os.path.join(_PAYLOAD_TEST_DIR, "QCM_wo-tikz.tex"))
+        fileOut = os.path.join(_OUTPUT_TEST_DIR, 'test_image_dedup.xml')
+        a2m.amc2moodle(fileInput=fileIn,
+                       fileOutput=fileOut,
+                       keepFlag=False,
+                       catname='test_image_dedup',
+                       deb=0)
+        tree = etree.parse(fileOut)
+        files = tree.findall('.//file')
+        self.assertTrue(files)
+        areas = [(f.getparent(), f.attrib['name']) for f in files]
+        self.assertEqual(len(areas), len(set(areas)))
+
+
+class TestSuiteWriter(unittest.TestCase):
+    """Check the streaming moodle XML writer."""
+
+    def test_same_output(self):
+        """Tests that the output is the same as `etree.tostring`."""
+        parser = etree.XMLParser(strip_cdata=False)
+        fileOut = os.path.join(_OUTPUT_TEST_DIR, 'test_writer.xml')
+        for name in ('QCM.xml', 'numerical.xml'):
+            for strip in (False, True):
+                tree = etree.parse(os.path.join(_PAYLOAD_TEST_DIR, name), parser)
+                if strip:
+                    # without whitespace, the questions are indented
+                    for e in tree.iter():
+                        if len(e) and e.text and not e.text.strip():
+                            e.text = None
+                        if e.tail and not e.tail.strip():
+                            e.tail = None
+                ref = etree.tostring(tree, pretty_print=True, encoding='utf-8')
+                convert.writeMoodle(tree, fileOut)
+                with open(fileOut, 'rb') as f:
+                    self.assertEqual(f.read(), ref)
+                # the tree is consumed
+                self.assertEqual(len(tree.getroot()), 0)
+
+    def test_mixed_content(self):
+        """Tests that mixed content and whitespace only text are kept as in `etree.tostring`."""
+        parser = etree.XMLParser(strip_cdata=False)
+        source = ('<quiz><!-- c --><question type="multichoice"><name><text>Q1</text></name>'
+                  '<questiontext format="html"><text>A <b>bold</b> and\n<i>two\nlines</i>'
+                  '</text></questiontext><generalfeedback><text> </text></generalfeedback>'
+                  '<answer fraction="100"><text><![CDATA[<p>a</p>]]></text><feedback/>'
+                  '</answer></question><question type="category"><category><text>'
+                  '  </text></category></question></quiz>')
+        ref = etree.tostring(etree.fromstring(source, parser).getroottree(),
+                             pretty_print=True, encoding='utf-8')
+        output = io.BytesIO()
+        convert.writeMoodle(etree.fromstring(source, parser).getroottree(), output)
+        self.assertEqual(output.getvalue(), ref)
+
+    def test_file_token(self):
+        """Tests that the image placeholders are replaced by their payload."""
+        parser = etree.XMLParser(strip_cdata=False)
+        fileOut = os.path.join(_OUTPUT_TEST_DIR, 'test_writer_token.xml')
+        img = os.path.join(_PAYLOAD_TEST_DIR, '4.png')
+        with open(img, 'rb') as f:
+            payload = base64.b64encode(f.read()).decode()
+        self.assertEqual(convert.base64Size(img), len(payload))
+        self.assertEqual(convert.fileTokenPath(convert.fileToken(img)), os.path.abspath(img))
+        tree = etree.parse(os.path.join(_PAYLOAD_TEST_DIR, 'QCM.xml'), parser)
+        files = tree.findall('.//file')
+        for Ii in files:
+            Ii.text = payload
+        ref = etree.tostring(tree, pretty_print=True, encoding='utf-8')
+        for Ii in files:
+            Ii.text = convert.fileToken(img)
+        convert.writeMoodle(tree, fileOut)
+        with open(fileOut, 'rb') as f:
+            self.assertEqual(f.read(), ref)
+
+    def test_payload_memo(self):
+        """Tests that a payload is encoded once, unless the memo is full."""
+        img = os.path.join(_PAYLOAD_TEST_DIR, '4.png')
+        with open(img, 'rb') as f:
+            payload = base64.b64encode(f.read())
+        with tempfile.TemporaryDirectory() as wdir:
+            src = os.path.join(wdir, '4.png')
+            shutil.copyfile(img, src)
+            memo = {}
+            output = io.BytesIO()
+            convert.writeBase64(src, output, memo)
+            # the file is not read again
+            os.unlink(src)
+            convert.writeBase64(src, output, memo)
+            self.assertEqual(output.getvalue(), payload * 2)
+            # the memo size is limited
+            shutil.copyfile(img, src)
+            memo = {'other': b'x' * convert.BASE64_MEMO_SIZE}
+            convert.writeBase64(src, io.BytesIO(), memo)
+            self.assertNotIn(src, memo)
+
+
+class TestSuiteBatch(unittest.TestCase):
+    """Check the batch conversion helpers."""
+
+    def test_batch_inputs(self):
+        """Tests that directories and glob patterns are expanded."""
+        files = a2m_cli.batch_inputs([_PAYLOAD_TEST_DIR,
+                                      os.path.join(_PAYLOAD_TEST_DIR, 'QCM*.tex')])
+        names = [os.path.basename(f) for f in files]
+        self.assertIn('numerical.tex', names)
+        # no duplicate
+        self.assertEqual(len(names), len(set(names)))
+
+    def test_batch_outputs(self):
+        """Tests that inputs with the same name get distinct outputs in the output directory."""
+        files = [os.path.join('/q', 'a', 'quiz.tex'), os.path.join('/q', 'b', 'Quiz.tex'),
+                 os.path.join('/q', 'b', 'other.tex')]
+        outputs = a2m_cli.batch_outputs(files, 'out')
+        self.assertEqual([fileOut for fileOut, _ in outputs.values()],
+                         [os.path.join('out', 'a_quiz.xml'), os.path.join('out', 'b_Quiz.xml'),
+                          os.path.join('out', 'other.xml')])
+        self.assertEqual(outputs[files[0]][1], os.path.join('out', 'a_quiz_amc2moodle.log'))
+        # next to the inputs, names are unchanged
+        outputs = a2m_cli.batch_outputs(files)
+        self.assertEqual(outputs[files[0]][0], os.path.join('/q', 'a', 'quiz.xml'))
+        # remaining conflicts are detected before any conversion
+        with self.assertRaises(ValueError):
+            a2m_cli.batch_outputs(files + [os.path.join('/q', 'a_quiz.tex')], 'out')
+
+    def test_convert_file(self):
+        """Tests the return codes and the log files of each conversion."""
+        options = dict(catname='test_batch')
+        fileIn = os.path.abspath(os.path.join(_PAYLOAD_TEST_DIR, "numerical.tex"))
+        fileOut = os.path.join(_OUTPUT_TEST_DIR, 'test_batch.xml')
+        logFile = os.path.join(_OUTPUT_TEST_DIR, 'test_batch_amc2moodle.log')
+        self.assertEqual(a2m_cli.convert_file(fileIn, fileOut, logFile, options), 0)
+        self.assertTrue(os.path.exists(fileOut))
+        self.assertTrue(os.path.exists(logFile))
+        # a failure is reported in the return code, without exiting
+        fileIn = os.path.join(_PAYLOAD_TEST_DIR, "missing.tex")
+        self.assertEqual(a2m_cli.convert_file(fileIn, fileOut, logFile, options), 1)
+        # restore the console logger for the next tests
+        logObj.setupConsoleLogger(verbositylevel=2, silent=False,
+                                  txtinfo=amdlpkg.__version__)
+
+
 if __name__ == '__main__':
     # run unittest test suite
     Logger.info('> Running tests...')
@@ -26,7 +26,7 @@ import unittest
 import amc2moodle as amdlpkg
 from amc2moodle.moodle2amc import Quiz
 from amc2moodle.utils.customLogging import customLogger
-from amc2moodle.utils.misc import check_hash, decorator_set_cwd
+from amc2moodle.utils.misc import check_hash
 
 # Load logger
 logObj = customLogger("amc2moodle")
@@ -60,7 +60,6 @@ class TestSuite(unittest.TestCase):
 
     """
 
-    @decorator_set_cwd(_OUTPUT_TEST_DIR) # setting of cwd required for latex compilation
     def test_mdl_bank(self):
         """Tests if input XML file yields reference LaTeX file."""
         # define i/o file
@@ -84,6 +83,10 @@ class TestSuite(unittest.TestCase):
         quiz = Quiz(fileIn)
         # convert it
         quiz.convert(fileOut, debug=False)
+        # the images are written next to the output, whatever the cwd
+        for name in ('4.png', 'dessin.png'):
+            self.assertTrue(os.path.isfile(os.path.join(os.path.dirname(fileOut),
+                                                        'Figures', name)))
 
         Logger.info("=============== Check output ================")
         # check it (for convinience but too strict)
@@ -91,14 +94,13 @@ class TestSuite(unittest.TestCase):
         if equiv:
             Logger.info("> Converted XML is identical to the reference: OK")
         # test latex compilation
-        status = quiz.compileLatex(fileOut)
-        Logger.info(f"cwd {os.getcwd()}")
+        # compiled in the output directory, with the sty file
+        status = quiz.compileLatex(fileOut, cwd=_OUTPUT_TEST_DIR)
         if status.returncode != 0:
             Logger.info("> pdflatex encounters Errors, see logs...")
         else:
             Logger.info("> pdflatex compile without Errors: OK")
 
-        Logger.info(f"cwd {os.getcwd()}")
         self.assertEqual(status.returncode, 0)
 
 
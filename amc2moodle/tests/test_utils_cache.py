@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+"""
+    This file is part of amc2moodle, a convertion tool to recast quiz written
+    with the LaTeX format used by automuliplechoice 1.0.3 into the 
+    moodle XML quiz format.
+    Copyright (C) 2016  Benoit Nennig, benoit.nennig@supmeca.fr 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import tempfile
+import unittest
+
+from amc2moodle.utils.cache import FileCache
+
+
+# Run by utils.test
+class TestFileCache(unittest.TestCase):
+    """ Define on-disk cache test cases for unittest.
+    """
+    @classmethod
+    def setUpClass(cls):
+        print('\n> Tests of ', cls.__name__)
+
+    def setUp(self):
+        """ Create an empty cache in a temporary directory.
+        """
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.cache = FileCache(self.tempdir.name, max_size=30)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_key(self):
+        """ Keys depend on all parts and their boundaries.
+        """
+        self.assertEqual(FileCache.key('a', b'b'), FileCache.key(b'a', 'b'))
+        self.assertNotEqual(FileCache.key('ab', 'c'), FileCache.key('a', 'bc'))
+
+    def test_hit_and_miss(self):
+        """ Store a file and get it back.
+        """
+        key = FileCache.key('entry')
+        self.assertIsNone(self.cache.get(key))
+        src = os.path.join(self.tempdir.name, 'src.xml')
+        dest = os.path.join(self.tempdir.name, 'dest.xml')
+        with open(src, 'w') as f:
+            f.write('<document/>')
+        self.cache.put(key, src)
+        self.assertIsNotNone(self.cache.get(key, dest))
+        with open(dest) as f:
+            self.assertEqual(f.read(), '<document/>')
+
+    def test_lru_eviction(self):
+        """ The least recently used entries are removed first.
+        """
+        keys = [FileCache.key(str(i)) for i in range(3)]
+        self.cache.put_bytes(keys[0], b'0' * 10)
+        self.cache.put_bytes(keys[1], b'1' * 10)
+        # make the first entry older than the second one, then use it
+        os.utime(self.cache.path(keys[0]), (0, 0))
+        os.utime(self.cache.path(keys[1]), (1, 1))
+        self.assertEqual(self.cache.get_bytes(keys[0]), b'0' * 10)
+        # exceed the size, the second entry is evicted
+        self.cache.put_bytes(keys[2], b'2' * 15)
+        self.assertIsNone(self.cache.get(keys[1]))
+        self.assertIsNotNone(self.cache.get(keys[0]))
+        self.assertIsNotNone(self.cache.get(keys[2]))
+        self.assertLessEqual(self.cache.size(), 30)
+
+
+if __name__ == '__main__':
+    # run unittest test suite
+    unittest.main()
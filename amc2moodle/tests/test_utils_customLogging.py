@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+"""
+    This file is part of amc2moodle, a convertion tool to recast quiz written
+    with the LaTeX format used by automuliplechoice 1.0.3 into the 
+    moodle XML quiz format.
+    Copyright (C) 2016  Benoit Nennig, benoit.nennig@supmeca.fr 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import contextvars
+import logging
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from amc2moodle.utils.customLogging import CountLogger, run_counters
+
+
+# Run by utils.test
+class TestCountLogger(unittest.TestCase):
+    """ Define CountLogger test cases for unittest.
+    """
+    @classmethod
+    def setUpClass(cls):
+        print('\n> Tests of ', cls.__name__)
+
+    def setUp(self):
+        logging.setLoggerClass(CountLogger)
+        self.logger = logging.getLogger('amc2moodle.tests.counter')
+        # no output
+        self.logger.propagate = False
+        self.logger.addHandler(logging.NullHandler())
+        self.logger.reset_counter()
+
+    def run_warnings(self, n):
+        """ Log `n` warnings in a run and return the counter of the run.
+        """
+        with run_counters():
+            for _ in range(n):
+                self.logger.warning('warning')
+            return dict(self.logger.counter)
+
+    def test_run_counters(self):
+        """ Check that concurrent runs have their own counters.
+        """
+        with ThreadPoolExecutor(4) as pool:
+            counters = list(pool.map(self.run_warnings, range(20)))
+        self.assertEqual([c['warning'] for c in counters], list(range(20)))
+        # the global counter only counts the events outside the runs
+        self.assertEqual(self.logger.counter['warning'], 0)
+        self.logger.error('error')
+        self.assertEqual(self.logger.counter['error'], 1)
+
+    def test_threads(self):
+        """ Check that threads running in a copy of the context share the counters.
+        """
+        with run_counters():
+            with ThreadPoolExecutor(4) as pool:
+                for _ in range(10):
+                    pool.submit(contextvars.copy_context().run, self.logger.warning, 'warning')
+            self.assertEqual(self.logger.counter['warning'], 10)
+        self.assertEqual(self.logger.counter['warning'], 0)
+
+
+if __name__ == '__main__':
+    # run unittest test suite
+    unittest.main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+"""
+    This file is part of amc2moodle, a convertion tool to recast quiz written
+    with the LaTeX format used by automuliplechoice 1.0.3 into the 
+    moodle XML quiz format.
+    Copyright (C) 2016  Benoit Nennig, benoit.nennig@supmeca.fr 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import io
+import os
+import tempfile
+import unittest
+
+from amc2moodle.utils.cache import hash_file
+from amc2moodle.utils.flatex import Flatex, IncludeCycleError
+
+
+# Run by utils.test
+class TestFlatex(unittest.TestCase):
+    """ Define Flatex test cases for unittest.
+    """
+    @classmethod
+    def setUpClass(cls):
+        print('\n> Tests of ', cls.__name__)
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+
+    def write(self, name, content):
+        """ Write a tex file in the temporary directory and return its path.
+        """
+        path = os.path.join(self.tempdir.name, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_expand(self):
+        """ Included files are expanded and magic comments removed.
+        """
+        main = self.write('main.tex', 'a\n\\input{sub}\n%\\input{commented}\nb\n')
+        sub = self.write('sub.tex', '%amc2moodle \\magic\n\\include{subsub.tex}\n')
+        subsub = self.write('subsub.tex', 'c\n')
+        out = io.StringIO()
+        texpand = Flatex(main, out)
+        texpand.expand()
+        self.assertEqual(out.getvalue(), 'a\n\\magic\nc\n\n\n%\\input{commented}\nb\n')
+        self.assertEqual(texpand._magic_comments_number, 1)
+        # dependency graph and hashes
+        self.assertEqual(texpand.graph, {main: [sub], sub: [subsub], subsub: []})
+        self.assertEqual(dict(texpand.sources()),
+                         {f: hash_file(f) for f in (main, sub, subsub)})
+        self.assertEqual(texpand.stats[sub].st_mtime_ns, os.stat(sub).st_mtime_ns)
+        # origin of the output lines
+        self.assertEqual(texpand.locate(1), (main, 1))
+        self.assertEqual(texpand.locate(2), (sub, 1))
+        self.assertEqual(texpand.locate(3), (subsub, 1))
+        self.assertEqual(texpand.locate(4), (sub, 2))
+        self.assertEqual(texpand.locate(5), (main, 2))
+        self.assertEqual(texpand.locate(7), (main, 4))
+        self.assertIsNone(texpand.locate(8))
+        # output file
+        output = os.path.join(self.tempdir.name, 'out.tex')
+        Flatex(main, output).expand()
+        with open(output) as f:
+            self.assertEqual(f.read(), out.getvalue())
+
+    def test_text(self):
+        """ The content of the base file may be given as text.
+        """
+        self.write('sub.tex', 'b\n')
+        main = os.path.join(self.tempdir.name, 'source.tex')
+        out = io.StringIO()
+        Flatex(main, out, text='%amc2moodle a\n\\input{sub}\n').expand()
+        self.assertEqual(out.getvalue(), 'a\nb\n\n')
+        self.assertFalse(os.path.exists(main))
+
+    def test_cycle(self):
+        """ Include cycles raise IncludeCycleError.
+        """
+        main = self.write('main.tex', '\\input{a}\n')
+        self.write('a.tex', '\\input{b}\n')
+        self.write('b.tex', '\\input{a}\n')
+        with self.assertRaises(IncludeCycleError):
+            Flatex(main, io.StringIO()).expand()
+        # the same file may be included several times
+        main = self.write('twice.tex', '\\input{c}\n\\input{c}\n')
+        self.write('c.tex', 'c\n')
+        out = io.StringIO()
+        Flatex(main, out).expand()
+        self.assertEqual(out.getvalue(), 'c\n\nc\n\n')
+
+
+if __name__ == '__main__':
+    # run unittest test suite
+    unittest.main()
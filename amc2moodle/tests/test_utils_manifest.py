@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""
+    This file is part of amc2moodle, a convertion tool to recast quiz written
+    with the LaTeX format used by automuliplechoice 1.0.3 into the 
+    moodle XML quiz format.
+    Copyright (C) 2016  Benoit Nennig, benoit.nennig@supmeca.fr 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import tempfile
+import unittest
+
+from amc2moodle.utils.cache import hash_file
+from amc2moodle.utils.manifest import Manifest
+
+
+# Run by utils.test
+class TestManifest(unittest.TestCase):
+    """ Define manifest test cases for unittest.
+    """
+    @classmethod
+    def setUpClass(cls):
+        print('\n> Tests of ', cls.__name__)
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.source = os.path.join(self.tempdir.name, 'source.tex')
+        self.write(b'abc')
+        self.filename = os.path.join(self.tempdir.name, 'out.manifest.json')
+        manifest = Manifest({'catname': 'amc'})
+        manifest.add('sources', self.source)
+        manifest.save(self.filename)
+
+    def write(self, data, mtime_ns=None):
+        """ Write the source file, with a given modification time if provided.
+        """
+        with open(self.source, 'wb') as f:
+            f.write(data)
+        if mtime_ns is not None:
+            os.utime(self.source, ns=(mtime_ns, mtime_ns))
+
+    def test_up_to_date(self):
+        """ The manifest is up to date if files and options are unchanged.
+        """
+        manifest = Manifest.load(self.filename)
+        self.assertTrue(manifest.is_up_to_date({'catname': 'amc'}))
+        self.assertFalse(manifest.is_up_to_date({'catname': 'other'}))
+
+    def test_changes(self):
+        """ Modified or removed files are detected, touched files are not.
+        """
+        mtime_ns = os.stat(self.source).st_mtime_ns
+        # same content, new modification time
+        self.write(b'abc', mtime_ns + 10**9)
+        self.assertTrue(Manifest.load(self.filename).is_up_to_date({'catname': 'amc'}))
+        # same size, other content
+        self.write(b'abd', mtime_ns + 2 * 10**9)
+        self.assertFalse(Manifest.load(self.filename).is_up_to_date({'catname': 'amc'}))
+        os.unlink(self.source)
+        self.assertFalse(Manifest.load(self.filename).is_up_to_date({'catname': 'amc'}))
+
+    def test_read_entry(self):
+        """ A file modified after it is read is detected with the stat taken at read time.
+        """
+        stat, digest = os.stat(self.source), hash_file(self.source)
+        # modified during the conversion
+        self.write(b'abd', stat.st_mtime_ns + 10**9)
+        manifest = Manifest({'catname': 'amc'})
+        manifest.add('sources', self.source, digest, stat)
+        manifest.save(self.filename)
+        self.assertFalse(Manifest.load(self.filename).is_up_to_date({'catname': 'amc'}))
+
+    def test_invalid(self):
+        """ Missing or invalid manifests are ignored.
+        """
+        self.assertIsNone(Manifest.load(self.filename + '.missing'))
+        with open(self.filename, 'w') as f:
+            f.write('{not json')
+        self.assertIsNone(Manifest.load(self.filename))
+
+
+if __name__ == '__main__':
+    # run unittest test suite
+    unittest.main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+"""
+    This file is part of amc2moodle, a convertion tool to recast quiz written
+    with the LaTeX format used by automuliplechoice 1.0.3 into the 
+    moodle XML quiz format.
+    Copyright (C) 2016  Benoit Nennig, benoit.nennig@supmeca.fr 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import unittest
+
+from amc2moodle.utils.progress import Progress, format_duration
+
+
+class FakeClock:
+    """ Clock advanced by hand.
+    """
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+# Run by utils.test
+class TestProgress(unittest.TestCase):
+    """ Define progress test cases for unittest.
+    """
+    @classmethod
+    def setUpClass(cls):
+        print('\n> Tests of ', cls.__name__)
+
+    def test_format_duration(self):
+        """ Check the duration format.
+        """
+        self.assertEqual(format_duration(65.2), '1:05')
+        self.assertEqual(format_duration(3725), '1:02:05')
+
+    def test_rate_eta(self):
+        """ Check the rate, the ETA and the throttling of the messages.
+        """
+        clock = FakeClock()
+        messages = []
+        progress = Progress(10, 'questions', log=messages.append, interval=2., clock=clock)
+        clock.now = 1.
+        progress.step()
+        self.assertEqual(messages, ['   1/10 questions (10%), 1.0 questions/s, ETA 0:09'])
+        # too soon to report
+        clock.now = 2.
+        progress.step()
+        self.assertEqual(len(messages), 1)
+        clock.now = 4.
+        progress.step(2)
+        self.assertEqual(messages[-1], '   4/10 questions (40%), 1.0 questions/s, ETA 0:06')
+        # the end is always reported
+        clock.now = 5.
+        progress.step(6)
+        self.assertEqual(messages[-1], '   10/10 questions (100%), 2.0 questions/s, ETA 0:00')
+        progress.finish()
+        self.assertEqual(messages[-1], '   10 questions in 0:05')
+
+    def test_unknown_total(self):
+        """ Check the message without the number of items.
+        """
+        clock = FakeClock()
+        messages = []
+        progress = Progress(0, log=messages.append, clock=clock)
+        clock.now = 2.
+        progress.step()
+        self.assertEqual(messages, ['   1 items, 0.5 items/s'])
+
+
+if __name__ == '__main__':
+    # run unittest test suite
+    unittest.main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""
+    This file is part of amc2moodle, a convertion tool to recast quiz written
+    with the LaTeX format used by automuliplechoice 1.0.3 into the 
+    moodle XML quiz format.
+    Copyright (C) 2016  Benoit Nennig, benoit.nennig@supmeca.fr 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import sys
+import unittest
+
+from amc2moodle.utils import supervisor
+
+# Fake LaTeXML writing an error on stderr, with its location
+SCRIPT_ERRORS = r'''
+import sys
+print('Processing...')
+for i in range(3):
+    print('Error:undefined:\\foo The token T_CS[\\foo] is not defined.', file=sys.stderr)
+    print('\tat /tmp/doc.tex; line {} col 1 - line {} col 5'.format(10 + i, 10 + i),
+          file=sys.stderr)
+sys.exit(1)
+'''
+
+
+# Run by utils.test
+class TestSupervisor(unittest.TestCase):
+    """ Define supervisor test cases for unittest.
+    """
+    @classmethod
+    def setUpClass(cls):
+        print('\n> Tests of ', cls.__name__)
+
+    def test_success(self):
+        """ Check the output and the input of the process.
+        """
+        lines = []
+        result = supervisor.run([sys.executable, '-c', 'print(input().upper())'],
+                                input='abc\n', output=lines.append)
+        self.assertTrue(result.ok)
+        self.assertEqual(lines, ['ABC'])
+        self.assertEqual(result.errors, [])
+
+    def test_capture(self):
+        """ Check that the standard output is captured and stderr still parsed.
+        """
+        script = "import sys; print('<a/>'); print('Error:x y', file=sys.stderr)"
+        result = supervisor.run([sys.executable, '-c', script], capture=True)
+        self.assertEqual(result.stdout, '<a/>\n')
+        self.assertEqual([e.message for e in result.errors], ['Error:x y'])
+
+    def test_encoding(self):
+        """ Check that the streams are UTF-8 encoded, whatever the locale.
+        """
+        script = ("import sys; sys.stdout.buffer.write(sys.stdin.buffer.read()); "
+                  "sys.stderr.buffer.write('Error:x \\u00e9'.encode('utf-8'))")
+        result = supervisor.run([sys.executable, '-c', script], input='Équation à €\n',
+                                capture=True)
+        self.assertEqual(result.stdout, 'Équation à €\n')
+        self.assertEqual([e.message for e in result.errors], ['Error:x é'])
+
+    def test_errors(self):
+        """ Check that the errors are parsed with their location.
+        """
+        found = []
+        result = supervisor.run([sys.executable, '-c', SCRIPT_ERRORS], on_error=found.append)
+        self.assertFalse(result.ok)
+        self.assertFalse(result.aborted)
+        self.assertEqual(result.errors, found)
+        self.assertEqual([(e.file, e.line) for e in found],
+                         [('/tmp/doc.tex', 10), ('/tmp/doc.tex', 11), ('/tmp/doc.tex', 12)])
+        self.assertTrue(found[0].message.startswith('Error:undefined'))
+
+    def test_progress(self):
+        """ Check that the progress markers are counted.
+        """
+        script = "print('[amc2moodle:question]\\n' * 3)"
+        steps = []
+        result = supervisor.run([sys.executable, '-c', script],
+                                on_progress=lambda: steps.append(1))
+        self.assertTrue(result.ok)
+        self.assertEqual(len(steps), 3)
+
+    def test_max_errors(self):
+        """ Check that the process is stopped after `max_errors` errors.
+        """
+        script = SCRIPT_ERRORS.replace('sys.exit(1)', 'import time; time.sleep(30)')
+        result = supervisor.run([sys.executable, '-c', script], max_errors=2, timeout=20)
+        self.assertTrue(result.aborted)
+        self.assertFalse(result.timed_out)
+        self.assertFalse(result.ok)
+
+    def test_timeout(self):
+        """ Check that the process is killed after the timeout.
+        """
+        result = supervisor.run([sys.executable, '-c', 'import time; time.sleep(30)'],
+                                timeout=0.5)
+        self.assertTrue(result.timed_out)
+        self.assertFalse(result.ok)
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'address space limit checked on Linux')
+    def test_memory_limit(self):
+        """ Check that the address space of the process is limited.
+        """
+        # the limit is read as soon as the process starts
+        script = 'import resource; print(resource.getrlimit(resource.RLIMIT_AS)[0])'
+        nbytes = 2**40
+        result = supervisor.run([sys.executable, '-c', script],
+                                memory_limit=nbytes, capture=True)
+        self.assertTrue(result.ok)
+        self.assertEqual(int(result.stdout), nbytes)
+
+
+if __name__ == '__main__':
+    # run unittest test suite
+    unittest.main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+    This file is part of amc2moodle, a convertion tool to recast quiz written
+    with the LaTeX format used by automuliplechoice 1.0.3 into the 
+    moodle XML quiz format.
+    Copyright (C) 2016  Benoit Nennig, benoit.nennig@supmeca.fr 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import tempfile
+import unittest
+
+from lxml import etree
+
+from amc2moodle.utils.texsplit import merge_shards, shard_elements, split_elements
+
+TEX = r"""\documentclass{article}
+\newcommand{\element}[2]{#2}% not in the body
+\begin{document}
+\baremeDefautS{e=-0.5,b=1,m=-0.5}
+%\element{commented}{out}
+\element{cat1}{
+  \begin{question}{q1} Set $\{1, 2\}$ \end{question}
+}
+between
+\element{cat2}{\begin{question}{q2} with % a } in comment
+  brace \end{question}}
+\elementary{not an element}
+\exemplaire{1}{\element{nested}{}}
+\end{document}
+"""
+
+# LaTeXML output of a shard, the identifiers restart in each shard
+SHARD = """<?xml version="1.0" encoding="UTF-8"?>
+<document xmlns="http://dlmf.nist.gov/LaTeXML">
+  <resource src="LaTeXML.css" type="text/css"/>
+  <para xml:id="p1"><p>{text} <ref idref="p1"/></p></para>
+  <para xml:id="p2"><p><![CDATA[{text} & co]]></p></para>
+</document>
+"""
+
+
+# Run by utils.test
+class TestTexSplit(unittest.TestCase):
+    """ Define `\\element` splitting test cases for unittest.
+    """
+    @classmethod
+    def setUpClass(cls):
+        print('\n> Tests of ', cls.__name__)
+
+    def test_roundtrip(self):
+        """ The split document gives back the original one.
+        """
+        doc = split_elements(TEX)
+        self.assertEqual(doc.preamble + doc.head + ''.join(doc.elements) + doc.tail + doc.end,
+                         TEX)
+
+    def test_elements(self):
+        """ Only top level and uncommented `\\element` are found.
+        """
+        doc = split_elements(TEX)
+        self.assertEqual(len(doc.elements), 2)
+        self.assertTrue(doc.preamble.endswith('\\begin{document}'))
+        self.assertIn('baremeDefautS', doc.head)
+        self.assertTrue(doc.elements[0].startswith('\\element{cat1}'))
+        self.assertTrue(doc.elements[0].endswith('between\n'))
+        self.assertTrue(doc.elements[1].endswith('brace \\end{question}}'))
+        self.assertIn('\\exemplaire', doc.tail)
+        self.assertEqual(doc.end, '\\end{document}\n')
+
+    def test_chunk(self):
+        """ Chunks are standalone documents.
+        """
+        doc = split_elements(TEX)
+        chunk = doc.chunk(doc.elements[1])
+        self.assertTrue(chunk.startswith('\\documentclass'))
+        self.assertTrue(chunk.endswith('\\end{document}\n'))
+
+    def test_shards(self):
+        """ Shards are contiguous, non empty and balanced.
+        """
+        elements = ['a' * size for size in (10, 1, 1, 1, 10, 1, 1, 1, 10)]
+        for n in range(1, 12):
+            shards = shard_elements(elements, n)
+            self.assertEqual(len(shards), min(n, len(elements)))
+            self.assertTrue(all(shards))
+            self.assertEqual([e for shard in shards for e in shard], elements)
+        self.assertEqual([sum(map(len, shard)) for shard in shard_elements(elements, 3)],
+                         [12, 12, 12])
+        self.assertEqual(shard_elements([], 4), [])
+
+    def test_errors(self):
+        """ Missing document and unbalanced blocks raise ValueError.
+        """
+        with self.assertRaises(ValueError):
+            split_elements('\\element{a}{b}')
+        with self.assertRaises(ValueError):
+            split_elements('\\begin{document}\\element{a}{b\\end{document}')
+
+    def test_merge(self):
+        """ Merged shards keep their order and get unique identifiers.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            xmlfiles = []
+            for i, text in enumerate(('first', 'second')):
+                xmlfiles.append(os.path.join(tmp, f'shard{i}.xml'))
+                with open(xmlfiles[-1], 'w') as f:
+                    f.write(SHARD.format(text=text))
+            output = os.path.join(tmp, 'merged.xml')
+            merge_shards(xmlfiles, output)
+            # duplicated identifiers would raise XMLSyntaxError
+            tree = etree.parse(output, etree.XMLParser(strip_cdata=False))
+            with open(output) as f:
+                self.assertIn('<![CDATA[second & co]]>', f.read())
+        ns = {'ltx': 'http://dlmf.nist.gov/LaTeXML'}
+        self.assertEqual(len(tree.findall('ltx:resource', ns)), 1)
+        self.assertEqual([p.get('{http://www.w3.org/XML/1998/namespace}id')
+                          for p in tree.findall('ltx:para', ns)],
+                         ['s0.p1', 's0.p2', 's1.p1', 's1.p2'])
+        self.assertEqual([ref.get('idref') for ref in tree.iterfind('.//ltx:ref', ns)],
+                         ['s0.p1', 's1.p1'])
+        self.assertEqual([''.join(p.itertext()).split()[0] for p in tree.findall('ltx:para', ns)],
+                         ['first', 'first', 'second', 'second'])
+
+
+if __name__ == '__main__':
+    # run unittest test suite
+    unittest.main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+    This file is part of amc2moodle, a convertion tool to recast quiz written
+    with the LaTeX format used by automuliplechoice 1.0.3 into the 
+    moodle XML quiz format.
+    Copyright (C) 2016  Benoit Nennig, benoit.nennig@supmeca.fr 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from amc2moodle.utils import tools
+
+
+# Run by utils.test
+class TestTools(unittest.TestCase):
+    """ Define tools discovery test cases for unittest.
+    """
+    @classmethod
+    def setUpClass(cls):
+        print('\n> Tests of ', cls.__name__)
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+        self.addCleanup(tools.clear)
+        tools.clear()
+        # fake tool counting its runs in a file
+        self.calls = os.path.join(self.tempdir.name, 'calls')
+        self.tool = os.path.join(self.tempdir.name, 'faketool')
+        with open(self.tool, 'w') as f:
+            f.write(f'#!/bin/sh\necho run >> {self.calls}\necho "faketool 1.0"\n')
+        os.chmod(self.tool, 0o755)
+        path = os.pathsep.join((self.tempdir.name, os.environ.get('PATH', '')))
+        patcher = mock.patch.dict(os.environ, {'PATH': path})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def ncalls(self):
+        """ Return the number of runs of the fake tool.
+        """
+        if not os.path.exists(self.calls):
+            return 0
+        with open(self.calls) as f:
+            return len(f.readlines())
+
+    def test_which(self):
+        """ Check the tools found in the PATH.
+        """
+        self.assertEqual(tools.which('faketool'), self.tool)
+        self.assertIsNone(tools.which('amc2moodle_missing_tool'))
+        self.assertIsNone(tools.version('amc2moodle_missing_tool',
+                                        cache_dir=self.tempdir.name))
+
+    def test_version(self):
+        """ Check that the version is probed once per installation of the tool.
+        """
+        cache_dir = os.path.join(self.tempdir.name, 'cache')
+        self.assertEqual(tools.version('faketool', cache_dir=cache_dir), 'faketool 1.0')
+        self.assertEqual(self.ncalls(), 1)
+        # another process reads the stored version
+        tools.clear()
+        self.assertEqual(tools.version('faketool', cache_dir=cache_dir), 'faketool 1.0')
+        self.assertEqual(self.ncalls(), 1)
+        # the tool is probed again when it changes
+        tools.clear()
+        stat = os.stat(self.tool)
+        os.utime(self.tool, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertEqual(tools.version('faketool', cache_dir=cache_dir), 'faketool 1.0')
+        self.assertEqual(self.ncalls(), 2)
+
+
+if __name__ == '__main__':
+    # run unittest test suite
+    unittest.main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+"""
+    This file is part of amc2moodle, a convertion tool to recast quiz written
+    with the LaTeX format used by automuliplechoice 1.0.3 into the 
+    moodle XML quiz format.
+    Copyright (C) 2016  Benoit Nennig, benoit.nennig@supmeca.fr 
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from lxml import etree
+
+from amc2moodle.utils import xslt
+
+# stylesheet of the moodle2amc conversion, without extension function
+_STRUC2TEX = os.path.join(os.path.dirname(__file__), os.pardir,
+                          'moodle2amc', 'struc2tex.xslt')
+
+
+# Run by utils.test
+class TestXSLTRegistry(unittest.TestCase):
+    """ Define compiled XSLT registry test cases for unittest.
+    """
+    @classmethod
+    def setUpClass(cls):
+        print('\n> Tests of ', cls.__name__)
+
+    def test_same_transformer(self):
+        """ Check that a stylesheet is compiled once per thread.
+        """
+        transform = xslt.transformer(_STRUC2TEX)
+        self.assertIsInstance(transform, etree.XSLT)
+        self.assertIs(xslt.transformer(_STRUC2TEX), transform)
+        # relative and absolute paths give the same entry
+        self.assertIs(xslt.transformer(os.path.relpath(_STRUC2TEX)), transform)
+        xslt.clear()
+        self.assertIsNot(xslt.transformer(_STRUC2TEX), transform)
+
+    def test_threads(self):
+        """ Check that each thread gets its own compiled stylesheet.
+        """
+        with ThreadPoolExecutor(4) as pool:
+            transforms = list(pool.map(lambda _: xslt.transformer(_STRUC2TEX), range(4)))
+        # all different from the main thread one
+        main = xslt.transformer(_STRUC2TEX)
+        self.assertTrue(all(t is not main for t in transforms))
+
+
+if __name__ == '__main__':
+    # run unittest test suite
+    unittest.main()
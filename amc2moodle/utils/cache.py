@@ -0,0 +1,196 @@
+"""
+This file is part of amc2moodle, a convertion tool to recast quiz written
+with the LaTeX format used by automuliplechoice 1.0.3 into the
+moodle XML quiz format.
+Copyright (C) 2016  Benoit Nennig, benoit.nennig@supmeca.fr
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+# Default maximal size of a cache directory (in bytes)
+DEFAULT_CACHE_SIZE = 512 * 1024**2
+
+# activate logger
+Logger = logging.getLogger(__name__)
+
+
+def default_cache_dir():
+    """ Return the default cache directory of amc2moodle (XDG convention).
+    """
+    root = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(root, 'amc2moodle')
+
+
+def hash_file(filename, algorithm='sha256'):
+    """ Return the hex digest of the content of `filename`.
+    """
+    h = hashlib.new(algorithm)
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1024**2), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class FileCache:
+    """ On-disk content addressed cache with a size cap and LRU eviction.
+
+    Each entry is stored in a file named after its key. The modification time
+    of the entry is updated at each hit and the least recently used entries
+    are removed when the total size exceeds `max_size`.
+    Entries are written in a temporary file and then renamed, thus concurrent
+    runs sharing the same cache directory never see partial entries.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_CACHE_SIZE):
+        """ Create the cache in `directory` (created if needed).
+
+        Parameters
+        ----------
+        directory : string
+            The cache directory.
+        max_size : int, optional
+            Maximal size of the cache in bytes. The default is DEFAULT_CACHE_SIZE.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __repr__(self):
+        """ Change string representation.
+        """
+        return f"Instance of {self.__class__.__name__} in '{self.directory}'."
+
+    @staticmethod
+    def key(*parts):
+        """ Compute the key of an entry from its `parts` (str or bytes).
+        """
+        h = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode('utf-8')
+            # prefix with the length to avoid ambiguous concatenations
+            h.update(str(len(part)).encode() + b':' + part)
+        return h.hexdigest()
+
+    def path(self, key):
+        """ Return the path of the entry `key`.
+        """
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key, dest=None):
+        """ Look for the entry `key`, copy it in `dest` if provided.
+
+        Returns
+        -------
+        path : string or None
+            The path of the entry in the cache, None if not found.
+        """
+        path = self.path(key)
+        try:
+            # mark as recently used
+            os.utime(path)
+        except FileNotFoundError:
+            Logger.debug(f'   Cache miss {key[:12]}')
+            return None
+        Logger.debug(f'   Cache hit {key[:12]}')
+        if dest is not None:
+            shutil.copyfile(path, dest)
+        return path
+
+    def get_bytes(self, key):
+        """ Return the content of the entry `key` or None if not found.
+        """
+        path = self.get(key)
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def put(self, key, src):
+        """ Store the file `src` as the entry `key`.
+        """
+        with open(src, 'rb') as f:
+            self._store(key, lambda fout: shutil.copyfileobj(f, fout))
+
+    def put_bytes(self, key, data):
+        """ Store `data` as the entry `key`.
+        """
+        self._store(key, lambda fout: fout.write(data))
+
+    def _store(self, key, write):
+        """ Write an entry atomically with the `write` function and evict old entries.
+        """
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fout:
+                write(fout)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.evict()
+
+    def entries(self):
+        """ Return the list of (mtime, size, path) of all entries.
+        """
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    # removed by a concurrent run
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def size(self):
+        """ Return the total size of the cache in bytes.
+        """
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """ Remove the least recently used entries until the size fits `max_size`.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_size:
+            return
+        # oldest first
+        for _, size, path in sorted(entries):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            Logger.debug(f'   Cache eviction of {os.path.basename(path)[:12]}')
+            if total <= self.max_size:
+                break
+
+    def clear(self):
+        """ Remove all entries.
+        """
+        for _, _, path in self.entries():
+            os.unlink(path)
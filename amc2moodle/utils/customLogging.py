@@ -1,5 +1,8 @@
+import contextlib
+import contextvars
 import logging
 import sys
+import threading
 
 # DEFAULT
 DEFAULT_LOG_BASIC_FORMATTER = '[%(levelname)-8s]: %(message)s '
@@ -8,6 +11,26 @@ DEFAULT_LOG_VERBB_FORMATTER = lambda x: f'%(relativeCreated)dms - ({x}-%(name)s)
 DEFAULT_LOG_VERBC_FORMATTER = '%(relativeCreated)dms - (%(name)s) [%(levelname)-8s]: %(message)s '
 DEFAULT_FMT_TIME = '%H:%M:%S'
 
+# Counters of the current run {logger name: counter}, see `run_counters`
+_run_counters = contextvars.ContextVar('run_counters', default=None)
+_counter_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def run_counters():
+    """ Count the events logged in this block separately.
+
+    Inside the block, `CountLogger.counter` only counts the events of the
+    current context, thus concurrent runs in other threads do not change it.
+    Threads started in the block share the counters if they run in a copy
+    of the context (`contextvars.copy_context().run`).
+    """
+    token = _run_counters.set({})
+    try:
+        yield
+    finally:
+        _run_counters.reset(token)
+
 
 class CountLogger(logging.getLoggerClass()):
     """ Create a new logger class that count warnings and errors.
@@ -15,26 +38,41 @@ class CountLogger(logging.getLoggerClass()):
     The counter is incrrease each time a warning or error are logged. In all
     cases the super methods are used.
     The `counter` is stored has a dictionnary. Use `counter['warning']` to
-    get the value.
+    get the value. In a `run_counters` block, the counter of the run is used.
     """
 
     def __init__(self, name):
         """ Overload base class init.
         """
         super().__init__(name)
-        # store counters in a dict
-        self.counter = {'warning': 0, 'error': 0, 'critical': 0}
+        # store counters in a dict, used outside `run_counters`
+        self._counter = {'warning': 0, 'error': 0, 'critical': 0}
+
+    @property
+    def counter(self):
+        """ The counters of the current run, or the global ones.
+        """
+        counters = _run_counters.get()
+        if counters is None:
+            return self._counter
+        with _counter_lock:
+            return counters.setdefault(self.name, {'warning': 0, 'error': 0, 'critical': 0})
+
+    def _count(self, level):
+        counter = self.counter
+        with _counter_lock:
+            counter[level] += 1
 
     def warning(self, msg, *args, **kwargs):
-        self.counter['warning'] += 1
+        self._count('warning')
         super().warning(msg, *args, **kwargs)
 
     def error(self, msg, *args, **kwargs):
-        self.counter['error'] += 1
+        self._count('error')
         super().error(msg, *args, **kwargs)
 
     def critical(self, msg, *args, **kwargs):
-        self.counter['critical'] += 1
+        self._count('critical')
         super().critical(msg, *args, **kwargs)
 
     def reset_counter(self):
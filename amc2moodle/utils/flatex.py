@@ -25,6 +25,9 @@ Distributed under the terms of the GNU General Public License
 See http://www.gnu.org/licenses/gpl.txt for details.
 """
 
+import bisect
+import hashlib
+import io
 import logging
 import os
 import re
@@ -32,24 +35,43 @@ import re
 # activate logger
 Logger = logging.getLogger(__name__)
 
+# match uncommented 'input' or 'include'
+TEX_INPUT_RE = re.compile(r"""(^[^\%]*\\input{[^}]*})|(^[^\%]*\\include{[^}]*})""")
+# included file name
+TEX_INPUT_FILENAME_RE = re.compile(r"""{[^}]*""")
+
+
+class IncludeCycleError(Exception):
+    """ Raised when a tex file includes itself, directly or not.
+    """
+
+
 class Flatex:
     """ Merge all included tex files in one and remove magic comments.
+
+    The lines are streamed to the output. The include dependency graph is
+    recorded in `graph` (file -> list of included files), the hash of each
+    contributing file in `hashes` and its `os.stat` when it is read in
+    `stats`. The origin of the output lines is given by `locate`.
     """
 
     def __init__(self, base_file, output_file,
-                 noline=False, magic_flag=True):
+                 noline=False, magic_flag=True, text=None):
         """ Create a new Flatex instance.
 
         Parameters
         ----------
         base_file : string
             Input tex filename.
-        output_file : string
-            Output tex file name.
+        output_file : string or file object
+            Output tex file name, or an opened text file (pipe, ...).
         noline : bool, optional
             Add blank line after include/input. The default is False.
         magic_flag : bool, optional
             Remove or not the magic comment tag.
+        text : string, optional
+            Content of `base_file`, if it is not read from the disk. The
+            included files are still looked for in its directory.
 
         Returns
         -------
@@ -61,6 +83,7 @@ class Flatex:
         self.output_file = output_file
         self.noline = noline
         self.magic_flag = magic_flag
+        self.text = text
 
         # define the tag used to prefix the 'magic comments'
         self.magictag = '%amc2moodle '
@@ -68,6 +91,14 @@ class Flatex:
         # define state variable for log
         self._magic_comments_number = 0
         self._included_files_list = [base_file]
+        # include dependency graph and hash of all files
+        self.graph = {}
+        self.hashes = {}
+        self.stats = {}
+        # output line, and (file, line), at each change of origin of the lines
+        self._line_starts = []
+        self._line_origins = []
+        self._line = 0
 
     @staticmethod
     def is_input(line):
@@ -76,17 +107,13 @@ class Flatex:
         \input{} statement. Allows only spaces between start of line and
         '\input{}'.
         """
-        # tex_input_re = r"""^\s*\\input{[^}]*}""" # input only
-        # match 'input' or 'include'
-        tex_input_re = r"""(^[^\%]*\\input{[^}]*})|(^[^\%]*\\include{[^}]*})"""
-        return re.search(tex_input_re, line)
+        return TEX_INPUT_RE.search(line)
 
     @staticmethod
     def get_input(line):
         """ Gets the file name from a line containing an input statement.
         """
-        tex_input_filename_re = r"""{[^}]*"""
-        m = re.search(tex_input_filename_re, line)
+        m = TEX_INPUT_FILENAME_RE.search(line)
         return m.group()[1:]
 
     def magic_filter(self, line):
@@ -109,46 +136,100 @@ class Flatex:
 
         return abs_path
 
-    def expand_file(self, base_file, current_path):
+    def expand_file(self, base_file, current_path, _stack=()):
         """
-        Recursively-defined function that takes as input a file and returns it
-        with all the inputs replaced with the contents of the referenced file.
+        Recursively-defined generator that takes as input a file and yields
+        its lines with all the inputs replaced by the lines of the referenced
+        file.
+
+        Raises
+        ------
+        IncludeCycleError
+            If a file includes itself, directly or not.
         """
-        output_lines = []
-        with open(base_file) as f:
-            for line in f:
+        key = os.path.realpath(base_file)
+        if key in _stack:
+            chain = [*_stack[_stack.index(key):], key]
+            raise IncludeCycleError('Include cycle: ' + ' -> '.join(chain))
+        _stack = (*_stack, key)
+        includes = self.graph.setdefault(base_file, [])
+        if self.text is not None and base_file == self.base_file:
+            self.hashes[base_file] = hashlib.sha256(self.text.encode('utf-8')).hexdigest()
+            f = io.StringIO(self.text)
+        else:
+            # the hash and the stat of the content actually read
+            with open(base_file, 'rb') as fb:
+                self.stats[base_file] = os.fstat(fb.fileno())
+                data = fb.read()
+            self.hashes[base_file] = hashlib.sha256(data).hexdigest()
+            f = io.TextIOWrapper(io.BytesIO(data))
+        with f:
+            for lineno, line in enumerate(f, 1):
                 # test if it contains an '\include' or '\input'
                 if self.is_input(line):
                     new_base_file = self.combine_path(current_path,
                                                       self.get_input(line))
-                    output_lines += self.expand_file(new_base_file, current_path)
+                    includes.append(new_base_file)
+                    yield from self.expand_file(new_base_file, current_path, _stack)
                     self._included_files_list.append(new_base_file)
                     if self.noline:
                         pass
                     else:
                         # add a new line after each inclided file
-                        output_lines.append('\n')
+                        yield self._track('\n', base_file, lineno)
                 # test if magic coment
                 elif self.magic_flag and line.lstrip().startswith(self.magictag):
-                    output_lines += self.magic_filter(line)
+                    yield self._track(self.magic_filter(line), base_file, lineno)
                     # count it
                     self._magic_comments_number += 1
                 # else append line
                 else:
-                    output_lines.append(line)
+                    yield self._track(line, base_file, lineno)
 
-        return output_lines
+    def _track(self, line, base_file, lineno):
+        """ Record the origin of the output `line` and return it.
+        """
+        self._line += 1
+        if not (self._line_origins and self._line_origins[-1][0] == base_file
+                and self._line - self._line_starts[-1] == lineno - self._line_origins[-1][1]):
+            self._line_starts.append(self._line)
+            self._line_origins.append((base_file, lineno))
+        return line
+
+    def locate(self, line):
+        """ Return the (file, line) of the source of the output `line` (1-based).
+
+        Returns None if the line is not in the output.
+        """
+        i = bisect.bisect_right(self._line_starts, line) - 1
+        if i < 0 or line > self._line:
+            return None
+        base_file, lineno = self._line_origins[i]
+        return base_file, lineno + line - self._line_starts[i]
 
     def expand(self):
         """ This "flattens" a LaTeX document by replacing all \\input{X} lines
         with the text actually contained in X.
+
+        Raises
+        ------
+        IncludeCycleError
+            If a file includes itself, directly or not.
         """
         current_path = os.path.split(self.base_file)[0]
-        with open(self.output_file, "w") as g:
-            g.write(''.join(self.expand_file(self.base_file,
-                                             current_path)))
+        lines = self.expand_file(self.base_file, current_path)
+        if isinstance(self.output_file, (str, bytes, os.PathLike)):
+            with open(self.output_file, "w") as g:
+                g.writelines(lines)
+        else:
+            self.output_file.writelines(lines)
         return 0
 
+    def sources(self):
+        """ Return the list of the files contributing to the output with their hash.
+        """
+        return list(self.hashes.items())
+
     def report(self):
         """ Print log info about the expansion.
         """
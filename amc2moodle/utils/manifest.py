@@ -0,0 +1,135 @@
+"""
+This file is part of amc2moodle, a convertion tool to recast quiz written
+with the LaTeX format used by automuliplechoice 1.0.3 into the
+moodle XML quiz format.
+Copyright (C) 2016  Benoit Nennig, benoit.nennig@supmeca.fr
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Manifest of the files and options used to build an output file.
+"""
+
+import json
+import logging
+import os
+import tempfile
+
+from .cache import hash_file
+
+# Format of the manifest file, increased when the content changes
+MANIFEST_VERSION = 1
+
+# activate logger
+Logger = logging.getLogger(__name__)
+
+
+def file_entry(filename, digest=None, stat=None):
+    """ Return the description (size, modification time and hash) of `filename`.
+
+    The `digest` and the `stat` of a file already read should be taken at the
+    same time, when it is read. If not provided, they are computed now.
+    """
+    if stat is None or digest is None:
+        # stat first, a later change gives another modification time
+        stat = os.stat(filename)
+    if digest is None:
+        digest = hash_file(filename)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}
+
+
+def is_unchanged(filename, entry):
+    """ Return True if the content of `filename` matches `entry`.
+
+    The file is only hashed if its size is the same and its modification
+    time differs.
+    """
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return False
+    if stat.st_size != entry['size']:
+        return False
+    if stat.st_mtime_ns == entry['mtime_ns']:
+        return True
+    return hash_file(filename) == entry['sha256']
+
+
+class Manifest:
+    """ List of the files, grouped by kind, and options used to build an output.
+
+    The manifest is stored in JSON. It is up to date if the options are the
+    same and if none of the files has changed.
+    """
+
+    def __init__(self, options=None):
+        """ Create an empty manifest with the `options` (JSON serializable dict).
+        """
+        self.options = {} if options is None else options
+        self.files = {}
+
+    def __repr__(self):
+        """ Change string representation.
+        """
+        count = sum(len(files) for files in self.files.values())
+        return f"Instance of {self.__class__.__name__} with {count} files."
+
+    def add(self, kind, filename, digest=None, stat=None):
+        """ Add the file `filename` in the group `kind` ('sources', 'images'...).
+
+        See `file_entry` for `digest` and `stat`.
+        """
+        filename = os.path.abspath(filename)
+        self.files.setdefault(kind, {})[filename] = file_entry(filename, digest, stat)
+
+    def is_up_to_date(self, options):
+        """ Return True if `options` and all the files are unchanged.
+        """
+        if options != self.options:
+            Logger.debug('   Manifest: options changed')
+            return False
+        for kind, files in self.files.items():
+            for filename, entry in files.items():
+                if not is_unchanged(filename, entry):
+                    Logger.debug(f'   Manifest: {kind} {filename} changed')
+                    return False
+        return True
+
+    def save(self, filename):
+        """ Write the manifest in `filename` atomically.
+        """
+        data = {'version': MANIFEST_VERSION, 'options': self.options, 'files': self.files}
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)),
+                                   prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            os.replace(tmp, filename)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, filename):
+        """ Read the manifest `filename`, return None if missing or invalid.
+        """
+        try:
+            with open(filename) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get('version') != MANIFEST_VERSION:
+            return None
+        manifest = cls(data['options'])
+        manifest.files = data['files']
+        return manifest
@@ -81,6 +81,10 @@ def for_all_methods(decorator):
 def decorator_set_cwd(directory):
     """ Set and unset the current working directory.
 
+    The current working directory is shared by all the threads, do not use
+    it with concurrent conversions (use the `cwd` argument of the functions
+    running external tools instead).
+
     Parameters
     ----------
     directory : path
@@ -97,10 +101,11 @@ def decorator_set_cwd(directory):
             init_cwd = os.getcwd()
             # set cwd
             os.chdir(directory)
-            # run function
-            result = function(*args, **kwargs)
-            # restore cwd
-            os.chdir(init_cwd)
-            return result
+            try:
+                # run function
+                return function(*args, **kwargs)
+            finally:
+                # restore cwd
+                os.chdir(init_cwd)
         return wrapper
     return decorator
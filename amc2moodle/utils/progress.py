@@ -0,0 +1,113 @@
+"""
+This file is part of amc2moodle, a convertion tool to recast quiz written
+with the LaTeX format used by automuliplechoice 1.0.3 into the
+moodle XML quiz format.
+Copyright (C) 2016  Benoit Nennig, benoit.nennig@supmeca.fr
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Progress report, with rate and estimated time of arrival, of long tasks.
+"""
+
+
+import logging
+import threading
+import time
+
+# activate logger
+Logger = logging.getLogger(__name__)
+
+
+def format_duration(seconds):
+    """ Return `seconds` as 'm:ss' or 'h:mm:ss'.
+    """
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f'{hours}:{minutes:02d}:{seconds:02d}'
+    return f'{minutes}:{seconds:02d}'
+
+
+class Progress:
+    """ Count the processed items of a task and log the rate and the ETA.
+
+    The report is written at most every `interval` seconds, so the log is not
+    flooded on large tasks. `step` can be called from several threads.
+    """
+
+    def __init__(self, total, name='items', log=Logger.info, interval=2.,
+                 clock=time.monotonic):
+        """ Create the progress report of a task with `total` items (0 if unknown).
+        """
+        self.total = total
+        self.name = name
+        self.log = log
+        self.interval = interval
+        self.clock = clock
+        self.done = 0
+        self.start = clock()
+        self._last = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        """ Change string representation.
+        """
+        return f"Instance of {self.__class__.__name__} ({self.done}/{self.total} {self.name})."
+
+    def rate(self):
+        """ Return the number of items processed per second.
+        """
+        elapsed = self.clock() - self.start
+        return self.done / elapsed if elapsed > 0 else 0.
+
+    def eta(self):
+        """ Return the estimated remaining time in seconds, None if unknown.
+        """
+        rate = self.rate()
+        if not self.total or rate == 0:
+            return None
+        return max(self.total - self.done, 0) / rate
+
+    def message(self):
+        """ Return the progress message.
+        """
+        if self.total:
+            msg = (f'   {self.done}/{self.total} {self.name}'
+                   f' ({100 * min(self.done, self.total) // self.total}%)')
+        else:
+            msg = f'   {self.done} {self.name}'
+        msg += f', {self.rate():.1f} {self.name}/s'
+        eta = self.eta()
+        if eta is not None:
+            msg += f', ETA {format_duration(eta)}'
+        return msg
+
+    def step(self, count=1):
+        """ Add `count` processed items and log the progress if needed.
+        """
+        with self._lock:
+            self.done += count
+            now = self.clock()
+            if (self._last is not None and now - self._last < self.interval
+                    and self.done != self.total):
+                return
+            self._last = now
+            msg = self.message()
+        self.log(msg)
+
+    def finish(self):
+        """ Log the total number of items and the elapsed time.
+        """
+        elapsed = self.clock() - self.start
+        self.log(f'   {self.done} {self.name} in {format_duration(elapsed)}')
@@ -0,0 +1,242 @@
+"""
+This file is part of amc2moodle, a convertion tool to recast quiz written
+with the LaTeX format used by automuliplechoice 1.0.3 into the
+moodle XML quiz format.
+Copyright (C) 2016  Benoit Nennig, benoit.nennig@supmeca.fr
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Supervised execution of external tools (LaTeXML) with a timeout, a memory
+limit and the parsing of the error messages while they are written.
+"""
+
+import logging
+import re
+import subprocess
+import threading
+from typing import List, NamedTuple, Optional
+
+try:
+    import resource
+except ImportError:
+    # not available on windows
+    resource = None
+
+# activate logger
+Logger = logging.getLogger(__name__)
+
+# LaTeXML messages, like
+#   Error:undefined:\foo The token T_CS[\foo] is not defined.
+#   	at /path/file.tex; line 12 col 3 - line 12 col 7
+ERROR_RE = re.compile(r'^(?:Error|Fatal):')
+LOCATION_RE = re.compile(r'^\s*at (?P<file>.+?); line (?P<line>\d+)')
+# Progress marker written by the amc2moodle LaTeXML bindings for each question
+PROGRESS_RE = re.compile(r'\[amc2moodle:question\]')
+
+
+class Diagnostic(NamedTuple):
+    """ An error reported by the process, with its location if available.
+    """
+    message: str
+    file: Optional[str] = None
+    line: Optional[int] = None
+
+
+class Result(NamedTuple):
+    """ The outcome of a supervised process.
+    """
+    returncode: int
+    errors: List[Diagnostic]
+    # killed after the timeout
+    timed_out: bool = False
+    # killed after `max_errors` errors
+    aborted: bool = False
+    # standard output, if captured
+    stdout: Optional[str] = None
+
+    @property
+    def ok(self):
+        """ True if the process ends normally with a zero exit status.
+        """
+        return self.returncode == 0 and not (self.timed_out or self.aborted)
+
+
+class _ErrorParser:
+    """ Gather the error messages and their location from the output lines.
+    """
+
+    def __init__(self, on_error, max_errors, abort, on_progress=None):
+        self.on_error = on_error
+        self.on_progress = on_progress
+        self.max_errors = max_errors
+        self.abort = abort
+        self.errors = []
+        self._lock = threading.Lock()
+
+    def feed(self, line, pending):
+        """ Parse `line` of a stream, `pending` is the error waiting for its location.
+
+        Returns the new pending error.
+        """
+        if self.on_progress is not None and PROGRESS_RE.search(line):
+            self.on_progress()
+        if ERROR_RE.match(line):
+            if pending is not None:
+                self.report(Diagnostic(pending))
+            return line
+        if pending is not None:
+            m = LOCATION_RE.match(line)
+            if m:
+                self.report(Diagnostic(pending, m.group('file'), int(m.group('line'))))
+            else:
+                self.report(Diagnostic(pending))
+        return None
+
+    def report(self, error):
+        """ Store and report `error`, abort if too many errors are found.
+        """
+        with self._lock:
+            self.errors.append(error)
+            count = len(self.errors)
+        if self.on_error is not None:
+            self.on_error(error)
+        if self.max_errors is not None and count == self.max_errors:
+            self.abort()
+
+
+def _read(stream, output, parser):
+    """ Send each line of `stream` to `output` and to the error `parser`.
+    """
+    pending = None
+    for line in stream:
+        line = line.rstrip()
+        if line and output is not None:
+            output(line)
+        pending = parser.feed(line, pending)
+    if pending is not None:
+        parser.report(Diagnostic(pending))
+
+
+def _capture(stream, chunks):
+    """ Append the content of `stream` to the list `chunks`.
+    """
+    chunks.append(stream.read())
+
+
+def _write(stream, text):
+    """ Write `text` in `stream` and close it.
+    """
+    try:
+        stream.write(text)
+        stream.close()
+    except BrokenPipeError:
+        # the process stops before reading all the input, its status is checked
+        Logger.debug(' > Input not fully read by the process.')
+
+
+def _memory_limit(command, nbytes):
+    """ Return `command` limiting its address space to `nbytes`.
+
+    The limit is set by a shell before it executes `command`, so that it
+    applies from the first instruction of the process.
+    """
+    return ['/bin/sh', '-c', f'ulimit -v {nbytes // 1024} && exec "$0" "$@"', *command]
+
+
+def run(command, input=None, cwd=None, timeout=None, memory_limit=None,
+        max_errors=None, output=None, on_error=None, on_progress=None,
+        capture=False):
+    """ Run `command` and follow its output until it ends.
+
+    Parameters
+    ----------
+    command : list
+        The command and its arguments.
+    input : string, optional
+        Text written on the standard input. The default is None (no input).
+        The streams of the process are encoded in UTF-8, whatever the locale.
+    cwd : string, optional
+        The working directory of the process. The default is None.
+    timeout : float, optional
+        The process is killed after `timeout` seconds. The default is None.
+    memory_limit : int, optional
+        Maximal size of the address space of the process in bytes (POSIX
+        only). The default is None.
+    max_errors : int, optional
+        The process is killed once `max_errors` errors are found in its
+        output. The default is None.
+    output : callable, optional
+        Called with each non empty output line (stdout and stderr).
+    on_error : callable, optional
+        Called with each `Diagnostic` as soon as it is parsed.
+    on_progress : callable, optional
+        Called without argument for each progress marker found in the output.
+    capture : bool, optional
+        Return the standard output in the result instead of following it,
+        only the standard error is parsed. The default is False.
+
+    Returns
+    -------
+    Result
+        The exit status and the errors.
+    """
+    # no `preexec_fn`, it is not safe when other threads are running
+    if memory_limit is not None:
+        if resource is None:
+            Logger.warning('Memory limit is not supported on this platform, ignored.')
+        else:
+            command = _memory_limit(command, memory_limit)
+
+    aborted = threading.Event()
+    with subprocess.Popen(command,
+                          stdin=subprocess.PIPE if input is not None else None,
+                          stdout=subprocess.PIPE,
+                          stderr=subprocess.PIPE,
+                          cwd=cwd,
+                          universal_newlines=True,
+                          # a decoding error would stop a reader thread and
+                          # block the process on a full pipe
+                          encoding='utf-8', errors='replace') as process:
+
+        def abort():
+            aborted.set()
+            process.kill()
+
+        parser = _ErrorParser(on_error, max_errors, abort, on_progress)
+        stdout = []
+        threads = [threading.Thread(target=_read, args=(process.stderr, output, parser),
+                                    daemon=True)]
+        if capture:
+            threads.append(threading.Thread(target=_capture, args=(process.stdout, stdout),
+                                            daemon=True))
+        else:
+            threads.append(threading.Thread(target=_read, args=(process.stdout, output, parser),
+                                            daemon=True))
+        if input is not None:
+            threads.append(threading.Thread(target=_write, args=(process.stdin, input),
+                                            daemon=True))
+        for thread in threads:
+            thread.start()
+        timed_out = False
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            process.kill()
+            process.wait()
+        # the pipes are closed when the process ends
+        for thread in threads:
+            thread.join()
+    return Result(process.returncode, parser.errors, timed_out, aborted.is_set(),
+                  ''.join(stdout) if capture else None)
@@ -0,0 +1,187 @@
+"""
+This file is part of amc2moodle, a convertion tool to recast quiz written
+with the LaTeX format used by automuliplechoice 1.0.3 into the
+moodle XML quiz format.
+Copyright (C) 2016  Benoit Nennig, benoit.nennig@supmeca.fr
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Split a flattened AMC LaTeX file along the `\\element{group}{...}` blocks
+and merge the LaTeXML documents of the shards.
+"""
+
+import re
+from typing import List, NamedTuple
+
+from lxml import etree
+
+# Attribute of the element identifiers and attributes referring to them
+_XML_ID = '{http://www.w3.org/XML/1998/namespace}id'
+_IDREFS = ('idref',)
+
+# Tokens needed to follow the document structure: escaped chars and control
+# words, comments and braces
+_TOKEN_RE = re.compile(r'\\(?:element(?![A-Za-z@])|begin\{document\}|end\{document\}|[A-Za-z@]+|.)'
+                       r'|%[^\n]*|[{}]', re.DOTALL)
+
+
+class TexDocument(NamedTuple):
+    """ A flattened LaTeX file split along `\\element` blocks.
+
+    The concatenation `preamble + head + ''.join(elements) + tail + end`
+    gives back the original file.
+    """
+    # Everything up to `\begin{document}` (included)
+    preamble: str
+    # Document body before the first `\element`
+    head: str
+    # `\element{}{}` blocks, each one followed by the text up to the next block
+    elements: List[str]
+    # Document body after the last `\element`
+    tail: str
+    # `\end{document}` and what follows
+    end: str
+
+    def chunk(self, body):
+        """ Return a standalone LaTeX document containing `body`.
+        """
+        return self.preamble + body + self.end
+
+
+def split_elements(tex):
+    """ Split the LaTeX source `tex` along `\\element{}{}` blocks.
+
+    Comments and braces are tracked, thus only `\\element` commands at the
+    top level of the document body are considered.
+
+    Parameters
+    ----------
+    tex : string
+        The flattened LaTeX source.
+
+    Returns
+    -------
+    TexDocument
+        The split document.
+    """
+    begin = end = None
+    depth = 0
+    # start position of the `\element` blocks, and their end
+    starts, stops = [], []
+    # number of closed argument in the current element
+    nargs = None
+    for m in _TOKEN_RE.finditer(tex):
+        token = m.group()
+        if token == '{':
+            depth += 1
+        elif token == '}':
+            depth -= 1
+            if nargs is not None and depth == 0:
+                nargs += 1
+                if nargs == 2:
+                    stops.append(m.end())
+                    nargs = None
+        elif token == '\\begin{document}' and begin is None and depth == 0:
+            begin = m.end()
+        elif token == '\\end{document}' and begin is not None and depth == 0:
+            end = m.start()
+            break
+        elif token == '\\element' and begin is not None and depth == 0 and nargs is None:
+            starts.append(m.start())
+            nargs = 0
+    if begin is None:
+        raise ValueError("No '\\begin{document}' found.")
+    if end is None:
+        end = len(tex)
+    if nargs is not None:
+        raise ValueError(f"Unbalanced '\\element' block at position {starts[-1]}.")
+
+    if not starts:
+        return TexDocument(tex[:begin], tex[begin:end], [], '', tex[end:])
+    # each block goes to the start of the next one
+    elements = [tex[start:stop] for start, stop in zip(starts, starts[1:] + [stops[-1]])]
+    return TexDocument(preamble=tex[:begin],
+                       head=tex[begin:starts[0]],
+                       elements=elements,
+                       tail=tex[stops[-1]:end],
+                       end=tex[end:])
+
+
+def shard_elements(elements, n):
+    """ Group the `elements` in at most `n` contiguous shards of similar size.
+
+    Parameters
+    ----------
+    elements : list
+        The `\\element` blocks (see `TexDocument`).
+    n : int
+        The maximal number of shards.
+
+    Returns
+    -------
+    list
+        The list of shards, each one is a non empty list of blocks. The
+        concatenation of the shards gives back `elements`.
+    """
+    n = max(1, min(n, len(elements)))
+    total = sum(len(element) for element in elements)
+    shards, current, size = [], [], 0
+    for i, element in enumerate(elements):
+        current.append(element)
+        size += len(element)
+        # keep at least one block for each remaining shard
+        remaining = len(elements) - i - 1
+        free = n - len(shards) - 1
+        if free > 0 and (size >= total * (len(shards) + 1) / n or remaining == free):
+            shards.append(current)
+            current = []
+    if current:
+        shards.append(current)
+    return shards
+
+
+def merge_shards(xmlfiles, output):
+    """ Merge the LaTeXML documents `xmlfiles` of the shards in `output`.
+
+    The children of the roots are gathered in the shards order in the first
+    document, the resources (css...) of the other shards are the same and are
+    skipped. Each shard numbers its `xml:id` from the start, thus they are
+    prefixed by the shard index (`s0.p1`, `s1.p1`...) and the attributes
+    referring to them are rewritten accordingly.
+
+    Parameters
+    ----------
+    xmlfiles : list
+        The LaTeXML documents of the shards, in order.
+    output : string
+        The merged document.
+    """
+    parser = etree.XMLParser(strip_cdata=False)
+    tree = None
+    for i, xmlfile in enumerate(xmlfiles):
+        shard = etree.parse(xmlfile, parser)
+        prefix = f's{i}.'
+        for elem in shard.iter(tag=etree.Element):
+            for attr in (_XML_ID,) + _IDREFS:
+                value = elem.get(attr)
+                if value is not None:
+                    elem.set(attr, prefix + value)
+        if tree is None:
+            tree = shard
+            continue
+        for child in list(shard.getroot()):
+            if isinstance(child.tag, str) and etree.QName(child).localname == 'resource':
+                continue
+            tree.getroot().append(child)
+    tree.write(output, encoding='UTF-8', xml_declaration=True)
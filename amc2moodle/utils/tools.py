@@ -0,0 +1,147 @@
+"""
+This file is part of amc2moodle, a convertion tool to recast quiz written
+with the LaTeX format used by automuliplechoice 1.0.3 into the
+moodle XML quiz format.
+Copyright (C) 2016  Benoit Nennig, benoit.nennig@supmeca.fr
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Discovery of the external tools (LaTeXML, xmlindent...) and of their version.
+"""
+
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+
+from .cache import default_cache_dir
+
+# Name of the file storing the probed versions, in the cache directory
+VERSIONS_FILE = 'tools.json'
+
+# activate logger
+Logger = logging.getLogger(__name__)
+
+# tools found in this process {name: path or None}
+_paths = {}
+# probed versions {"path args": version}
+_versions = {}
+_lock = threading.Lock()
+
+
+def which(name):
+    """ Return the path of the executable `name` in the PATH, None if missing.
+
+    The PATH is searched once per process, no process is spawned.
+    """
+    try:
+        return _paths[name]
+    except KeyError:
+        path = _paths[name] = shutil.which(name)
+        return path
+
+
+def _signature(path):
+    """ Return the size and modification time of the executable `path`.
+    """
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _load(filename):
+    """ Read the stored versions, empty if missing or invalid.
+    """
+    try:
+        with open(filename) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _save(filename, data):
+    """ Write the stored versions atomically, failures are ignored.
+    """
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename), prefix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=1, sort_keys=True)
+            os.replace(tmp, filename)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+    except OSError as e:
+        Logger.debug(f'   Cannot store the tool versions in {filename}: {e}')
+
+
+def version(name, args=('--version',), cache_dir=None):
+    """ Return the version written by `name args` (stdout and stderr).
+
+    The version is stored in `cache_dir` with the size and the modification
+    time of the executable, the tool is only run again if it changes or if
+    it is found elsewhere in the PATH (other environment).
+
+    Parameters
+    ----------
+    name : string
+        The name of the executable, looked for in the PATH.
+    args : tuple, optional
+        The arguments printing the version. The default is ('--version',).
+    cache_dir : string, optional
+        The directory of the stored versions. The default is the amc2moodle
+        cache directory.
+
+    Returns
+    -------
+    string
+        The version, None if the tool is not found.
+    """
+    path = which(name)
+    if path is None:
+        return None
+    key = ' '.join((path,) + tuple(args))
+    with _lock:
+        if key in _versions:
+            return _versions[key]
+        filename = os.path.join(default_cache_dir() if cache_dir is None else cache_dir,
+                                VERSIONS_FILE)
+        signature = _signature(path)
+        entry = _load(filename).get(key)
+        if entry is not None and entry.get('signature') == signature:
+            text = entry['version']
+        else:
+            Logger.debug(f'   Probe the version of {path}')
+            text = subprocess.run([path, *args], stdin=subprocess.DEVNULL,
+                                  stdout=subprocess.PIPE,
+                                  stderr=subprocess.STDOUT, universal_newlines=True,
+                                  check=False).stdout.strip()
+            # other processes may have stored other tools meanwhile
+            data = _load(filename)
+            data[key] = {'signature': signature, 'version': text}
+            _save(filename, data)
+        _versions[key] = text
+        return text
+
+
+def clear():
+    """ Forget the tools found and the versions probed in this process.
+    """
+    with _lock:
+        _paths.clear()
+        _versions.clear()
@@ -0,0 +1,68 @@
+"""
+This file is part of amc2moodle, a convertion tool to recast quiz written
+with the LaTeX format used by automuliplechoice 1.0.3 into the
+moodle XML quiz format.
+Copyright (C) 2016  Benoit Nennig, benoit.nennig@supmeca.fr
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Registry of compiled XSLT stylesheets shared by amc2moodle and moodle2amc.
+"""
+
+import logging
+import os
+import threading
+
+from lxml import etree
+
+# activate logger
+Logger = logging.getLogger(__name__)
+
+# lxml XSLT objects must not be shared between threads, the registry keeps
+# one compiled stylesheet per thread
+_local = threading.local()
+
+
+def transformer(filename):
+    """ Return the compiled XSLT stylesheet `filename`.
+
+    The stylesheet is parsed and compiled at the first call in each thread,
+    the next calls return the same object.
+
+    Parameters
+    ----------
+    filename : string
+        The path of the XSLT stylesheet.
+
+    Returns
+    -------
+    etree.XSLT
+        The compiled stylesheet.
+    """
+    registry = getattr(_local, 'registry', None)
+    if registry is None:
+        registry = _local.registry = {}
+    filename = os.path.abspath(filename)
+    try:
+        return registry[filename]
+    except KeyError:
+        Logger.debug(f'   Compile XSLT stylesheet {os.path.basename(filename)}')
+        transform = registry[filename] = etree.XSLT(etree.parse(filename))
+        return transform
+
+
+def clear():
+    """ Remove all the compiled stylesheets of the current thread.
+    """
+    getattr(_local, 'registry', {}).clear()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+"""
+    This file is part of amc2moodle, a convertion tool to recast quiz written
+    with the LaTeX format used by automuliplechoice 1.0.3 into the
+    moodle XML quiz format.
+    Copyright (C) 2016  Benoit Nennig, benoit.nennig@supmeca.fr
+
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Benchmarks of the amc2moodle conversion pipeline.
+
+Each benchmark is a sub-command, run for instance
+```
+python benchmarks/bench_amc2moodle.py latexml -n 3
+```
+By default, the tex files of the test suite are used as input.
+"""
+import argparse
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# payload data directory of the test suite
+_PAYLOAD_TEST_DIR = os.path.join(os.path.dirname(__file__), os.pardir,
+                                 'amc2moodle', 'tests', 'payload_test_amc2moodle')
+_DEFAULT_FILES = ['QCM_wo-tikz.tex', 'numerical.tex', 'cleaning.tex', 'element.tex']
+
+# `python -X importtime` line: self and cumulative times (us) and module name
+_IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+# Child process of `bench_startup`, prints the time of the first LaTeXML call
+_FIRST_LATEXML_CALL = '''
+import sys, time
+from amc2moodle.utils import supervisor
+def first_call(*args, **kwargs):
+    print(time.time(), flush=True)
+    # the temporary files are removed while exiting
+    sys.exit(0)
+supervisor.run = first_call
+from amc2moodle.utils.customLogging import customLogger
+customLogger('amc2moodle').setupConsoleLogger(silent=True)
+from amc2moodle.amc2moodle import amc2moodle_class as a2m
+a2m.amc2moodle(fileInput=sys.argv[1], fileOutput=sys.argv[2], catname='bench',
+               incremental=True, cache_dir=sys.argv[3])
+'''
+
+
+def _input_files(files):
+    """Return the absolute path of the input files (default test payload)."""
+    if not files:
+        files = [os.path.join(_PAYLOAD_TEST_DIR, f) for f in _DEFAULT_FILES]
+    return [os.path.abspath(f) for f in files]
+
+
+def _report(title, timings, unit='s'):
+    """Print a summary of the `timings` dictionnary {label: [durations]}."""
+    scale = {'s': 1, 'ms': 1e3}[unit]
+    print(f'\n{title}')
+    print(f"{'':<30} {f'first ({unit})':>10} {f'median ({unit})':>11} {f'min ({unit})':>9}")
+    for label, durations in timings.items():
+        durations = [d * scale for d in durations]
+        print(f'{label:<30} {durations[0]:>10.3f} '
+              f'{statistics.median(durations):>11.3f} {min(durations):>9.3f}')
+
+
+def _timeit(function, repeat):
+    """Return the list of durations of `repeat` calls to `function`."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def bench_latexml(args):
+    """Per-file conversion time with and without the LaTeXML daemon."""
+    from amc2moodle.amc2moodle import amc2moodle_class as a2m
+
+    files = _input_files(args.files)
+    with tempfile.TemporaryDirectory() as outdir:
+        for daemon in (False, True):
+            timings = {}
+            for fileIn in files:
+                fileOut = os.path.join(outdir, os.path.basename(fileIn) + '.xml')
+                timings[os.path.basename(fileIn)] = _timeit(
+                    lambda: a2m.amc2moodle(fileInput=fileIn, fileOutput=fileOut,
+                                           catname='bench', daemon=daemon),
+                    args.repeat)
+            mode = 'warm (daemon)' if daemon else 'cold (latexml)'
+            _report(f'LaTeXML {mode}, {args.repeat} runs per file', timings)
+
+
+def bench_xslt(args):
+    """Per-quiz cost of the XSLT stylesheets compilation vs the shared registry."""
+    from lxml import etree
+
+    from amc2moodle.utils import xslt
+
+    root = os.path.join(os.path.dirname(__file__), os.pardir, 'amc2moodle')
+    stylesheets = {'amc2moodle': [os.path.join(root, 'amc2moodle', f)
+                                  for f in ('transform_ns.xslt', 'transform_qtype.xslt',
+                                            'transform2html.xslt', 'transform.xslt')],
+                   'moodle2amc': [os.path.join(root, 'moodle2amc', f)
+                                  for f in ('html2tex.xslt', 'struc2tex.xslt')]}
+    timings = {}
+    for direction, files in stylesheets.items():
+        timings[f'{direction} compile'] = _timeit(
+            lambda: [etree.XSLT(etree.parse(f)) for f in files], args.repeat)
+        xslt.clear()
+        timings[f'{direction} registry'] = _timeit(
+            lambda: [xslt.transformer(f) for f in files], args.repeat)
+    _report(f'XSLT stylesheets per quiz, {args.repeat} runs', timings, unit='ms')
+
+
+def _convert_in_child(fileIn, fileOut, cache_dir, fused, repeat):
+    """Convert `fileIn` in a fresh process, return the durations and peak RSS (MB)."""
+    import resource
+
+    from amc2moodle.amc2moodle import amc2moodle_class as a2m
+    from amc2moodle.utils.customLogging import customLogger
+    customLogger('amc2moodle').setupConsoleLogger(silent=True)
+    durations = _timeit(lambda: a2m.amc2moodle(fileInput=fileIn, fileOutput=fileOut,
+                                               catname='bench', cache_dir=cache_dir,
+                                               fused_xslt=fused),
+                        repeat)
+    # ru_maxrss is in kB on linux (bytes on mac os)
+    return durations, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_fused(args):
+    """Conversion time and peak memory with the legacy and the fused XSLT chain.
+
+    LaTeXML outputs are cached by a first run, thus only the python conversion
+    is measured.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    files = _input_files(args.files)
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = os.path.join(tmp, 'cache')
+        timings = {}
+        peaks = {}
+        for fused in (None, False, True):
+            for fileIn in files:
+                fileOut = os.path.join(tmp, os.path.basename(fileIn) + '.xml')
+                # new process for each measure to get its own peak memory
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    durations, peak = pool.submit(_convert_in_child, fileIn, fileOut, cache_dir,
+                                                  bool(fused), args.repeat).result()
+                if fused is None:
+                    # warm-up of the LaTeXML cache
+                    continue
+                label = f"{os.path.basename(fileIn)} {'fused' if fused else 'legacy'}"
+                timings[label] = durations
+                peaks[label] = peak
+        _report(f'XSLT chain, {args.repeat} runs per file (LaTeXML cached)', timings)
+        print(f"\n{'':<30} {'peak RSS (MB)':>14}")
+        for label, peak in peaks.items():
+            print(f'{label:<30} {peak:>14.1f}')
+
+
+def bench_python(args):
+    """Conversion time of the Python/XSLT stage alone, from a saved LaTeXML output."""
+    from amc2moodle.amc2moodle import amc2moodle_class as a2m
+
+    files = _input_files(args.files)
+    with tempfile.TemporaryDirectory() as tmp:
+        timings = {}
+        for fileIn in files:
+            name = os.path.basename(fileIn)
+            fileOut = os.path.join(tmp, name + '.xml')
+            latexml = os.path.join(tmp, name + '_latexml.xml')
+            # LaTeXML is run once
+            a2m.amc2moodle(fileInput=fileIn, fileOutput=fileOut, catname='bench',
+                           save_latexml=latexml)
+            timings[name] = _timeit(
+                lambda: a2m.amc2moodle(fileInput=fileIn, fileOutput=fileOut,
+                                       catname='bench', from_latexml=latexml,
+                                       fused_xslt=args.fused_xslt),
+                args.repeat)
+        _report(f'Python conversion from LaTeXML output, {args.repeat} runs per file', timings)
+
+
+def bench_converter(args):
+    """Per-request time of the amc2moodle class vs a reused Converter.
+
+    Both sides use a cache of the same kind, in their own directory.
+    """
+    from amc2moodle.amc2moodle import amc2moodle_class as a2m
+
+    files = _input_files(args.files)
+    with tempfile.TemporaryDirectory() as tmp, \
+            a2m.Converter(catname='bench',
+                          cache_dir=os.path.join(tmp, 'converter_cache')) as converter:
+        timings = {}
+        for fileIn in files:
+            name = os.path.basename(fileIn)
+            fileOut = os.path.join(tmp, name + '.xml')
+            timings[f'{name} class'] = _timeit(
+                lambda: a2m.amc2moodle(fileInput=fileIn, fileOutput=fileOut, catname='bench',
+                                       cache_dir=os.path.join(tmp, 'class_cache')),
+                args.repeat)
+            timings[f'{name} converter'] = _timeit(lambda: converter.convert(fileIn),
+                                                   args.repeat)
+        _report(f'Conversion per request, {args.repeat} runs per file', timings)
+
+
+def _importtime(command):
+    """Return the import times {module: (self, cumulative)} in s of `command`."""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', *command],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            universal_newlines=True, check=False).stderr
+    times = {}
+    for line in stderr.splitlines():
+        m = _IMPORTTIME_RE.match(line)
+        if m:
+            times[m.group(4)] = (int(m.group(1)) * 1e-6, int(m.group(2)) * 1e-6)
+    return times
+
+
+def bench_startup(args):
+    """Startup time of `amc2moodle --version` and time to the first LaTeXML call.
+
+    Each run is a fresh interpreter. The first LaTeXML call is intercepted, LaTeXML
+    itself is not run.
+    """
+    version = ['-m', 'amc2moodle.amc2moodle.bin.amc2moodle', '--version']
+    timings = {'amc2moodle --version': _timeit(
+        lambda: subprocess.run([sys.executable, *version], stdout=subprocess.DEVNULL,
+                               check=True), args.repeat)}
+    fileIn = _input_files(args.files)[0]
+    with tempfile.TemporaryDirectory() as tmp:
+        # the interrupted conversions may leave temporary files next to the input
+        srcdir = os.path.join(tmp, 'src')
+        shutil.copytree(os.path.dirname(fileIn), srcdir)
+        fileIn = os.path.join(srcdir, os.path.basename(fileIn))
+        fileOut = os.path.join(tmp, 'out.xml')
+        durations = []
+        for _ in range(args.repeat):
+            start = time.time()
+            stdout = subprocess.run([sys.executable, '-c', _FIRST_LATEXML_CALL, fileIn,
+                                     fileOut, os.path.join(tmp, 'cache')],
+                                    stdout=subprocess.PIPE, universal_newlines=True,
+                                    check=False).stdout
+            if not stdout.strip():
+                print('The first LaTeXML call is not reached (is LaTeXML installed?)')
+                break
+            durations.append(float(stdout) - start)
+        if durations:
+            timings['first LaTeXML call'] = durations
+    _report(f'Startup, {args.repeat} runs ({os.path.basename(fileIn)})', timings, unit='ms')
+
+    # heaviest imports of `amc2moodle --version`
+    times = _importtime(version)
+    print(f"\n{'imports of amc2moodle --version':<45} {'self (ms)':>10} {'cumul. (ms)':>12}")
+    for name, (own, cumulative) in sorted(times.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f'{name:<45} {own * 1e3:>10.1f} {cumulative * 1e3:>12.1f}')
+    print(f"{'total':<45} {sum(own for own, _ in times.values()) * 1e3:>10.1f}")
+
+
+def main():
+    """Parse the command line and run the selected benchmark."""
+    parser = argparse.ArgumentParser(description='amc2moodle benchmarks.')
+    subparsers = parser.add_subparsers(dest='bench', required=True)
+
+    latexml = subparsers.add_parser('latexml',
+                                    help='per-file time of cold vs warm (daemon) LaTeXML runs')
+    latexml.add_argument('files', nargs='*', help='Input tex files (default: test payload)')
+    latexml.add_argument('-n', '--repeat', type=int, default=3,
+                         help='Number of conversions per file (default 3)')
+    latexml.set_defaults(func=bench_latexml)
+
+    xslt = subparsers.add_parser('xslt',
+                                 help='per-quiz time of the XSLT compilation with and without registry')
+    xslt.add_argument('-n', '--repeat', type=int, default=100,
+                      help='Number of quizzes (default 100)')
+    xslt.set_defaults(func=bench_xslt)
+
+    fused = subparsers.add_parser('fused',
+                                  help='time and peak memory of the legacy vs fused XSLT chain')
+    fused.add_argument('files', nargs='*', help='Input tex files (default: test payload)')
+    fused.add_argument('-n', '--repeat', type=int, default=3,
+                       help='Number of conversions per file (default 3)')
+    fused.set_defaults(func=bench_fused)
+
+    python = subparsers.add_parser('python',
+                                   help='time of the python conversion alone (--from-latexml)')
+    python.add_argument('files', nargs='*', help='Input tex files (default: test payload)')
+    python.add_argument('-n', '--repeat', type=int, default=5,
+                        help='Number of conversions per file (default 5)')
+    python.add_argument('--fused-xslt', action='store_true',
+                        help='Use the fused XSLT chain')
+    python.set_defaults(func=bench_python)
+
+    converter = subparsers.add_parser('converter',
+                                      help='per-request time of the class vs a reused Converter')
+    converter.add_argument('files', nargs='*', help='Input tex files (default: test payload)')
+    converter.add_argument('-n', '--repeat', type=int, default=5,
+                           help='Number of conversions per file (default 5)')
+    converter.set_defaults(func=bench_converter)
+
+    startup = subparsers.add_parser('startup',
+                                    help='import time of `amc2moodle --version` and time to '
+                                         'the first LaTeXML call')
+    startup.add_argument('files', nargs='*', help='Input tex file (default: test payload)')
+    startup.add_argument('-n', '--repeat', type=int, default=10,
+                         help='Number of runs (default 10)')
+    startup.add_argument('--top', type=int, default=10,
+                         help='Number of the heaviest imports shown (default 10)')
+    startup.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    # silence amc2moodle logger
+    from amc2moodle.utils.customLogging import customLogger
+    customLogger('amc2moodle').setupConsoleLogger(silent=True)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -15,11 +15,14 @@ then
     LOG_DIR=${LOG_DIR_DEF}
 fi
 
-# function to run amc2moodle
+# function to run amc2moodle on all the files given as arguments (in parallel)
 function run_amc2moodle()
 {
-    amc2moodle -x "$1"
-    touch "$1".lock
+    amc2moodle-batch -x "$@"
+    for file in "$@"
+    do
+        touch "$file".lock
+    done
 }
 
 # function to run moodle2amc
@@ -66,17 +69,22 @@ do
     nbfiles=$(ls *amc2moodle.tex 2> /dev/null | wc -l)
     if [ "$nbfiles" != "0" ]
     then
+        todo=()
         for file in ${files}
         do
             if [[ -f "${file}.lock" ]]
             then
                 printf " >>> ${file}.lock exists\n"
             else
-                printf " >>> Run amc2moodle on ${file}\n"
-                run_amc2moodle "${file}"
-                printf " >>>>Done"
+                todo+=("${file}")
             fi
         done
+        if [ "${#todo[@]}" != "0" ]
+        then
+            printf " >>> Run amc2moodle on ${todo[*]}\n"
+            run_amc2moodle "${todo[@]}"
+            printf " >>>>Done"
+        fi
     fi
     
     #execute on moodle2amc waiting files